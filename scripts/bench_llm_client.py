@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark LLMClient against the local stub server (no network, deterministic latency)."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+MESSAGES = [{"role": "user", "content": "用一句话介绍你自己"}]
+
+
+def summarize(mode: str, samples: list[tuple[float, float]], elapsed: float) -> dict:
+    ttfts = sorted(sample[0] for sample in samples)
+    totals = sorted(sample[1] for sample in samples)
+    return {
+        "mode": mode,
+        "requests": len(samples),
+        "wall_s": elapsed,
+        "rps": len(samples) / elapsed,
+        "ttft_p50_ms": ttfts[len(ttfts) // 2] * 1000,
+        "ttft_p95_ms": ttfts[max(0, int(len(ttfts) * 0.95) - 1)] * 1000,
+        "total_mean_ms": statistics.fmean(totals) * 1000,
+    }
+
+
+def bench_threads(client, endpoint, requests: int, concurrency: int) -> dict:
+    def one(_):
+        start = time.perf_counter()
+        first = None
+        for _ in client.completion(endpoint, MESSAGES, stream=True):
+            first = first or time.perf_counter() - start
+        return first or 0.0, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(one, range(requests)))
+    return summarize("threads", samples, time.perf_counter() - start)
+
+
+async def bench_async(client, endpoint, requests: int, concurrency: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with slots:
+            start = time.perf_counter()
+            first = None
+            async for _ in await client.acompletion(endpoint, MESSAGES, stream=True):
+                first = first or time.perf_counter() - start
+            return first or 0.0, time.perf_counter() - start
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return summarize("asyncio", samples, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200, help="streamed requests per mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--ttft", type=float, default=0.2, help="stub time to first token (s)")
+    parser.add_argument("--tps", type=float, default=200.0, help="stub tokens per second")
+    parser.add_argument("--script", help="stub response script (JSON array or JSONL)")
+    args = parser.parse_args()
+
+    # 离线运行：不拉取litellm的远程价格表
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+    from argus.llm import LLMClient, LLMEndpoint
+    from argus.llm.stub_server import StubLLMServer, load_script
+
+    rules = load_script(args.script) if args.script else [{"content": "我是一个运行在本地的桩模型，用于压测。"}]
+    with StubLLMServer(rules, ttft=args.ttft, tokens_per_second=args.tps) as server:
+        endpoint = LLMEndpoint("stub", server.base_url, "sk-stub")
+        client = LLMClient(provider="openai", max_connections=args.concurrency, max_keepalive=args.concurrency)
+        # 预热：导入litellm并建立连接，不计入结果
+        list(client.completion(endpoint, MESSAGES, stream=True))
+        results = [
+            bench_threads(client, endpoint, args.requests, args.concurrency),
+            asyncio.run(bench_async(client, endpoint, args.requests, args.concurrency)),
+        ]
+        stats = dict(server.stats)
+
+    print(f"{'mode':8s} {'reqs':>5s} {'wall s':>7s} {'req/s':>7s} {'ttft p50':>9s} {'ttft p95':>9s} {'mean ms':>8s}")
+    for row in results:
+        print(
+            f"{row['mode']:8s} {row['requests']:5d} {row['wall_s']:7.2f} {row['rps']:7.1f} "
+            f"{row['ttft_p50_ms']:9.1f} {row['ttft_p95_ms']:9.1f} {row['total_mean_ms']:8.1f}"
+        )
+    print(f"stub: {stats['requests']} requests, max in flight {stats['max_in_flight']}, errors {stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
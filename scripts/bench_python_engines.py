@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Benchmark the Jupyter and forkserver Python engines on small snippets."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+SNIPPETS = [
+    "x = sum(range(1000))",
+    "print(x)",
+    "import json\njson.dumps({'a': [1, 2, 3]})",
+    "s = 'hello world ' * 10\nlen(s.split())",
+    "[i * i for i in range(10)][-1]",
+]
+
+
+def run_once(language, code: str) -> float:
+    start = time.perf_counter()
+    execution = language.run(code)
+    for _ in execution:
+        pass
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(name: str, language, rounds: int) -> dict:
+    start = time.perf_counter()
+    run_once(language, "pass")
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    samples = [run_once(language, code) for _ in range(rounds) for code in SNIPPETS]
+    samples.sort()
+    language.stop()
+    return {
+        "engine": name,
+        "startup_ms": startup_ms,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "runs": len(samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20, help="times each snippet is executed")
+    args = parser.parse_args()
+
+    # 基准测试只比较引擎本身，不使用内核池和预加载
+    os.environ.setdefault("ARGUS_KERNEL_POOL_SIZE", "0")
+    os.environ.setdefault("ARGUS_KERNEL_PRELOAD", "")
+
+    from argus.tools.code.languages import ForkPythonLanguage, PythonLanguage
+
+    engines = [("jupyter", PythonLanguage())]
+    if ForkPythonLanguage.is_available():
+        engines.append(("fork", ForkPythonLanguage()))
+
+    print(f"{'engine':<10}{'startup':>12}{'mean':>10}{'p50':>10}{'p95':>10}{'runs':>7}")
+    for name, language in engines:
+        try:
+            result = bench(name, language, args.rounds)
+        except Exception as exc:
+            print(f"{name:<10}failed: {exc}")
+            continue
+        print(
+            f"{result['engine']:<10}{result['startup_ms']:>10.1f}ms{result['mean_ms']:>8.2f}ms"
+            f"{result['p50_ms']:>8.2f}ms{result['p95_ms']:>8.2f}ms{result['runs']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,8 @@ class Message:
         pinned: bool = False,
         function_call: Optional[Dict[str, Any]] = None,
         tool_calls: Optional[List[Dict[str, Any]]] = None,
-        tool_call_id: Optional[str] = None
+        tool_call_id: Optional[str] = None,
+        attachments: Optional[List[Any]] = None
     ):
         self.role = role  # system, user, assistant, tool
         self.content = content
@@ -38,6 +39,12 @@ class Message:
         self.function_call = function_call  # 旧格式兼容
         self.tool_calls = tool_calls  # 新格式
         self.tool_call_id = tool_call_id  # tool role需要的id
+        # 工具结果附带的图片（MediaAttachment），以图片块发送而不是JSON文本
+        self.attachments = list(attachments or [])
+
+    @property
+    def has_image(self) -> bool:
+        return bool(self.image_base64 or self.attachments)
 
     def to_dict(self) -> Dict[str, Any]:
         """构造兼容 LLM API 的格式"""
@@ -75,6 +82,7 @@ class Message:
         """
         # 1. 图片 tokens
         image_tokens = 1100 if self.image_base64 else 0
+        image_tokens += 1100 * len(self.attachments)
         
         # 2. 文本 tokens
         text_tokens = 0
@@ -182,7 +190,8 @@ class MemoryManager:
         self, 
         tool_call_id: str, 
         function_name: str,
-        result: str
+        result: str,
+        attachments: Optional[List[Any]] = None
     ):
         """
         添加function执行结果。
@@ -191,11 +200,13 @@ class MemoryManager:
             tool_call_id: 对应的tool call id
             function_name: 函数名称
             result: 执行结果（字符串形式）
+            attachments: 结果中抽取出的图片附件（MediaAttachment），在context中以图片块发送
         """
         msg = Message(
             role="tool",
             content=result,
-            tool_call_id=tool_call_id
+            tool_call_id=tool_call_id,
+            attachments=attachments
         )
         self.history.append(msg)
         self._prune_history()
@@ -232,25 +243,47 @@ class MemoryManager:
             messages.append(sys_msg_dict)
         
         # 2. 添加短期对话历史
-        for msg in self.history:
+        for index, msg in enumerate(self.history):
             messages.append(msg.to_dict())
+            # tool消息只能是文本：连续的tool消息结束后，用一条user消息附上它们的图片
+            if msg.role == "tool":
+                next_msg = self.history[index + 1] if index + 1 < len(self.history) else None
+                if next_msg is None or next_msg.role != "tool":
+                    image_msg = self._tool_images_message(index)
+                    if image_msg:
+                        messages.append(image_msg)
             
         return messages
 
+    def _tool_images_message(self, last_tool_index: int) -> Optional[Dict[str, Any]]:
+        """收集以last_tool_index结尾的连续tool消息中的图片"""
+        content_list = []
+        index = last_tool_index
+        while index >= 0 and self.history[index].role == "tool":
+            index -= 1
+        for msg in self.history[index + 1:last_tool_index + 1]:
+            for i, attachment in enumerate(msg.attachments):
+                content_list.append({"type": "text", "text": f"[工具结果 {msg.tool_call_id} 的附件 {i}]"})
+                content_list.append(attachment.to_image_part())
+        if not content_list:
+            return None
+        return {"role": "user", "content": content_list}
+
     def _prune_history(self):
         """
         维护 Context Window 的核心逻辑
         """
         # --- 1. 视觉遗忘 (Visual Pruning) ---
         if self.keep_last_screenshots > 0:
-            img_msgs = [m for m in self.history if m.image_base64]
+            img_msgs = [m for m in self.history if m.has_image]
             if len(img_msgs) > self.keep_last_screenshots:
                 num_to_remove = len(img_msgs) - self.keep_last_screenshots
                 removed_count = 0
                 for msg in self.history:
-                    if msg.image_base64:
+                    if msg.has_image:
                         if removed_count < num_to_remove:
                             msg.image_base64 = None
+                            msg.attachments = []
                             msg.content = f"[截图已移除] {msg.content or ''}"
                             removed_count += 1
                         else:
@@ -0,0 +1,21 @@
+"""
+Agent类型
+批量执行和会话运行时共用的Agent类型常量和CodeAgent工作池的构建函数。
+不导入SmartRouter和GUI依赖，非Windows平台也可以使用。
+"""
+
+AGENT_CODE = "code"
+AGENT_GUI = "gui"
+AGENTS = (AGENT_CODE, AGENT_GUI)
+
+
+def other_agent(agent_type: str) -> str:
+    """失败切换时的另一个Agent"""
+    return AGENT_GUI if agent_type == AGENT_CODE else AGENT_CODE
+
+
+def isolated_code_agent():
+    """创建使用独立工具注册中心和代码执行器的CodeAgent，供并发执行的工作池使用"""
+    from argus.agents.code_agent.agent import CodeAgent
+
+    return CodeAgent(isolated=True)
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -6,20 +7,39 @@ import threading
 from queue import Queue
 
 from dotenv import load_dotenv
-from litellm import completion
 
 load_dotenv()
 
 from argus.agents.agent_memory.memory import MemoryManager
-from argus.tools import get_global_registry, initialize_all_tools
+from argus.llm import ModelCascade, get_llm_client, resolve_endpoint
+from argus.tools import create_tools_registry, get_global_registry, initialize_all_tools
+from argus.tools.media import extract_attachments, supports_vision
+from argus.tools.tool_selector import ToolSelector, create_tool_selection_tools
 
 from .default_prompt import default_prompt, default_prompt_end
+from .tool_call_stream import ToolCallAssembler
 
 
 class CodeAgent:
-    def __init__(self):
+    def __init__(self, isolated: bool = False):
+        """
+        Args:
+            isolated: 使用独立的工具注册中心和代码执行器（多个CodeAgent并发执行任务时）
+        """
         # Initialize tools registry
-        self.tools_registry, self.code_executer = initialize_all_tools()
+        if isolated:
+            self.tools_registry, self.code_executer = create_tools_registry()
+        else:
+            registry, self.code_executer = initialize_all_tools()
+            # request_tools绑定到本Agent的工具选择，不能注册到共享的全局注册中心
+            self.tools_registry = registry.derive()
+        
+        # 按任务只下发相关工具分组的schema，模型可通过request_tools申请更多
+        self.tool_selector = ToolSelector(self.tools_registry)
+        self.tool_selection = None
+        self.tools_registry.register_multiple(
+            create_tool_selection_tools(self.tools_registry, lambda: self.tool_selection)
+        )
         
         self.SYSTEM_PROMPT = default_prompt.format(language=str(self.code_executer.language_list))
         logging.info("[CodeAgent]" + self.SYSTEM_PROMPT)
@@ -27,17 +47,22 @@ class CodeAgent:
         self.SYSTEM_PROMPT_END = default_prompt_end
         self.loop_breakers = ["The task is done.", "The task is impossible.", "任务完成", "任务不可能"]
         
-        self.model = os.getenv("CodeAgent_MODEL")
-        self.api_base = os.getenv("CodeAgent_API_BASE")
-        self.api_key = os.getenv("CodeAgent_API_KEY")
+        self.endpoint = resolve_endpoint("CodeAgent")
+        self.model = self.endpoint.model
+        self.llm = get_llm_client()
+        # 简单的步骤先用便宜模型，回复不可用时升级到主模型
+        self.cascade = ModelCascade.from_env("CodeAgent", self.endpoint)
         
         self.stop_agent = False
+        self._streamed_content = ""
         
         # Initialize memory manager
+        # 工具结果中的图片：支持图片输入的模型只重发最近几张，其他模型只收到保存后的文件路径
+        self.vision = supports_vision(self.model)
         self.memory = MemoryManager(
             agent_name="CodeAgent",
             max_tokens=8000,
-            keep_last_screenshots=0,
+            keep_last_screenshots=2,
             keep_function_calls=10,  # 保留更多function call历史
             save_dir="./memory_storage/code_agent",
             model=self.model
@@ -48,9 +73,9 @@ class CodeAgent:
         
         logging.info(f"[CodeAgent] 已注册工具:\n{self.tools_registry.get_tools_summary()}")
 
-    def _listener(self, message_from_client: Queue):
-        """监听来自客户端的信息"""
-        while not self.stop_agent:
+    def _listener(self, message_from_client: Queue, task_done: threading.Event):
+        """监听来自客户端的信息，任务结束后退出"""
+        while not self.stop_agent and not task_done.is_set():
             try:
                 message = message_from_client.get(timeout=0.5)
             except queue.Empty:
@@ -73,36 +98,229 @@ class CodeAgent:
                     return True
         return False
 
-    def _execute_tool_calls(self, tool_calls, message_to_client):
-        """执行工具调用并返回结果"""
-        results = self.tools_registry.execute_tool_calls(tool_calls)
+    def _handle_chunk(self, chunk, assembler: ToolCallAssembler, message_to_client, step=None) -> str:
+        """转发一个数据块的文本增量，把tool_call片段交给拼装器，返回文本增量"""
+        if step is not None:
+            step.observe(chunk)
+        if not chunk.choices:
+            return ""
+        delta = chunk.choices[0].delta
+        if delta.content:
+            self._streamed_content += delta.content
+            message_to_client.put({"name": "CodeAgent", "type": "ai_content", "content": delta.content})
+        if getattr(delta, "tool_calls", None):
+            assembler.feed(delta.tool_calls)
+        return delta.content or ""
+
+    def _stream_response(self, response, assembler: ToolCallAssembler, message_to_client, step=None) -> str:
+        """逐块转发文本增量，把tool_call片段交给拼装器，返回完整文本"""
+        content = ""
+        message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[BEGIN]"})
+        for chunk in response:
+            if self.stop_agent:
+                logging.info("[CodeAgent][STOP]: 用户在生成过程中停止")
+                break
+            content += self._handle_chunk(chunk, assembler, message_to_client, step)
+        message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[END]"})
+        return content
+
+    async def _astream_response(self, response, assembler: ToolCallAssembler, message_to_client, step=None) -> str:
+        """_stream_response()的asyncio版本；任务被取消时关闭响应流"""
+        content = ""
+        message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[BEGIN]"})
+        try:
+            async for chunk in response:
+                if self.stop_agent:
+                    logging.info("[CodeAgent][STOP]: 用户在生成过程中停止")
+                    break
+                content += self._handle_chunk(chunk, assembler, message_to_client, step)
+        finally:
+            aclose = getattr(response, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[END]"})
+        return content
+
+    def _new_attempt(self, step, message_to_client):
+        """
+        开始生成一步：工具调用的参数一生成完就提交执行，后续调用仍在生成；
+        便宜模型的调用先暂存，整步通过检查后再执行，升级时不会留下已执行的调用。
+        已生成的文本中出现结束语时，之后的调用同样暂存，整步生成完后不再执行
+
+        Returns:
+            (工具批次, 已提交的调用, 暂存的调用, tool_call拼装器)
+        """
+        batch = self.tools_registry.start_batch()
+        dispatched = []
+        deferred = []
+        self._streamed_content = ""
+
+        def on_complete(tool_call):
+            if step.cheap or self._should_stop(self._streamed_content):
+                deferred.append(tool_call)
+                return
+            dispatched.append(tool_call)
+            self._dispatch_tool_call(batch, tool_call, message_to_client)
+
+        return batch, dispatched, deferred, ToolCallAssembler(on_complete=on_complete)
+
+    def _record_abandoned_calls(self, dispatched, results, message_to_client):
+        """生成中途失败：已提交执行的调用照常记录结果，重新生成时模型能看到它们的副作用"""
+        logging.info(f"[CodeAgent] 生成失败，记录已执行的 {len(dispatched)} 个工具调用")
+        self.memory.add_function_call(dispatched, None)
+        self._handle_tool_results(results, message_to_client)
+
+    def _attempt_failed(self, step, error, message_to_client):
+        """模型调用失败：便宜模型升级到主模型，主模型或用户已停止时抛出"""
+        if not step.cheap or self.stop_agent:
+            step.finish(error=error)
+            raise error
+        return self._escalate(step, f"调用失败: {error}", message_to_client, error=error)
+
+    def _review_step(self, step, content, attempt, tools_schemas, message_to_client):
+        """
+        检查生成完的一步
+
+        Returns:
+            (step, 结果)：结果为 (文本, tool_calls, 工具批次)；为None表示已升级到主模型，需要重新生成
+        """
+        batch, dispatched, deferred, assembler = attempt
+        if self.stop_agent:
+            # 用户中途停止时丢弃未生成完的调用，只保留已提交执行的
+            step.finish(content)
+            return step, (content, dispatched, batch)
         
+        tool_calls_list = assembler.finish()
+        reason = self._check_cheap_step(step, content, tool_calls_list, tools_schemas) if step.cheap else None
+        if reason:
+            return self._escalate(step, reason, message_to_client, content=content), None
+        step.finish(content)
+        if self._should_stop(content):
+            # 回复表明任务结束时不再执行暂存的调用，只保留出现结束语之前已提交执行的
+            return step, (content, dispatched, batch)
+        for tool_call in deferred:
+            self._dispatch_tool_call(batch, tool_call, message_to_client)
+        return step, (content, tool_calls_list, batch)
+    
+    def _generate_step(self, step, messages, tools_schemas, message_to_client):
+        """
+        生成一步回复；便宜模型的回复不可用时升级到主模型重新生成
+
+        Returns:
+            (最终使用的step, 文本, tool_calls, 工具批次)
+        """
+        while True:
+            attempt = self._new_attempt(step, message_to_client)
+            try:
+                response = self.llm.completion(
+                    step.endpoint,
+                    messages,
+                    tools=tools_schemas,
+                    tool_choice="auto",
+                    stream=True,
+                    **step.params
+                )
+                content = self._stream_response(response, attempt[3], message_to_client, step)
+            except Exception as e:
+                if attempt[1]:
+                    self._record_abandoned_calls(attempt[1], attempt[0].results(), message_to_client)
+                step = self._attempt_failed(step, e, message_to_client)
+                continue
+            step, result = self._review_step(step, content, attempt, tools_schemas, message_to_client)
+            if result is not None:
+                return (step, *result)
+
+    async def _agenerate_step(self, step, messages, tools_schemas, message_to_client):
+        """_generate_step()的asyncio版本"""
+        while True:
+            attempt = self._new_attempt(step, message_to_client)
+            try:
+                response = await self.llm.acompletion(
+                    step.endpoint,
+                    messages,
+                    tools=tools_schemas,
+                    tool_choice="auto",
+                    stream=True,
+                    **step.params
+                )
+                content = await self._astream_response(response, attempt[3], message_to_client, step)
+            except Exception as e:
+                if attempt[1]:
+                    self._record_abandoned_calls(attempt[1], await attempt[0].aresults(), message_to_client)
+                step = self._attempt_failed(step, e, message_to_client)
+                continue
+            step, result = self._review_step(step, content, attempt, tools_schemas, message_to_client)
+            if result is not None:
+                return (step, *result)
+
+    def _check_cheap_step(self, step, content, tool_calls_list, tools_schemas):
+        """检查便宜模型的回复，不可用时返回原因"""
+        if not content and not tool_calls_list:
+            return "空回复"
+        names = {schema["function"]["name"] for schema in tools_schemas}
+        for tool_call in tool_calls_list:
+            name = tool_call["function"]["name"]
+            if name not in names:
+                return f"调用了未提供的工具 {name}"
+            try:
+                arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+            except ValueError:
+                arguments = None
+            if not isinstance(arguments, dict):
+                return f"工具 {name} 的参数不是合法JSON"
+        return step.low_confidence()
+
+    def _escalate(self, step, reason, message_to_client, content="", error=None):
+        message_to_client.put({
+            "name": "CodeAgent",
+            "type": "text",
+            "content": f"[模型级联] {reason}，使用主模型重新生成"
+        })
+        return self.cascade.escalate(step, reason, content, error)
+
+    def _dispatch_tool_call(self, batch, tool_call, message_to_client):
+        """参数生成完毕的工具调用立即提交执行"""
+        function_name = tool_call["function"]["name"]
+        logging.info(f"[CodeAgent] 开始执行工具 {function_name}（第{len(batch) + 1}个）")
+        message_to_client.put({
+            "name": "CodeAgent",
+            "type": "status",
+            "content": f"[执行工具] {function_name}"
+        })
+        batch.submit(tool_call)
+    
+    def _handle_tool_results(self, results, message_to_client):
+        """转发工具结果到客户端并记录到memory"""
         for result in results:
             tool_call_id = result.pop("tool_call_id")
             function_name = result.pop("function_name")
+            elapsed_ms = result.pop("elapsed_ms", None)
             
             # 处理代码执行的特殊输出
             if function_name == "execute_code":
-                # 发送代码输出到客户端
-                if result.get("outputs"):
-                    for output in result["outputs"]:
-                        message_to_client.put({
-                            "name": "CodeAgent",
-                            "type": "text",
-                            "content": output
-                        })
+                # 发送代码输出到客户端（超长输出只发送头尾摘要）
+                if result.get("output"):
+                    message_to_client.put({
+                        "name": "CodeAgent",
+                        "type": "text",
+                        "content": result["output"]
+                    })
                 
-                if result.get("errors"):
-                    for error in result["errors"]:
-                        message_to_client.put({
-                            "name": "CodeAgent",
-                            "type": "text",
-                            "content": f"[错误] {error}"
-                        })
+                if result.get("error"):
+                    message_to_client.put({
+                        "name": "CodeAgent",
+                        "type": "text",
+                        "content": f"[错误] {result['error']}"
+                    })
             
-            # 记录工具调用结果到memory
+            # 记录工具调用结果到memory，图片作为附件单独存放，不进入JSON文本
+            if self.vision:
+                result, attachments = extract_attachments(result)
+            else:
+                result, _ = extract_attachments(result, save_dir=os.path.join(self.memory.save_dir, "media"))
+                attachments = None
             result_text = json.dumps(result, ensure_ascii=False)
-            self.memory.add_function_result(tool_call_id, function_name, result_text)
+            self.memory.add_function_result(tool_call_id, function_name, result_text, attachments)
             
             # 发送工具执行状态到客户端
             message_to_client.put({
@@ -114,105 +332,187 @@ class CodeAgent:
                 }
             })
             
-            logging.info(f"[CodeAgent] 工具 {function_name} 执行: {'成功' if result.get('success') else '失败'}")
+            logging.info(
+                f"[CodeAgent] 工具 {function_name} 执行: {'成功' if result.get('success') else '失败'} "
+                f"({elapsed_ms}ms)"
+            )
         
         return results
 
-    def task(self, description: str, message_from_client: Queue, message_to_client: Queue):
+    def _start_task(self, description: str, route, python_engine, message_to_client):
         self.stop_agent = False
+        self.tool_selection = self.tool_selector.select(description, route)
+        engine = self.code_executer.set_python_engine(python_engine)
+        logging.info(f"[CodeAgent] Python执行引擎: {engine}")
+        
+        # 新任务开始时清空常驻解释器中的变量，任务内多次执行共享状态
+        self.code_executer.reset()
         
         # Add user task to memory
         self.memory.add("user", description)
-        
-        listener_thread = threading.Thread(target=self._listener, args=(message_from_client,))
-        listener_thread.daemon = True
-        listener_thread.start()
+        self.cascade.start_task()
+        self._last_step_ok = False
         
         logging.info("[CodeAgent][START]")
         message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[START]"})
+
+    def _prepare_iteration(self, iteration: int, max_iterations: int):
+        """获取context和本轮下发的工具，返回 (messages, tools_schemas, step)"""
+        logging.info(f"[CodeAgent] 迭代 {iteration}/{max_iterations}")
         
-        iteration = 0
-        max_iterations = 30
+        # 获取context并调用LLM（带function calling）
+        messages = self.memory.get_context()
+        tools_schemas = self.tool_selection.get_function_schemas()
+        logging.info(f"[CodeAgent] {self.tool_selection.describe()}")
         
-        while not self.stop_agent and iteration < max_iterations:
-            iteration += 1
-            logging.info(f"[CodeAgent] 迭代 {iteration}/{max_iterations}")
+        # 上一步的工具都执行成功时，这一步通常只需确认结果或决定下一步，先用便宜模型
+        step = self.cascade.begin(messages, easy=iteration > 1 and self._last_step_ok)
+        return messages, tools_schemas, step
+
+    def _generation_failed(self, error, message_to_client):
+        logging.error(f"LLM调用失败: {error}")
+        message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[ERROR]"})
+        message_to_client.put({"name": "CodeAgent", "type": "text", "content": f"错误: {str(error)}"})
+
+    def _record_tool_calls(self, content, tool_calls_list):
+        if content:
+            logging.info(f"[CodeAgent] AI回复: {content[:100]}...")
+        if tool_calls_list:
+            # 记录到memory
+            self.memory.add_function_call(tool_calls_list, content or None)
+            logging.info(f"[CodeAgent] 执行 {len(tool_calls_list)} 个工具调用")
+
+    def _finish_iteration(self, step, content, tool_calls_list, results, message_to_client) -> bool:
+        """
+        处理这一步的工具结果或文本回复
+
+        Returns:
+            是否结束任务
+        """
+        if tool_calls_list:
+            self._last_step_ok = all(result.get("success") for result in results)
+            self.cascade.outcome(step, self._last_step_ok)
+            self._handle_tool_results(results, message_to_client)
             
-            # 获取context并调用LLM（带function calling）
-            messages = self.memory.get_context()
-            tools_schemas = self.tools_registry.get_function_schemas()
+            # 添加结束提示
+            self.memory.add("user", "工具执行完成。" + self.SYSTEM_PROMPT_END)
             
-            try:
-                response = completion(
-                    model=f"volcengine/{self.model}",
-                    api_base=self.api_base,
-                    api_key=self.api_key,
-                    messages=messages,
-                    tools=tools_schemas,
-                    tool_choice="auto",
-                    stream=False
-                )
-            except Exception as e:
-                logging.error(f"LLM调用失败: {e}")
-                message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[ERROR]"})
-                message_to_client.put({"name": "CodeAgent", "type": "text", "content": f"错误: {str(e)}"})
-                break
-            
-            message = response.choices[0].message
+            if self._should_stop(content):
+                logging.info("[CodeAgent] AI表明任务完成")
+                return True
             
-            # 处理文本内容
-            if message.content:
-                logging.info(f"[CodeAgent] AI回复: {message.content[:100]}...")
-                message_to_client.put({
-                    "name": "CodeAgent",
-                    "type": "ai_content",
-                    "content": message.content
-                })
-                
-                # 检查是否想要停止
-                if self._should_stop(message.content):
-                    logging.info("[CodeAgent] AI表明任务完成")
-                    self.memory.add("assistant", message.content)
-                    break
+        else:
+            self._last_step_ok = False
+            # 没有tool calls，添加assistant回复到memory
+            self.memory.add("assistant", content)
             
-            # 处理tool calls
-            if hasattr(message, 'tool_calls') and message.tool_calls:
-                tool_calls_list = [tc.model_dump() if hasattr(tc, 'model_dump') else tc for tc in message.tool_calls]
-                
-                # 记录到memory
-                self.memory.add_function_call(tool_calls_list, message.content)
-                
-                # 执行工具
-                logging.info(f"[CodeAgent] 执行 {len(tool_calls_list)} 个工具调用")
-                message_to_client.put({
-                    "name": "CodeAgent",
-                    "type": "status",
-                    "content": f"[执行工具] {len(tool_calls_list)}个"
-                })
-                
-                results = self._execute_tool_calls(tool_calls_list, message_to_client)
-                
-                # 添加结束提示
-                self.memory.add("user", "工具执行完成。" + self.SYSTEM_PROMPT_END)
-                
-            else:
-                # 没有tool calls，添加assistant回复到memory
-                self.memory.add("assistant", message.content or "")
-                
-                # 如果没有tool calls且没有特殊指示，添加提示
-                if not self._should_stop(message.content):
-                    self.memory.add("user", "请继续执行任务或使用工具。" + self.SYSTEM_PROMPT_END)
+            # 检查是否想要停止
+            if self._should_stop(content):
+                logging.info("[CodeAgent] AI表明任务完成")
+                return True
             
-            # 检查用户是否停止
-            if self.stop_agent:
-                logging.info("[CodeAgent][STOP]: 用户停止")
-                break
+            self.memory.add("user", "请继续执行任务或使用工具。" + self.SYSTEM_PROMPT_END)
         
+        # 检查用户是否停止
+        if self.stop_agent:
+            logging.info("[CodeAgent][STOP]: 用户停止")
+            return True
+        return False
+
+    def _end_task(self, iteration: int, max_iterations: int, message_to_client):
         if iteration >= max_iterations:
             logging.warning(f"[CodeAgent] 达到最大迭代次数 {max_iterations}")
             message_to_client.put({"name": "CodeAgent", "type": "text", "content": f"达到最大迭代次数 {max_iterations}"})
         
+        logging.info(f"[CodeAgent] 工具缓存统计: {self.tools_registry.get_metrics()['cache']}")
+        logging.info(f"[CodeAgent] LLM调用统计: {self.llm.get_metrics()}")
+        if self.cascade.enabled:
+            logging.info(f"[CodeAgent] 模型级联统计: {self.cascade.get_metrics()}")
+        logging.info(f"[CodeAgent] 工具子集共节省约 {self.tool_selection.tokens_saved} prompt tokens")
         logging.info("[CodeAgent][STOP]: 任务完成")
         message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[STOP]"})
+
+    def task(
+        self,
+        description: str,
+        message_from_client: Queue,
+        message_to_client: Queue,
+        route=None,
+        python_engine=None
+    ):
+        """
+        Args:
+            route: 路由器的判断结果(agent_type, confidence)，用于选择下发的工具分组
+            python_engine: 本任务的Python执行引擎（"jupyter"或"fork"），None使用默认引擎
+        """
+        self._start_task(description, route, python_engine, message_to_client)
+        
+        task_done = threading.Event()
+        listener_thread = threading.Thread(target=self._listener, args=(message_from_client, task_done))
+        listener_thread.daemon = True
+        listener_thread.start()
+        
+        iteration = 0
+        max_iterations = 30
+        
+        while not self.stop_agent and iteration < max_iterations:
+            iteration += 1
+            messages, tools_schemas, step = self._prepare_iteration(iteration, max_iterations)
+            try:
+                step, content, tool_calls_list, batch = self._generate_step(
+                    step, messages, tools_schemas, message_to_client
+                )
+            except Exception as e:
+                self._generation_failed(e, message_to_client)
+                break
+            
+            self._record_tool_calls(content, tool_calls_list)
+            # 等待已提交的工具执行完成
+            results = batch.results() if tool_calls_list else []
+            if self._finish_iteration(step, content, tool_calls_list, results, message_to_client):
+                break
+        
+        self._end_task(iteration, max_iterations, message_to_client)
+        task_done.set()
+        
+        return "任务结束"
+
+    async def atask(self, description: str, message_to_client, route=None, python_engine=None):
+        """
+        task()的asyncio版本：模型调用、限流排队和等待工具结果都不占用线程，
+        多个会话的任务可以在同一个事件循环中并发
+
+        停止任务时取消运行atask的asyncio任务：进行中的模型请求立即关闭，正在执行的代码被中断
+
+        Args:
+            message_to_client: 事件输出，需提供线程安全的put()（如sessions.EventStream）
+        """
+        self._start_task(description, route, python_engine, message_to_client)
+        
+        iteration = 0
+        max_iterations = 30
+        try:
+            while not self.stop_agent and iteration < max_iterations:
+                iteration += 1
+                messages, tools_schemas, step = self._prepare_iteration(iteration, max_iterations)
+                try:
+                    step, content, tool_calls_list, batch = await self._agenerate_step(
+                        step, messages, tools_schemas, message_to_client
+                    )
+                except Exception as e:
+                    self._generation_failed(e, message_to_client)
+                    break
+                
+                self._record_tool_calls(content, tool_calls_list)
+                results = await batch.aresults() if tool_calls_list else []
+                if self._finish_iteration(step, content, tool_calls_list, results, message_to_client):
+                    break
+        except asyncio.CancelledError:
+            self.stop_agent = True
+            self.code_executer.interrupt()
+            logging.info("[CodeAgent][STOP]: 任务被取消")
+            message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[STOP]"})
+            raise
         
+        self._end_task(iteration, max_iterations, message_to_client)
         return "任务结束"
@@ -0,0 +1,92 @@
+"""
+流式tool_calls拼装
+把流式响应中按index分片到达的tool_call（id、函数名、参数JSON片段）拼装成完整调用。
+某个调用的参数JSON一旦完整（或后一个调用已经开始、流已结束），立即按顺序回调，
+调用方可以在后续调用仍在生成时就开始执行它。
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _get(obj: Any, key: str) -> Any:
+    """兼容dict和litellm/OpenAI的delta对象"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+class ToolCallAssembler:
+    """
+    tool_call增量拼装器
+
+    Args:
+        on_complete: 调用参数拼装完成时的回调，参数为OpenAI格式的tool_call字典
+    """
+
+    def __init__(self, on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.on_complete = on_complete
+        self._calls: List[Dict[str, Any]] = []
+        self._emitted = 0
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """已完成（已回调）的tool_calls，按顺序"""
+        return self._calls[:self._emitted]
+
+    def feed(self, delta_tool_calls) -> None:
+        """处理一个chunk中的delta.tool_calls"""
+        for delta in delta_tool_calls or []:
+            call = self._slot(delta)
+            if _get(delta, "id"):
+                call["id"] = _get(delta, "id")
+            function = _get(delta, "function")
+            name = _get(function, "name")
+            if name:
+                call["function"]["name"] = name
+            arguments = _get(function, "arguments")
+            if arguments:
+                call["function"]["arguments"] += arguments
+        self._emit_ready()
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """流结束：剩余的调用全部视为完成，返回所有tool_calls"""
+        self._emit_ready(final=True)
+        return self.tool_calls
+
+    def _slot(self, delta) -> Dict[str, Any]:
+        index = _get(delta, "index")
+        if index is None:
+            # 部分服务不返回index：带新id的片段开始一个新调用，否则续写最后一个
+            delta_id = _get(delta, "id")
+            if self._calls and (not delta_id or delta_id == self._calls[-1]["id"]):
+                index = len(self._calls) - 1
+            else:
+                index = len(self._calls)
+        while len(self._calls) <= index:
+            self._calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+        return self._calls[index]
+
+    def _emit_ready(self, final: bool = False) -> None:
+        while self._emitted < len(self._calls):
+            call = self._calls[self._emitted]
+            later_started = self._emitted + 1 < len(self._calls)
+            if not (final or later_started or self._arguments_complete(call)):
+                return
+            if not call["id"]:
+                call["id"] = f"call_{self._emitted}"
+            self._emitted += 1
+            if self.on_complete:
+                self.on_complete(call)
+
+    @staticmethod
+    def _arguments_complete(call: Dict[str, Any]) -> bool:
+        # 参数是JSON对象，对象的真前缀不可能是合法JSON，能解析即表示已完整
+        if not call["function"]["name"]:
+            return False
+        try:
+            return isinstance(json.loads(call["function"]["arguments"]), dict)
+        except ValueError:
+            return False
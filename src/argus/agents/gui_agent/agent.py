@@ -1,16 +1,17 @@
+import asyncio
 import logging
-import os
 import queue
 import threading
 from queue import Queue
 
 from dotenv import load_dotenv
-from litellm import completion
 
 load_dotenv()
 
 from argus.agents.agent_memory.memory import MemoryManager
+from argus.llm import ModelCascade, get_llm_client, resolve_endpoint
 from argus.tools import initialize_all_tools
+from argus.tools.base_tool import CACHE_TAG_DESKTOP
 from argus.tools.screen.screen import screen
 
 from .action_parser import (
@@ -25,9 +26,11 @@ from .default_prompt import get_default_prompt
 class GUIAgent:
     def __init__(self):
         self.default_prompt = get_default_prompt(thought=False)
-        self.model = os.getenv("GUIAgent_MODEL")
-        self.api_base = os.getenv("GUIAgent_API_BASE")
-        self.api_key = os.getenv("GUIAgent_API_KEY")
+        self.endpoint = resolve_endpoint("GUIAgent")
+        self.model = self.endpoint.model
+        self.llm = get_llm_client()
+        # 简单的步骤先用便宜模型，回复不可用时升级到主模型
+        self.cascade = ModelCascade.from_env("GUIAgent", self.endpoint)
         self.stop_agent = False
         
         # Initialize tools registry (still useful for keeping tools loaded/validated)
@@ -63,7 +66,57 @@ class GUIAgent:
                     self.stop_agent = True
                     logging.info("[GUIAgent]用户停止agent")
 
-    def task(self, description: str, message_from_client: Queue, message_to_client: Queue):
+    def _handle_chunk(self, chunk, step, message_to_client) -> str:
+        step.observe(chunk)
+        if chunk.choices and chunk.choices[0].delta.content:
+            delta = chunk.choices[0].delta.content
+            message_to_client.put({"name": "GUIAgent", "type": "ai_content", "content": delta})
+            return delta
+        return ""
+
+    def _stream_response(self, response, step, message_to_client: Queue):
+        """逐块转发回复，返回完整文本；用户停止时返回None"""
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[BEGIN]"})
+        ai_content = ""
+        for chunk in response:
+            if self.stop_agent:
+                return None
+            ai_content += self._handle_chunk(chunk, step, message_to_client)
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[END]"})
+        return ai_content
+
+    async def _astream_response(self, response, step, message_to_client):
+        """_stream_response()的asyncio版本；任务被取消时关闭响应流"""
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[BEGIN]"})
+        ai_content = ""
+        try:
+            async for chunk in response:
+                if self.stop_agent:
+                    return None
+                ai_content += self._handle_chunk(chunk, step, message_to_client)
+        finally:
+            aclose = getattr(response, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[END]"})
+        return ai_content
+
+    def _check_cheap_step(self, step, ai_content: str):
+        """检查便宜模型的回复，不可用时返回原因"""
+        action_name, _ = parse_action(parse_response(ai_content))
+        if not action_name:
+            return "动作无法解析"
+        return step.low_confidence()
+
+    def _escalate(self, step, reason: str, message_to_client: Queue, content: str = "", error=None):
+        message_to_client.put({"name": "GUIAgent", "type": "text", "content": f"[模型级联] {reason}，使用主模型重新生成"})
+        return self.cascade.escalate(step, reason, content, error)
+
+    def _log_cascade(self):
+        if self.cascade.enabled:
+            logging.info(f"[GUIAgent] 模型级联统计: {self.cascade.get_metrics()}")
+
+    def _start_task(self, description: str, message_to_client):
         logging.info("[GUIAgent]任务: %s", description)
         
         # 1. 初始化记忆模块
@@ -73,12 +126,126 @@ class GUIAgent:
         self.memory.set_system_prompt(self.default_prompt.format(instruction=description))
         
         self.stop_agent = False
-        listener_thread = threading.Thread(target=self._listener, args=(message_from_client,))
-        listener_thread.daemon = True
-        listener_thread.start()
+        self.cascade.start_task()
+        self._last_action_ok = False
         
         logging.info("[GUIAgent][START]")
         message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[START]"})
+
+    def _capture(self, message_to_client):
+        """截屏并加入记忆，返回 (原始宽, 原始高, 左偏移, 上偏移)"""
+        screenshot_dict, origin_width, origin_height, offset_left, offset_top = screen.screenshot_base64(
+            resize_factor=0.8
+        )
+        message_to_client.put({"name": "GUIAgent", **screenshot_dict})
+        
+        # 3. 将截图添加到记忆 (MemoryManager会自动处理图片修剪，只保留最近N张)
+        # 注意: 我们添加一个简单的文本content描述，这对VLM有时有帮助
+        self.memory.add(
+            role="user",
+            content="(Current Screen State)", 
+            image_base64=screenshot_dict['content']
+        )
+        return origin_width, origin_height, offset_left, offset_top
+
+    def _review(self, step, ai_content, message_to_client):
+        """
+        检查生成完的回复
+
+        Returns:
+            (step, 是否需要重新生成)：便宜模型的回复不可用时返回主模型的step
+        """
+        if ai_content is None:
+            step.finish()
+            return step, False
+        reason = self._check_cheap_step(step, ai_content) if step.cheap else None
+        if reason:
+            return self._escalate(step, reason, message_to_client, content=ai_content), True
+        step.finish(ai_content)
+        return step, False
+
+    def _user_stopped(self, message_to_client):
+        logging.info("[GUIAgent][STOP]: User stop")
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
+        return "Task failed: User stopped"
+
+    def _parse(self, ai_content: str, origin_width: int, origin_height: int, message_to_client):
+        """
+        解析动作并发送可视化坐标点
+
+        Returns:
+            (动作名, 参数)
+        """
+        action_text = parse_response(ai_content)
+        action_name, action_args = parse_action(action_text)
+        
+        logging.info(f"[GUIAgent] Parsed Action: {action_name}, Args: {action_args}")
+        if action_name == "finished":
+            return action_name, action_args
+        
+        # 发送可视化坐标点
+        action_point = get_action_coordinates(action_name, action_args, origin_width, origin_height)
+        if action_point:
+            content = {
+                "x": action_point['x'], 
+                "y": action_point['y'], 
+                "action": action_name
+            }
+            if 'xx' in action_point: content['xx'] = action_point['xx']
+            if 'yy' in action_point: content['yy'] = action_point['yy']
+                
+            message_to_client.put({
+                "name": "GUIAgent", 
+                "type": "action_point", 
+                "content": content
+            })
+        return action_name, action_args
+
+    def _finished(self, action_args, message_to_client):
+        logging.info(f"[GUIAgent] Finished: {action_args.get('content', '')}")
+        self._log_cascade()
+        self.stop_agent = True
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
+        return f"Task finished: {action_args.get('content', '')}"
+
+    def _execute(self, action_name, action_args, screen_info):
+        """执行动作"""
+        origin_width, origin_height, offset_left, offset_top = screen_info
+        map_action_to_function(
+            action_name, 
+            action_args, 
+            origin_width, 
+            origin_height, 
+            offset_left, 
+            offset_top
+        )
+        # 动作改变了桌面，依赖桌面状态的工具缓存失效
+        self.tools_registry.invalidate_cache(CACHE_TAG_DESKTOP)
+
+    def _action_done(self, step, action_name):
+        self._last_action_ok = bool(action_name)
+        self.cascade.outcome(step, self._last_action_ok)
+
+    def _action_failed(self, step, error, message_to_client):
+        self._last_action_ok = False
+        self.cascade.outcome(step, False)
+        logging.error(f"[GUIAgent] Error executing action: {error}", exc_info=True)
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": f"Error: {str(error)}"})
+        # 可以选择将错误信息加回记忆，帮助模型下一次纠正
+        # self.memory.add(role="system", content=f"Previous action failed: {str(error)}")
+
+    def _end_task(self, iteration: int, max_iterations: int, message_to_client):
+        self._log_cascade()
+        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
+        if iteration >= max_iterations:
+            return "Task failed: Max iterations reached"
+        return "Task ended"
+
+    def task(self, description: str, message_from_client: Queue, message_to_client: Queue):
+        self._start_task(description, message_to_client)
+        listener_thread = threading.Thread(target=self._listener, args=(message_from_client,))
+        listener_thread.daemon = True
+        listener_thread.start()
         
         iteration = 0
         max_iterations = 50
@@ -89,107 +256,113 @@ class GUIAgent:
             
             # 2. 截屏
             try:
-                screenshot_dict, origin_width, origin_height, offset_left, offset_top = screen.screenshot_base64(
-                    resize_factor=0.8
-                )
+                screen_info = self._capture(message_to_client)
             except Exception as e:
                 logging.error(f"截屏失败: {e}")
                 return f"任务失败: 截屏错误"
             
-            message_to_client.put({"name": "GUIAgent", **screenshot_dict})
-            
-            # 3. 将截图添加到记忆 (MemoryManager会自动处理图片修剪，只保留最近N张)
-            # 注意: 我们添加一个简单的文本content描述，这对VLM有时有帮助
-            self.memory.add(
-                role="user",
-                content="(Current Screen State)", 
-                image_base64=screenshot_dict['content']
-            )
-            
             # 4. 从记忆获取完整上下文
             messages = self.memory.get_context()
             
-            # 5. 调用LLM
-            try:
-                logging.info("[GUIAgent] Waiting for LLM response...")
-                response = completion(
-                    model=f"volcengine/{self.model}",
-                    api_base=self.api_base,
-                    api_key=self.api_key,
-                    messages=messages,
-                    stream=True,
-                    # thinking="enabled" # Enable if supported by the model provider
-                )
-            except Exception as e:
-                logging.error(f"LLM调用失败: {e}")
-                return f"任务失败: LLM错误"
-            
-            message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[BEGIN]"})
-            
-            ai_content = ""
-            for chunk in response:
-                if self.stop_agent:
-                    logging.info("[GUIAgent][STOP]: User stop")
-                    message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
-                    return "Task failed: User stopped"
-                    
-                if chunk.choices and chunk.choices[0].delta.content:
-                    delta = chunk.choices[0].delta.content
-                    message_to_client.put({"name": "GUIAgent", "type": "ai_content", "content": delta})
-                    ai_content += delta
+            # 5. 调用LLM：上一个动作执行成功时（如确认对话框已关闭），先用便宜模型
+            step = self.cascade.begin(messages, easy=iteration > 1 and self._last_action_ok)
+            retry = True
+            while retry:
+                try:
+                    logging.info("[GUIAgent] Waiting for LLM response...")
+                    response = self.llm.completion(
+                        step.endpoint,
+                        messages,
+                        stream=True,
+                        **step.params
+                        # thinking="enabled" # Enable if supported by the model provider
+                    )
+                    ai_content = self._stream_response(response, step, message_to_client)
+                except Exception as e:
+                    if step.cheap:
+                        step = self._escalate(step, f"调用失败: {e}", message_to_client, error=e)
+                        continue
+                    step.finish(error=e)
+                    logging.error(f"LLM调用失败: {e}")
+                    return f"任务失败: LLM错误"
+                step, retry = self._review(step, ai_content, message_to_client)
             
-            message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[END]"})
+            if ai_content is None:
+                return self._user_stopped(message_to_client)
             
             # 6. 将AI回复添加到记忆
             self.memory.add(role="assistant", content=ai_content)
             
             # 7. 解析并执行动作
             try:
-                action_text = parse_response(ai_content)
-                action_name, action_args = parse_action(action_text)
+                action_name, action_args = self._parse(ai_content, *screen_info[:2], message_to_client)
+                if action_name == "finished":
+                    return self._finished(action_args, message_to_client)
+                self._execute(action_name, action_args, screen_info)
+                self._action_done(step, action_name)
+            except Exception as e:
+                self._action_failed(step, e, message_to_client)
+        
+        return self._end_task(iteration, max_iterations, message_to_client)
+
+    async def atask(self, description: str, message_to_client):
+        """
+        task()的asyncio版本：模型调用不占用线程，截屏和执行动作在线程中进行
+
+        停止任务时取消运行atask的asyncio任务，进行中的模型请求立即关闭
+
+        Args:
+            message_to_client: 事件输出，需提供线程安全的put()（如sessions.EventStream）
+        """
+        self._start_task(description, message_to_client)
+        
+        iteration = 0
+        max_iterations = 50
+        try:
+            while not self.stop_agent and iteration < max_iterations:
+                iteration += 1
+                logging.info(f"[GUIAgent] 迭代 {iteration}/{max_iterations}")
                 
-                logging.info(f"[GUIAgent] Parsed Action: {action_name}, Args: {action_args}")
+                try:
+                    screen_info = await asyncio.to_thread(self._capture, message_to_client)
+                except Exception as e:
+                    logging.error(f"截屏失败: {e}")
+                    return f"任务失败: 截屏错误"
                 
-                if action_name == "finished":
-                    logging.info(f"[GUIAgent] Finished: {action_args.get('content', '')}")
-                    self.stop_agent = True
-                    message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
-                    return f"Task finished: {action_args.get('content', '')}"
+                messages = self.memory.get_context()
+                step = self.cascade.begin(messages, easy=iteration > 1 and self._last_action_ok)
+                retry = True
+                while retry:
+                    try:
+                        logging.info("[GUIAgent] Waiting for LLM response...")
+                        response = await self.llm.acompletion(step.endpoint, messages, stream=True, **step.params)
+                        ai_content = await self._astream_response(response, step, message_to_client)
+                    except Exception as e:
+                        if step.cheap:
+                            step = self._escalate(step, f"调用失败: {e}", message_to_client, error=e)
+                            continue
+                        step.finish(error=e)
+                        logging.error(f"LLM调用失败: {e}")
+                        return f"任务失败: LLM错误"
+                    step, retry = self._review(step, ai_content, message_to_client)
                 
-                # 发送可视化坐标点
-                action_point = get_action_coordinates(action_name, action_args, origin_width, origin_height)
-                if action_point:
-                    content = {
-                        "x": action_point['x'], 
-                        "y": action_point['y'], 
-                        "action": action_name
-                    }
-                    if 'xx' in action_point: content['xx'] = action_point['xx']
-                    if 'yy' in action_point: content['yy'] = action_point['yy']
-                        
-                    message_to_client.put({
-                        "name": "GUIAgent", 
-                        "type": "action_point", 
-                        "content": content
-                    })
+                if ai_content is None:
+                    return self._user_stopped(message_to_client)
                 
-                # 执行函数
-                map_action_to_function(
-                    action_name, 
-                    action_args, 
-                    origin_width, 
-                    origin_height, 
-                    offset_left, 
-                    offset_top
-                )
+                self.memory.add(role="assistant", content=ai_content)
                 
-            except Exception as e:
-                logging.error(f"[GUIAgent] Error executing action: {e}", exc_info=True)
-                message_to_client.put({"name": "GUIAgent", "type": "status", "content": f"Error: {str(e)}"})
-                # 可以选择将错误信息加回记忆，帮助模型下一次纠正
-                # self.memory.add(role="system", content=f"Previous action failed: {str(e)}")
+                try:
+                    action_name, action_args = self._parse(ai_content, *screen_info[:2], message_to_client)
+                    if action_name == "finished":
+                        return self._finished(action_args, message_to_client)
+                    await asyncio.to_thread(self._execute, action_name, action_args, screen_info)
+                    self._action_done(step, action_name)
+                except Exception as e:
+                    self._action_failed(step, e, message_to_client)
+        except asyncio.CancelledError:
+            self.stop_agent = True
+            logging.info("[GUIAgent][STOP]: 任务被取消")
+            message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
+            raise
         
-        message_to_client.put({"name": "GUIAgent", "type": "status", "content": "[STOP]"})
-        if iteration >= max_iterations:
-            return "Task failed: Max iterations reached"
-        return "Task ended"
+        return self._end_task(iteration, max_iterations, message_to_client)
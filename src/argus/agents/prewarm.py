@@ -0,0 +1,138 @@
+"""
+后台预热
+启动时在后台线程上构建Agent（导入依赖、初始化工具、创建代码执行器、加载记忆文件）、
+启动Python执行环境、预先建立LLM连接，首个任务只需等待尚未完成的部分。
+每一项只构建一次；构建失败时下次使用会重新构建，错误在使用处抛出。
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+PREWARM_CODE = "code"
+PREWARM_GUI = "gui"
+PREWARM_LLM = "llm"
+PREWARM_TARGETS = (PREWARM_CODE, PREWARM_GUI, PREWARM_LLM)
+
+
+def targets_from_env() -> List[str]:
+    """
+    ARGUS_PREWARM: 0关闭预热，1/all预热全部，或逗号分隔的预热项（code,gui,llm）
+    """
+    value = os.getenv("ARGUS_PREWARM", "1").strip().lower()
+    if value in ("", "0", "false", "off", "no"):
+        return []
+    if value in ("1", "true", "on", "yes", "all"):
+        return list(PREWARM_TARGETS)
+    targets = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in targets if item not in PREWARM_TARGETS]
+    if unknown:
+        logging.warning(f"[Prewarm] 未知的预热项: {', '.join(unknown)}")
+    return [item for item in targets if item in PREWARM_TARGETS]
+
+
+def warm_llm(client, endpoints: Iterable[Any]):
+    """
+    预热LLM调用路径：加载模型对应的tokenizer（记忆管理估算token时使用），
+    并通过共享LLM客户端预先建立到各API地址的keep-alive连接
+
+    Args:
+        client: LLMClient
+        endpoints: LLMEndpoint或EndpointPool列表
+    """
+    try:
+        import litellm
+    except ImportError:
+        litellm = None
+    # endpoint池展开为各个成员
+    endpoints = [member for endpoint in endpoints for member in getattr(endpoint, "endpoints", [endpoint])]
+    for endpoint in endpoints:
+        if litellm is not None and endpoint.model:
+            try:
+                litellm.token_counter(model=endpoint.model, text="warm up")
+            except Exception as e:
+                logging.debug(f"[Prewarm] 加载 {endpoint.model} 的tokenizer失败: {e}")
+    client.prewarm(endpoint.api_base for endpoint in endpoints)
+
+
+class Prewarmer:
+    """
+    按名称管理后台构建任务
+
+    submit() 在守护线程上启动构建（同名任务只启动一次），get() 取结果，
+    未完成时等待，未提交过时在后台构建并等待，保证同一对象不会被重复构建。
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # 每项构建耗时（秒）和使用方等待的时间
+        self.timings: Dict[str, float] = {}
+        self.waits: Dict[str, float] = {}
+
+    def submit(self, name: str, factory: Callable[[], Any]) -> Future:
+        """在后台开始构建，已提交过的直接返回原来的Future"""
+        with self._lock:
+            future = self._futures.get(name)
+            if future is not None:
+                return future
+            future = Future()
+            self._futures[name] = future
+        thread = threading.Thread(
+            target=self._run, args=(name, factory, future), name=f"prewarm-{name}", daemon=True
+        )
+        thread.start()
+        return future
+
+    def _run(self, name: str, factory: Callable[[], Any], future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        begin = time.time()
+        try:
+            result = factory()
+        except BaseException as e:
+            with self._lock:
+                # 失败的构建不保留，下次使用时重新构建
+                if self._futures.get(name) is future:
+                    del self._futures[name]
+            logging.warning(f"[Prewarm] 预热 {name} 失败: {e}")
+            future.set_exception(e)
+            return
+        self.timings[name] = time.time() - begin
+        logging.info(f"[Prewarm] {name} 预热完成，耗时 {self.timings[name]:.2f}s")
+        future.set_result(result)
+
+    def get(self, name: str, factory: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """取得构建结果，尚未完成时等待；构建失败时抛出构建时的异常"""
+        future = self.submit(name, factory)
+        if future.done():
+            return future.result()
+        begin = time.time()
+        try:
+            return future.result(timeout=timeout)
+        finally:
+            self.waits[name] = time.time() - begin
+            logging.info(f"[Prewarm] 等待 {name} 预热 {self.waits[name]:.2f}s")
+
+    def discard(self, name: str) -> bool:
+        """
+        放弃一项构建：尚未开始的直接取消，进行中的完成后不再保留结果；之后再使用时重新构建
+
+        Returns:
+            是否放弃了一项构建
+        """
+        with self._lock:
+            future = self._futures.pop(name, None)
+        if future is None:
+            return False
+        if not future.cancel():
+            logging.info(f"[Prewarm] 放弃 {name} 的构建结果")
+        return True
+
+    def status(self) -> Dict[str, str]:
+        """各预热项的状态：pending / done（失败的项不保留）"""
+        with self._lock:
+            return {name: "done" if future.done() else "pending" for name, future in self._futures.items()}
@@ -0,0 +1,188 @@
+"""
+路由决策缓存
+按规范化后的任务文本缓存SmartRouter的路由决策、置信度和实际执行结果，
+相同或高度相似的任务无需再次调用LLM分析。缓存以JSON持久化，按LRU淘汰；
+缓存的路由执行失败时降低置信度，低于阈值后删除，下次重新分析。
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = "./memory_storage/routing_cache.json"
+# 失败一次置信度下降0.25（LLM猜测的路由失败一次即失效，多次成功过的路由可以容忍一次失败），成功一次小幅提升
+FAILURE_PENALTY = 0.25
+SUCCESS_BOOST = 0.05
+MAX_CONFIDENCE = 0.99
+
+
+def normalize_task(task: str) -> str:
+    """全角转半角、小写、数字归一、去掉标点和空白，使仅在这些方面不同的任务命中同一条缓存"""
+    text = unicodedata.normalize("NFKC", task).lower()
+    text = re.sub(r"\d+(\.\d+)?", "0", text)
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def similarity(a: str, b: str) -> float:
+    """字符bigram的Dice系数，中英文都适用"""
+    if not a or not b:
+        return 0.0
+    x, y = _bigrams(a), _bigrams(b)
+    return 2 * len(x & y) / (len(x) + len(y))
+
+
+class RoutingCache:
+    """
+    持久化的路由决策缓存
+
+    Args:
+        path: JSON文件路径，None表示只在内存中缓存
+        max_entries: 最多保存的条目数，超过后淘汰最久未使用的
+        similarity_threshold: 相似度查找的阈值（0-1），0表示只做精确匹配
+        min_confidence: 命中条目的置信度低于此值时视为未命中
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_entries: int = 512,
+        similarity_threshold: float = 0.0,
+        min_confidence: float = 0.5
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.min_confidence = min_confidence
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "invalidations": 0}
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> "RoutingCache":
+        """
+        ARGUS_ROUTING_CACHE: 缓存文件路径（设为空禁用持久化）
+        ARGUS_ROUTING_CACHE_SIZE: 最大条目数
+        ARGUS_ROUTING_CACHE_SIMILARITY: 相似度查找阈值，0禁用
+        """
+        path = os.getenv("ARGUS_ROUTING_CACHE", DEFAULT_CACHE_PATH) or None
+        return cls(
+            path=path,
+            max_entries=int(os.getenv("ARGUS_ROUTING_CACHE_SIZE", "512")),
+            similarity_threshold=float(os.getenv("ARGUS_ROUTING_CACHE_SIMILARITY", "0.9")),
+        )
+
+    def lookup(self, task: str) -> Optional[Tuple[str, float]]:
+        """返回缓存的(agent_type, confidence)，未命中返回None"""
+        key = normalize_task(task)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.similarity_threshold > 0:
+                entry = self._most_similar(key)
+                if entry is not None:
+                    self.stats["similar_hits"] += 1
+            if entry is None or entry["confidence"] < self.min_confidence:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self._entries.move_to_end(normalize_task(entry["task"]))
+            return entry["agent"], entry["confidence"]
+
+    def _most_similar(self, key: str) -> Optional[Dict[str, Any]]:
+        best, best_score = None, self.similarity_threshold
+        for other_key, entry in self._entries.items():
+            # 长度相差太大时不可能达到阈值，跳过计算
+            if 2 * min(len(key), len(other_key)) < best_score * (len(key) + len(other_key)):
+                continue
+            score = similarity(key, other_key)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def put(self, task: str, agent_type: str, confidence: float):
+        """记录一次路由决策（LLM分析结果或实际成功的Agent）"""
+        key = normalize_task(task)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["agent"] != agent_type:
+                entry = {"task": task, "agent": agent_type, "successes": 0, "failures": 0}
+            entry["confidence"] = round(min(confidence, MAX_CONFIDENCE), 3)
+            entry["updated"] = time.time()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save()
+
+    def record_outcome(self, task: str, agent_type: str, success: bool):
+        """
+        记录路由的实际执行结果
+
+        成功时提升置信度（没有缓存条目时新建）；缓存的路由失败时降低置信度，
+        低于min_confidence后删除该条目
+        """
+        key = normalize_task(task)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["agent"] != agent_type:
+                if not success:
+                    return
+                entry = {"task": task, "agent": agent_type, "confidence": 0.8, "successes": 0, "failures": 0}
+                self._entries[key] = entry
+            if success:
+                entry["successes"] += 1
+                entry["confidence"] = round(min(entry["confidence"] + SUCCESS_BOOST, MAX_CONFIDENCE), 3)
+            else:
+                entry["failures"] += 1
+                entry["confidence"] = round(entry["confidence"] - FAILURE_PENALTY, 3)
+                if entry["confidence"] < self.min_confidence:
+                    del self._entries[key]
+                    self.stats["invalidations"] += 1
+                    logging.info(f"[RoutingCache] 缓存的路由 {agent_type} 执行失败，已删除: {task[:50]}")
+            if key in self._entries:
+                entry["updated"] = time.time()
+                self._entries.move_to_end(key)
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"[RoutingCache] 读取缓存失败: {e}")
+            return
+        # 文件中按最近使用顺序保存
+        for entry in entries[-self.max_entries:]:
+            self._entries[normalize_task(entry["task"])] = entry
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.values())
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再替换，避免并发或中途退出时留下损坏的文件
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".routing_cache_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"[RoutingCache] 保存缓存失败: {e}")
@@ -8,15 +8,30 @@ import logging
 import os
 import queue
 import re
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from litellm import completion
 
 load_dotenv()
 
 from argus.agents.code_agent.agent import CodeAgent
 from argus.agents.gui_agent.agent import GUIAgent
+from argus.agents.prewarm import (
+    PREWARM_CODE,
+    PREWARM_GUI,
+    PREWARM_LLM,
+    Prewarmer,
+    targets_from_env,
+    warm_llm,
+)
+from argus.agents.routing_cache import RoutingCache
+from argus.agents.task_classifier import TaskClassifier
+from argus.llm import LLMEndpoint, get_llm_client, resolve_endpoint
+
+# LLM分析失败或回答无法解析时的默认路由（GUI更安全），不写入路由缓存
+DEFAULT_ROUTE = ("gui", 0.5)
 
 
 class SmartRouter:
@@ -25,27 +40,60 @@ class SmartRouter:
     def __init__(self):
         self.gui_agent = None
         self.code_agent = None
-        self.model = os.getenv("GUIAgent_MODEL", "gpt-4o")
-        self.api_key = os.getenv("GUIAgent_API_KEY")
-        self.api_base = os.getenv("GUIAgent_API_BASE")
-        self.routing_model = os.getenv("CodeAgent_MODEL", self.model)
-        self.routing_api_key = os.getenv("CodeAgent_API_KEY", self.api_key)
-        self.routing_api_base = os.getenv("CodeAgent_API_BASE", self.api_base)
+        self.gui_endpoint = resolve_endpoint("GUIAgent", fallback=LLMEndpoint("gpt-4o"))
+        # 路由分析使用CodeAgent的模型，未配置的项沿用GUIAgent的
+        self.routing_endpoint = resolve_endpoint(
+            "CodeAgent", fallback=LLMEndpoint.from_env("GUIAgent", fallback=LLMEndpoint("gpt-4o"))
+        )
+        self.llm = get_llm_client()
+        # 路由决策缓存：重复或相似的任务直接复用之前的决策和执行结果
+        self.routing_cache = RoutingCache.from_env()
+        # 本地分类器：从路由结果学习，置信度足够时无需调用LLM
+        self.classifier = TaskClassifier.from_env()
+        self.classifier_confidence = float(os.getenv("ARGUS_ROUTING_CLASSIFIER_CONFIDENCE", "0.85"))
+        
+        # 懒加载agents（只在需要时初始化），prewarm()可提前在后台构建
+        self.prewarmer = Prewarmer()
+    
+    def prewarm(self, targets: Optional[Iterable[str]] = None):
+        """
+        在后台线程上预热Agent、工具、执行环境和LLM调用路径，立即返回
         
-        # 懒加载agents（只在需要时初始化）
+        Args:
+            targets: 预热项（"code"、"gui"、"llm"），None表示按ARGUS_PREWARM配置
+        """
+        targets = targets_from_env() if targets is None else list(targets)
+        if PREWARM_CODE in targets:
+            self.prewarmer.submit(PREWARM_CODE, self._build_code_agent)
+        if PREWARM_GUI in targets:
+            self.prewarmer.submit(PREWARM_GUI, self._build_gui_agent)
+        if PREWARM_LLM in targets:
+            endpoints = [self.gui_endpoint, self.routing_endpoint]
+            self.prewarmer.submit(PREWARM_LLM, lambda: warm_llm(self.llm, endpoints))
+        if targets:
+            logging.info(f"[SmartRouter] 后台预热: {', '.join(targets)}")
+    
+    def _build_gui_agent(self) -> GUIAgent:
+        agent = GUIAgent()
+        logging.info("[SmartRouter] GUIAgent已初始化")
+        return agent
+    
+    def _build_code_agent(self) -> CodeAgent:
+        agent = CodeAgent()
+        agent.code_executer.prewarm()
+        logging.info("[SmartRouter] CodeAgent已初始化")
+        return agent
         
-    def _get_gui_agent(self):
-        """懒加载GUI Agent"""
+    def get_gui_agent(self):
+        """懒加载GUI Agent，已在后台预热时只等待未完成的部分"""
         if self.gui_agent is None:
-            self.gui_agent = GUIAgent()
-            logging.info("[SmartRouter] GUIAgent已初始化")
+            self.gui_agent = self.prewarmer.get(PREWARM_GUI, self._build_gui_agent)
         return self.gui_agent
     
-    def _get_code_agent(self):
-        """懒加载Code Agent"""
+    def get_code_agent(self):
+        """懒加载Code Agent，已在后台预热时只等待未完成的部分"""
         if self.code_agent is None:
-            self.code_agent = CodeAgent()
-            logging.info("[SmartRouter] CodeAgent已初始化")
+            self.code_agent = self.prewarmer.get(PREWARM_CODE, self._build_code_agent)
         return self.code_agent
     
     def analyze_task(self, task_description: str) -> Tuple[str, float]:
@@ -55,6 +103,74 @@ class SmartRouter:
         Returns:
             (agent_type, confidence): agent类型和置信度
         """
+        decision = self._quick_analyze(task_description)
+        if decision is not None:
+            return decision
+        return self.llm_route(task_description)
+    
+    async def aanalyze_task(self, task_description: str) -> Tuple[str, float]:
+        """analyze_task()的asyncio版本，需要调用LLM时不占用线程"""
+        decision = self._quick_analyze(task_description)
+        if decision is not None:
+            return decision
+        return await self.allm_route(task_description)
+    
+    def warm_candidates(
+        self, task_description: str, targets: Iterable[str] = (PREWARM_CODE, PREWARM_GUI)
+    ) -> Tuple[Optional[Tuple[str, float]], Optional[List[str]]]:
+        """
+        本地判断路由；需要调用LLM时在后台开始构建候选Agent，与LLM路由重叠进行（不受ARGUS_PREWARM影响）
+        
+        本地判断（缓存、分类器、关键词，微秒级）只进行一次，调用方拿到None时再用llm_route()/allm_route()，
+        避免重复查询路由缓存
+        
+        Returns:
+            (本地决策, 本次新开始构建的项)：本地即可判断时为(决策, None)，否则为(None, 开始构建的项)
+        """
+        decision = self._quick_analyze(task_description)
+        if decision is not None:
+            return decision, None
+        status = self.prewarmer.status()
+        started = [target for target in targets if target not in status]
+        self.prewarm(started)
+        return None, started
+    
+    def release_candidates(self, started: Optional[Iterable[str]], agent_type: str):
+        """
+        放弃warm_candidates()开始构建但未被选中的Agent：尚未开始的取消，进行中的完成后即被释放
+        （工具和代码执行器是全局共享的，Agent对象本身不再被引用）
+        """
+        for target in started or []:
+            if target != agent_type:
+                self.prewarmer.discard(target)
+    
+    def _route_and_warm(self, task_description: str) -> Tuple[str, float]:
+        """
+        路由分析与Agent初始化重叠进行
+        
+        需要调用LLM时先在后台同时构建两个候选Agent，决策返回后立即使用选中的Agent；
+        为本次路由提前构建的另一个Agent被取消或释放，失败切换时再构建
+        """
+        decision, started = self.warm_candidates(task_description)
+        if decision is not None:
+            return decision
+        decision = self.llm_route(task_description)
+        self.release_candidates(started, decision[0])
+        return decision
+    
+    def _quick_analyze(self, task_description: str) -> Optional[Tuple[str, float]]:
+        """本地判断：路由缓存、分类器、关键词规则，都不明确时返回None"""
+        # 缓存的决策已包含之前的执行结果，优先于关键词规则
+        cached = self.routing_cache.lookup(task_description)
+        if cached is not None:
+            logging.info(f"[SmartRouter] 路由缓存命中: {cached[0].upper()}Agent (置信度: {cached[1]:.2f})")
+            return cached
+        
+        prediction = self.classifier.predict(task_description)
+        if prediction is not None and prediction[1] >= self.classifier_confidence:
+            logging.info(f"[SmartRouter] 分类器判断: {prediction[0].upper()}Agent (置信度: {prediction[1]:.2f})")
+            return prediction
+        
         # 快速规则判断
         gui_keywords = [
             "打开", "点击", "拖拽", "窗口", "界面", "按钮", "菜单", 
@@ -80,15 +196,51 @@ class SmartRouter:
             return "gui", min(0.6 + gui_score * 0.1, 0.95)
         elif code_score > gui_score:
             return "code", min(0.6 + code_score * 0.1, 0.95)
-        
-        # 如果不明确，使用LLM分析
+        return None
+    
+    def llm_route(self, task_description: str) -> Tuple[str, float]:
+        """规则不明确时使用LLM分析（不再进行本地判断），结果写入路由缓存"""
         logging.info("[SmartRouter] 规则不明确，使用LLM分析...")
-        return self._llm_analyze(task_description)
+        return self._remember_route(task_description, self._llm_analyze(task_description))
     
-    def _llm_analyze(self, task: str) -> Tuple[str, float]:
-        """使用LLM分析任务类型"""
-        
-        prompt = f"""请分析以下任务应该使用哪种Agent完成：
+    async def allm_route(self, task_description: str) -> Tuple[str, float]:
+        """llm_route()的asyncio版本"""
+        logging.info("[SmartRouter] 规则不明确，使用LLM分析...")
+        try:
+            response = await self.llm.acompletion(
+                self.routing_endpoint,
+                [{"role": "user", "content": self._routing_prompt(task_description)}],
+                temperature=0.3
+            )
+            decision = self._parse_routing_answer(response.choices[0].message.content)
+        except Exception as e:
+            logging.error(f"[SmartRouter] LLM分析失败: {e}")
+            decision = None
+        return self._remember_route(task_description, decision)
+    
+    def _remember_route(self, task_description: str, decision: Optional[Tuple[str, float]]) -> Tuple[str, float]:
+        """LLM给出的决策写入路由缓存；分析失败时使用默认路由，不缓存，下次重新分析"""
+        if decision is None:
+            return DEFAULT_ROUTE
+        self.routing_cache.put(task_description, *decision)
+        return decision
+    
+    def _llm_analyze(self, task: str) -> Optional[Tuple[str, float]]:
+        """使用LLM分析任务类型，调用失败或回答无法解析时返回None"""
+        try:
+            response = self.llm.completion(
+                self.routing_endpoint,
+                [{"role": "user", "content": self._routing_prompt(task)}],
+                temperature=0.3
+            )
+            return self._parse_routing_answer(response.choices[0].message.content)
+                
+        except Exception as e:
+            logging.error(f"[SmartRouter] LLM分析失败: {e}")
+            return None
+    
+    def _routing_prompt(self, task: str) -> str:
+        return f"""请分析以下任务应该使用哪种Agent完成：
 
 任务: {task}
 
@@ -101,36 +253,21 @@ class SmartRouter:
 - 如果应该用Code: 回答 "CODE:置信度" (如 "CODE:0.85")
 
 回答:"""
-
-        try:
-            response = completion(
-                model=f"volcengine/{self.routing_model}",
-                api_key=self.routing_api_key,
-                api_base=self.routing_api_base,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
-            
-            answer = response.choices[0].message.content.strip().upper()
-            
-            # 解析回答
-            if "GUI" in answer:
-                match = re.search(r'GUI:?([\d.]+)', answer)
-                confidence = float(match.group(1)) if match else 0.7
-                return "gui", confidence
-            elif "CODE" in answer:
-                match = re.search(r'CODE:?([\d.]+)', answer)
-                confidence = float(match.group(1)) if match else 0.7
-                return "code", confidence
-            else:
-                # 默认使用GUI（更安全）
-                logging.warning(f"[SmartRouter] LLM回答无法解析: {answer}")
-                return "gui", 0.5
-                
-        except Exception as e:
-            logging.error(f"[SmartRouter] LLM分析失败: {e}")
-            # 默认GUI
-            return "gui", 0.5
+    
+    def _parse_routing_answer(self, answer: str) -> Optional[Tuple[str, float]]:
+        """解析LLM的路由回答，无法解析时返回None"""
+        answer = answer.strip().upper()
+        if "GUI" in answer:
+            match = re.search(r'GUI:?([\d.]+)', answer)
+            confidence = float(match.group(1)) if match else 0.7
+            return "gui", confidence
+        elif "CODE" in answer:
+            match = re.search(r'CODE:?([\d.]+)', answer)
+            confidence = float(match.group(1)) if match else 0.7
+            return "code", confidence
+        else:
+            logging.warning(f"[SmartRouter] LLM回答无法解析: {answer}")
+            return None
     
     def execute_with_fallback(
         self, 
@@ -164,7 +301,7 @@ class SmartRouter:
                 confidence = 1.0
                 logging.info(f"[SmartRouter] 强制使用 {agent_type.upper()}Agent")
             else:
-                agent_type, confidence = self.analyze_task(current_task)
+                agent_type, confidence = self._route_and_warm(current_task)
                 logging.info(f"[SmartRouter] 任务分析: {agent_type.upper()}Agent (置信度: {confidence:.2f})")
             
             msg_to_client.put({
@@ -174,17 +311,19 @@ class SmartRouter:
             })
             
             # 第一次尝试
+            started = time.time()
             try:
                 if agent_type == "gui":
-                    agent = self._get_gui_agent()
+                    result = self.get_gui_agent().task(current_task, msg_from_client, msg_to_client)
                 else:
-                    agent = self._get_code_agent()
-                
-                result = agent.task(current_task, msg_from_client, msg_to_client)
+                    result = self.get_code_agent().task(
+                        current_task, msg_from_client, msg_to_client, route=(agent_type, confidence)
+                    )
                 
                 # 检查是否成功
-                if self._is_success(result):
+                if self.is_success(result):
                     logging.info(f"[SmartRouter] {agent_type.upper()}Agent 成功完成任务")
+                    self.record_outcome(current_task, agent_type, True, time.time() - started)
                     return result
                 else:
                     logging.warning(f"[SmartRouter] {agent_type.upper()}Agent 任务失败: {result}")
@@ -194,6 +333,7 @@ class SmartRouter:
             except Exception as e:
                 logging.error(f"[SmartRouter] {agent_type.upper()}Agent 失败: {e}")
                 last_errors.append(f"{agent_type}Agent: {str(e)}")
+                self.record_outcome(current_task, agent_type, False, time.time() - started)
                 
                 # 未强制指定时，失败后总是尝试切换一次
                 if not force_agent:
@@ -207,22 +347,28 @@ class SmartRouter:
                     
                     logging.info(f"[SmartRouter] 切换到 {fallback_agent.upper()}Agent")
                     
+                    started = time.time()
                     try:
                         if fallback_agent == "gui":
-                            fallback = self._get_gui_agent()
+                            result = self.get_gui_agent().task(current_task, msg_from_client, msg_to_client)
                         else:
-                            fallback = self._get_code_agent()
-                        
-                        result = fallback.task(current_task, msg_from_client, msg_to_client)
+                            # 路由判定为GUI任务，CodeAgent作为回退时下发全部工具
+                            result = self.get_code_agent().task(
+                                current_task, msg_from_client, msg_to_client, route=(agent_type, confidence)
+                            )
                         
-                        if self._is_success(result):
+                        if self.is_success(result):
                             logging.info(f"[SmartRouter] {fallback_agent.upper()}Agent 成功完成任务")
+                            # 记住实际成功的Agent，下次直接路由过去
+                            self.record_outcome(current_task, fallback_agent, True, time.time() - started)
                             return result
                         else:
+                            self.record_outcome(current_task, fallback_agent, False, time.time() - started)
                             last_errors.append(f"{fallback_agent}Agent: {result}")
                             logging.error(f"[SmartRouter] {fallback_agent.upper()}Agent 也失败")
                             
                     except Exception as e2:
+                        self.record_outcome(current_task, fallback_agent, False, time.time() - started)
                         logging.error(f"[SmartRouter] {fallback_agent.upper()}Agent 也失败: {e2}")
                         last_errors.append(f"{fallback_agent}Agent: {str(e2)}")
             
@@ -304,6 +450,11 @@ class SmartRouter:
         error_summary = '\n'.join(last_errors)
         return f"任务失败: 已达最大重试次数({max_retries})。\n错误汇总:\n{error_summary}"
     
+    def record_outcome(self, task: str, agent_type: str, success: bool, latency: float):
+        """把路由结果反馈给路由缓存和本地分类器"""
+        self.routing_cache.record_outcome(task, agent_type, success)
+        self.classifier.record(task, agent_type, success, latency)
+    
     def _wait_for_human_intervention(
         self, 
         msg_from_client: queue.Queue,
@@ -316,7 +467,6 @@ class SmartRouter:
         Returns:
             人类的响应字典，包含action和相关参数
         """
-        import time
         start_time = time.time()
         
         msg_to_client.put({
@@ -340,7 +490,7 @@ class SmartRouter:
                 
         return None
     
-    def _is_success(self, result: str) -> bool:
+    def is_success(self, result: str) -> bool:
         """判断任务是否成功"""
         if not isinstance(result, str):
             return False
@@ -364,10 +514,12 @@ class SmartRouter:
 
 # 全局实例
 _router = None
+_router_lock = threading.Lock()
 
 def get_router() -> SmartRouter:
     """获取全局路由器实例"""
     global _router
-    if _router is None:
-        _router = SmartRouter()
+    with _router_lock:
+        if _router is None:
+            _router = SmartRouter()
     return _router
@@ -0,0 +1,194 @@
+"""
+本地任务分类器
+基于哈希n-gram特征的多项式朴素贝叶斯，从路由执行结果（任务、Agent、是否成功、耗时）增量学习，
+在本地微秒级给出GUI/Code判断；置信度不足时再由SmartRouter调用LLM。
+路由结果日志只保留最近的结果（超过上限两倍时压缩），启动时回放的时间和磁盘占用都有上限。
+中文按字符unigram/bigram切分，英文按单词unigram/bigram切分，特征哈希到固定数量的桶。
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_LOG_PATH = "./memory_storage/routing_outcomes.jsonl"
+DEFAULT_MAX_OUTCOMES = 5000
+LABELS = ("gui", "code")
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z_][a-z0-9_.]*")
+
+
+def extract_features(text: str, buckets: int) -> List[int]:
+    """把任务文本切成n-gram并哈希到桶编号（crc32，跨进程稳定）"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    grams = []
+    for run in _CJK_RUN.findall(text):
+        grams.extend(run)
+        grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    words = _WORD.findall(text)
+    grams.extend(words)
+    grams.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return [zlib.crc32(gram.encode("utf-8")) % buckets for gram in grams]
+
+
+class TaskClassifier:
+    """
+    增量训练的朴素贝叶斯路由分类器
+
+    Args:
+        log_path: 路由结果日志（JSONL），启动时回放训练，None表示不持久化
+        buckets: 特征哈希桶数量
+        min_examples: 累计训练样本权重达到此值且两类都有样本后才给出判断
+        reference_latency: 成功样本的耗时超过此值（秒）时降低权重，慢的成功说明另一个Agent可能更合适
+        max_outcomes: 日志保留（和启动时回放）的最近结果数，0表示不限制
+    """
+
+    def __init__(
+        self,
+        log_path: Optional[str] = DEFAULT_LOG_PATH,
+        buckets: int = 1 << 18,
+        min_examples: float = 10,
+        reference_latency: float = 120.0,
+        alpha: float = 0.1,
+        max_outcomes: int = DEFAULT_MAX_OUTCOMES
+    ):
+        self.log_path = log_path
+        self.buckets = buckets
+        self.min_examples = min_examples
+        self.reference_latency = reference_latency
+        self.alpha = alpha
+        self._class_weight: Dict[str, float] = {label: 0.0 for label in LABELS}
+        self._feature_counts: Dict[str, Dict[int, float]] = {label: defaultdict(float) for label in LABELS}
+        self._feature_totals: Dict[str, float] = {label: 0.0 for label in LABELS}
+        self._vocabulary: set = set()
+        self._lock = threading.Lock()
+        self.max_outcomes = max_outcomes
+        # 最近的结果和日志当前的行数，行数超过上限两倍时用最近的结果重写日志
+        self._recent: deque = deque(maxlen=max_outcomes or None)
+        self._logged = 0
+        self._log_lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> "TaskClassifier":
+        """
+        ARGUS_ROUTING_OUTCOMES: 路由结果日志路径（设为空禁用持久化）
+        ARGUS_ROUTING_OUTCOMES_MAX: 日志保留的最近结果数（0表示不限制）
+        """
+        return cls(
+            log_path=os.getenv("ARGUS_ROUTING_OUTCOMES", DEFAULT_LOG_PATH) or None,
+            max_outcomes=int(os.getenv("ARGUS_ROUTING_OUTCOMES_MAX", DEFAULT_MAX_OUTCOMES)),
+        )
+
+    @property
+    def trained(self) -> bool:
+        return sum(self._class_weight.values()) >= self.min_examples and all(self._class_weight.values())
+
+    def predict(self, task: str) -> Optional[Tuple[str, float]]:
+        """返回(agent_type, 后验概率)，样本不足时返回None"""
+        features = extract_features(task, self.buckets)
+        with self._lock:
+            if not self.trained or not features:
+                return None
+            total = sum(self._class_weight.values())
+            vocabulary = len(self._vocabulary) + 1
+            scores = {}
+            for label in LABELS:
+                counts = self._feature_counts[label]
+                denominator = math.log(self._feature_totals[label] + self.alpha * vocabulary)
+                score = math.log(self._class_weight[label] / total)
+                for feature in features:
+                    score += math.log(counts.get(feature, 0.0) + self.alpha) - denominator
+                scores[label] = score
+        best = max(scores, key=scores.get)
+        # log-sum-exp求后验概率
+        top = scores[best]
+        probability = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, probability
+
+    def record(self, task: str, agent_type: str, success: bool, latency: Optional[float] = None):
+        """记录一次路由结果：写入日志并增量训练"""
+        outcome = {
+            "task": task,
+            "agent": agent_type,
+            "success": success,
+            "latency": None if latency is None else round(latency, 3),
+            "time": time.time(),
+        }
+        self._learn(outcome)
+        if not self.log_path:
+            return
+        with self._log_lock:
+            self._recent.append(outcome)
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+                self._logged += 1
+            except OSError as e:
+                logging.warning(f"[TaskClassifier] 写入路由结果日志失败: {e}")
+            if self.max_outcomes and self._logged > 2 * self.max_outcomes:
+                self._compact()
+
+    def _learn(self, outcome: dict):
+        agent_type = outcome.get("agent")
+        if agent_type not in LABELS:
+            return
+        if outcome.get("success"):
+            label = agent_type
+            latency = outcome.get("latency")
+            weight = 1.0 if not latency else max(0.5, min(1.0, self.reference_latency / latency))
+        else:
+            # 二分类：一个Agent失败是另一个Agent更合适的弱证据
+            label = LABELS[1 - LABELS.index(agent_type)]
+            weight = 0.5
+        features = extract_features(outcome.get("task", ""), self.buckets)
+        with self._lock:
+            self._class_weight[label] += weight
+            counts = self._feature_counts[label]
+            for feature in features:
+                counts[feature] += weight
+                self._vocabulary.add(feature)
+            self._feature_totals[label] += weight * len(features)
+
+    def _load(self):
+        """回放日志中最近的max_outcomes条结果，日志超过上限时压缩"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self._recent.append(json.loads(line))
+                        self._logged += 1
+        except (OSError, ValueError) as e:
+            logging.warning(f"[TaskClassifier] 读取路由结果日志失败: {e}")
+        for outcome in self._recent:
+            self._learn(outcome)
+        if self.max_outcomes and self._logged > self.max_outcomes:
+            self._compact()
+
+    def _compact(self):
+        """只保留最近的结果重写日志（先写临时文件再替换）"""
+        directory = os.path.dirname(os.path.abspath(self.log_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".routing_outcomes_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for outcome in self._recent:
+                    f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.log_path)
+        except OSError as e:
+            logging.warning(f"[TaskClassifier] 压缩路由结果日志失败: {e}")
+            return
+        logging.info(f"[TaskClassifier] 路由结果日志已压缩: {self._logged} -> {len(self._recent)}条")
+        self._logged = len(self._recent)
@@ -0,0 +1,285 @@
+"""
+批量任务执行
+从JSONL文件或stdin读取任务，代码任务分发到CodeAgent工作池并发执行，GUI任务进入串行的桌面队列。
+每个任务结束后立即把结果和耗时追加写入输出JSONL，中断后用resume跳过已完成的任务继续执行。
+
+输入每行一个JSON对象：{"id": "t1", "task": "任务描述", "agent": "code"}，
+id缺省时按行号生成，agent缺省时由SmartRouter判断；也可以每行直接写任务文本。
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from argus.agents.agent_types import AGENT_CODE, AGENT_GUI, AGENTS, isolated_code_agent, other_agent
+
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class BatchTask:
+    id: str
+    task: str
+    agent: Optional[str] = None
+    python_engine: Optional[str] = None
+    # 运行时状态
+    route: Optional[Tuple[str, float]] = None
+    attempts: List[Dict[str, Any]] = field(default_factory=list)
+    queued_at: float = 0.0
+
+
+def load_tasks(lines: Iterable[str]) -> List[BatchTask]:
+    """解析JSONL任务，跳过空行和#注释行"""
+    tasks = []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        if isinstance(item, str):
+            item = {"task": item}
+        if not isinstance(item, dict) or not item.get("task"):
+            raise ValueError(f"第{number}行缺少task字段: {line[:80]}")
+        agent = item.get("agent") or item.get("force")
+        if agent is not None and agent not in AGENTS:
+            raise ValueError(f"第{number}行的agent必须是gui或code: {agent}")
+        task_id = str(item.get("id") or f"line-{number}")
+        if task_id in seen:
+            raise ValueError(f"第{number}行的任务id重复: {task_id}")
+        seen.add(task_id)
+        tasks.append(BatchTask(
+            id=task_id,
+            task=item["task"],
+            agent=agent,
+            python_engine=item.get("python_engine"),
+        ))
+    return tasks
+
+
+def completed_ids(output_path: str) -> set:
+    """读取已有的输出文件，返回已经有结果的任务id（写了一半的最后一行忽略）"""
+    done = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") in (STATUS_SUCCESS, STATUS_FAILED):
+                done.add(record.get("id"))
+    return done
+
+
+class BatchRunner:
+    """
+    批量任务调度器
+
+    Args:
+        router: SmartRouter，用于自动路由、判断结果成功与否并反馈路由结果
+        workers: 并发执行代码任务的CodeAgent数量
+        code_agent_factory: 创建工作池中CodeAgent的函数，每个worker一个实例
+        fallback: 自动路由的任务失败后是否切换到另一个Agent重试一次
+        on_result: 每个任务结束后的回调（用于打印进度）
+    """
+
+    def __init__(
+        self,
+        router,
+        workers: int = 2,
+        code_agent_factory: Optional[Callable[[], Any]] = None,
+        fallback: bool = True,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.router = router
+        self.workers = max(1, workers)
+        self.code_agent_factory = code_agent_factory or isolated_code_agent
+        self.fallback = fallback
+        self.on_result = on_result
+        self._queues = {AGENT_CODE: queue.Queue(), AGENT_GUI: queue.Queue()}
+        self._output: Optional[TextIO] = None
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Condition()
+        # 执行中的任务 -> 发给Agent的消息队列，中断时通知停止
+        self._running: Dict[str, tuple] = {}
+        self.summary = {"total": 0, "skipped": 0, STATUS_SUCCESS: 0, STATUS_FAILED: 0}
+
+    def run(self, tasks: List[BatchTask], output: TextIO, skip_ids: Optional[set] = None) -> Dict[str, int]:
+        """
+        执行所有任务，结果逐条写入output，返回统计
+
+        KeyboardInterrupt时停止领取新任务并通知执行中的Agent停止，已写入的结果保留，
+        之后可以用resume继续。
+        """
+        skip_ids = skip_ids or set()
+        todo = [task for task in tasks if task.id not in skip_ids]
+        self.summary["total"] = len(tasks)
+        self.summary["skipped"] = len(tasks) - len(todo)
+        self._output = output
+        with self._pending_lock:
+            self._pending = len(todo)
+
+        # 主线程路由的同时，可能用到的worker先构建各自的CodeAgent
+        code_tasks = sum(1 for task in todo if task.agent in (None, AGENT_CODE))
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(AGENT_CODE, i < code_tasks), name=f"batch-code-{i}", daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        threads.append(threading.Thread(target=self._worker, args=(AGENT_GUI,), name="batch-gui", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            # 主线程负责路由，路由结果决定进入工作池还是桌面队列
+            for task in todo:
+                if self._stop.is_set():
+                    break
+                task.route = (task.agent, 1.0) if task.agent else self._route(task)
+                self._enqueue(task, task.route[0])
+            with self._pending_lock:
+                while self._pending > 0 and not self._stop.is_set():
+                    self._pending_lock.wait(timeout=0.5)
+        except KeyboardInterrupt:
+            logging.warning("[Batch] 用户中断，停止领取新任务")
+            self.stop()
+            raise
+        finally:
+            self._stop.set()
+            for thread in threads:
+                self._queues[AGENT_GUI if thread.name == "batch-gui" else AGENT_CODE].put(None)
+            for thread in threads:
+                thread.join(timeout=5)
+        return self.summary
+
+    def stop(self):
+        """停止领取新任务，并通知执行中的Agent停止"""
+        self._stop.set()
+        for agent_type, message_from_client in list(self._running.values()):
+            name = "GUIAgent" if agent_type == AGENT_GUI else "CodeAgent"
+            message_from_client.put({"name": name, "type": "request", "content": "stop_agent"})
+
+    def _route(self, task: BatchTask) -> Tuple[str, float]:
+        # 需要调用LLM路由时，路由期间在后台预热共享的GUIAgent
+        try:
+            decision, _ = self.router.warm_candidates(task.task, (AGENT_GUI,))
+            agent_type, confidence = decision or self.router.llm_route(task.task)
+        except Exception as e:
+            logging.error(f"[Batch] 任务 {task.id} 路由失败，使用CodeAgent: {e}")
+            return AGENT_CODE, 0.0
+        logging.info(f"[Batch] 任务 {task.id} 路由到 {agent_type.upper()}Agent (置信度: {confidence:.2f})")
+        return agent_type, confidence
+
+    def _enqueue(self, task: BatchTask, agent_type: str):
+        task.queued_at = time.time()
+        self._queues[agent_type].put(task)
+
+    def _worker(self, agent_type: str, eager: bool = False):
+        agent = None
+        if eager:
+            try:
+                agent = self.code_agent_factory()
+            except Exception as e:
+                logging.error(f"[Batch] 提前构建CodeAgent失败，领取任务时重试: {e}")
+        task_queue = self._queues[agent_type]
+        while not self._stop.is_set():
+            task = task_queue.get()
+            if task is None or self._stop.is_set():
+                break
+            try:
+                if agent is None:
+                    agent = self.code_agent_factory() if agent_type == AGENT_CODE else self.router.get_gui_agent()
+                attempt = self._execute(agent, agent_type, task)
+            except Exception as e:
+                logging.error(f"[Batch] 任务 {task.id} 在{agent_type.upper()}Agent上执行出错: {e}")
+                attempt = {"agent": agent_type, "success": False, "result": None, "error": str(e),
+                           "queued": round(time.time() - task.queued_at, 3), "elapsed": 0.0}
+            task.attempts.append(attempt)
+            self.router.record_outcome(task.task, agent_type, attempt["success"], attempt["elapsed"])
+
+            other = other_agent(agent_type)
+            if not attempt["success"] and self.fallback and task.agent is None and len(task.attempts) == 1:
+                logging.info(f"[Batch] 任务 {task.id} 失败，切换到 {other.upper()}Agent")
+                self._enqueue(task, other)
+                continue
+            self._finish(task)
+
+    def _execute(self, agent, agent_type: str, task: BatchTask) -> Dict[str, Any]:
+        """在指定Agent上执行一次任务，返回本次尝试的记录"""
+        message_from_client = queue.Queue()
+        message_to_client = queue.Queue()
+        self._running[task.id] = (agent_type, message_from_client)
+        # 批量任务互相独立，不共享对话上下文
+        agent.memory.clear_short_term()
+        started = time.time()
+        try:
+            if agent_type == AGENT_CODE:
+                result = agent.task(
+                    task.task, message_from_client, message_to_client,
+                    route=task.route,
+                    python_engine=task.python_engine,
+                )
+            else:
+                result = agent.task(task.task, message_from_client, message_to_client)
+        finally:
+            self._running.pop(task.id, None)
+        elapsed = time.time() - started
+
+        # Agent在LLM调用失败时只发送[ERROR]状态，返回值仍是正常结束
+        errors = []
+        failed = False
+        while True:
+            try:
+                message = message_to_client.get_nowait()
+            except queue.Empty:
+                break
+            if message.get("type") == "status" and message.get("content") == "[ERROR]":
+                failed = True
+            elif message.get("type") == "text" and str(message.get("content", "")).startswith(("错误", "[错误]")):
+                errors.append(message["content"])
+        success = not failed and self.router.is_success(result)
+        return {
+            "agent": agent_type,
+            "success": success,
+            "result": result,
+            "error": errors[-1] if errors else None,
+            "queued": round(started - task.queued_at, 3),
+            "elapsed": round(elapsed, 3),
+        }
+
+    def _finish(self, task: BatchTask):
+        last = task.attempts[-1]
+        record = {
+            "id": task.id,
+            "task": task.task,
+            "status": STATUS_SUCCESS if last["success"] else STATUS_FAILED,
+            "agent": last["agent"],
+            "result": last["result"],
+            "error": last["error"],
+            "elapsed": round(sum(attempt["elapsed"] for attempt in task.attempts), 3),
+            "attempts": task.attempts,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._write_lock:
+            self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._output.flush()
+            self.summary[record["status"]] += 1
+        if self.on_result:
+            self.on_result(record)
+        with self._pending_lock:
+            self._pending -= 1
+            self._pending_lock.notify_all()
@@ -4,6 +4,40 @@ import os
 from dataclasses import dataclass
 
 
+@dataclass(frozen=True)
+class EndpointConfig:
+    api_base: str
+    api_key: str
+    weight: float = 1.0
+
+
+def parse_endpoints(value: str, default_base: str = "", default_key: str = "") -> tuple[EndpointConfig, ...]:
+    """Parse "api_base|api_key|weight" entries separated by commas; empty fields use the role defaults."""
+    endpoints = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        parts = [part.strip() for part in entry.split("|")]
+        parts += [""] * (3 - len(parts))
+        weight = float(parts[2]) if parts[2] else 1.0
+        if weight <= 0:
+            raise ValueError(f"endpoint weight must be positive: {entry.strip()}")
+        endpoints.append(EndpointConfig(parts[0] or default_base, parts[1] or default_key, weight))
+    return tuple(endpoints)
+
+
+def parse_model_prices(value: str) -> tuple[tuple[str, float, float], ...]:
+    """Parse "model=prompt_price/completion_price" entries (per million tokens) separated by commas."""
+    prices = []
+    for entry in value.split(","):
+        if "=" not in entry:
+            continue
+        model, _, price = entry.partition("=")
+        prompt, _, completion = price.partition("/")
+        prices.append((model.strip(), float(prompt or 0), float(completion or prompt or 0)))
+    return tuple(prices)
+
+
 @dataclass(frozen=True)
 class AgentConfig:
     gui_model: str
@@ -12,23 +46,43 @@ class AgentConfig:
     code_model: str
     code_api_base: str
     code_api_key: str
+    gui_endpoints: tuple[EndpointConfig, ...] = ()
+    code_endpoints: tuple[EndpointConfig, ...] = ()
+    gui_cheap_model: str = ""
+    code_cheap_model: str = ""
+    model_prices: tuple[tuple[str, float, float], ...] = ()
 
     @classmethod
     def from_env(cls) -> "AgentConfig":
+        gui_api_base = os.getenv("GUIAgent_API_BASE", "")
+        gui_api_key = os.getenv("GUIAgent_API_KEY", "")
+        code_api_base = os.getenv("CodeAgent_API_BASE", "")
+        code_api_key = os.getenv("CodeAgent_API_KEY", "")
         return cls(
             gui_model=os.getenv("GUIAgent_MODEL", ""),
-            gui_api_base=os.getenv("GUIAgent_API_BASE", ""),
-            gui_api_key=os.getenv("GUIAgent_API_KEY", ""),
+            gui_api_base=gui_api_base,
+            gui_api_key=gui_api_key,
             code_model=os.getenv("CodeAgent_MODEL", ""),
-            code_api_base=os.getenv("CodeAgent_API_BASE", ""),
-            code_api_key=os.getenv("CodeAgent_API_KEY", ""),
+            code_api_base=code_api_base,
+            code_api_key=code_api_key,
+            gui_endpoints=parse_endpoints(os.getenv("GUIAgent_ENDPOINTS", ""), gui_api_base, gui_api_key),
+            code_endpoints=parse_endpoints(os.getenv("CodeAgent_ENDPOINTS", ""), code_api_base, code_api_key),
+            gui_cheap_model=os.getenv("GUIAgent_CHEAP_MODEL", ""),
+            code_cheap_model=os.getenv("CodeAgent_CHEAP_MODEL", ""),
+            model_prices=parse_model_prices(os.getenv("ARGUS_MODEL_PRICES", "")),
         )
 
+    def endpoint_pool(self, role: str) -> tuple[EndpointConfig, ...]:
+        """Endpoints of a role ("GUIAgent" / "CodeAgent"): the configured pool, else the single base/key."""
+        if role == "GUIAgent":
+            return self.gui_endpoints or (EndpointConfig(self.gui_api_base, self.gui_api_key),)
+        return self.code_endpoints or (EndpointConfig(self.code_api_base, self.code_api_key),)
+
     def missing_required(self) -> list[str]:
         required = {
             "GUIAgent_MODEL": self.gui_model,
-            "GUIAgent_API_KEY": self.gui_api_key,
+            "GUIAgent_API_KEY": all(e.api_key for e in self.endpoint_pool("GUIAgent")),
             "CodeAgent_MODEL": self.code_model,
-            "CodeAgent_API_KEY": self.code_api_key,
+            "CodeAgent_API_KEY": all(e.api_key for e in self.endpoint_pool("CodeAgent")),
         }
         return [name for name, value in required.items() if not value]
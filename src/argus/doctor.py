@@ -40,10 +40,9 @@ def _check_required_env(config: AgentConfig) -> Check:
 
 def _check_api_bases(config: AgentConfig) -> Check:
     missing = []
-    if not config.gui_api_base:
-        missing.append("GUIAgent_API_BASE")
-    if not config.code_api_base:
-        missing.append("CodeAgent_API_BASE")
+    for role in ("GUIAgent", "CodeAgent"):
+        if not all(e.api_base for e in config.endpoint_pool(role)):
+            missing.append(f"{role}_API_BASE")
     if missing:
         return Check("api_base", "warn", f"not set: {', '.join(missing)} (will use provider default)")
     return Check("api_base", "pass", "all API base variables are configured")
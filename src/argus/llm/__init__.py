@@ -0,0 +1,16 @@
+"""
+LLM调用层
+Agent和路由器通过共享的LLMClient调用模型
+"""
+
+from .balancer import EndpointPool, resolve_endpoint
+from .cache import LLMCacheMiss, LLMResponseCache
+from .cascade import ModelCascade
+from .client import LLMClient, LLMEndpoint, get_llm_client
+from .ratelimit import RateLimiter
+from .resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+__all__ = [
+    'CircuitBreaker', 'CircuitOpenError', 'EndpointPool', 'LLMCacheMiss', 'LLMClient', 'LLMEndpoint',
+    'LLMResponseCache', 'ModelCascade', 'RateLimiter', 'ResilientCaller', 'get_llm_client', 'resolve_endpoint'
+]
@@ -0,0 +1,296 @@
+"""
+多endpoint负载均衡
+一个角色（GUIAgent / CodeAgent）可以配置多个API地址和Key组成的池（{role}_ENDPOINTS），按权重分摊请求：
+每次按权重随机抽取两个不同的成员，选负载较低的一个（power of two choices）。
+负载按进行中的请求数除以权重（least_outstanding）或再乘以延迟的滑动平均（latency）计算。
+成员连续失败达到阈值后移出轮换，一段时间后放行一个试探请求，成功则恢复，失败则加倍移出时间。
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .client import LLMEndpoint
+from .resilience import _aclose_stream, _close_stream, is_retryable
+
+BALANCE_LEAST_OUTSTANDING = "least_outstanding"
+BALANCE_LATENCY = "latency"
+BALANCE_STRATEGIES = (BALANCE_LEAST_OUTSTANDING, BALANCE_LATENCY)
+
+# 延迟滑动平均的权重
+_EWMA_ALPHA = 0.3
+
+
+class _Member:
+    def __init__(self, endpoint: LLMEndpoint, weight: float):
+        self.endpoint = endpoint
+        self.weight = weight
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.ejected_until: Optional[float] = None
+        self.eject_time = 0.0
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+
+class EndpointPool:
+    """
+    同一模型的一组endpoint
+
+    Args:
+        members: (endpoint, 权重) 列表
+        name: 池的名称，作为重试/熔断统计的标识
+        strategy: least_outstanding 或 latency
+        failure_threshold: 连续失败多少次后移出轮换
+        eject_time: 首次移出的秒数，之后每次试探失败加倍
+        max_eject_time: 移出时间上限（秒）
+    """
+
+    def __init__(
+        self,
+        members: List[Tuple[LLMEndpoint, float]],
+        name: str = "pool",
+        strategy: str = BALANCE_LEAST_OUTSTANDING,
+        failure_threshold: int = 3,
+        eject_time: float = 30.0,
+        max_eject_time: float = 300.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if not members:
+            raise ValueError("endpoint池不能为空")
+        if strategy not in BALANCE_STRATEGIES:
+            raise ValueError(f"未知的负载均衡策略: {strategy}，可选 {', '.join(BALANCE_STRATEGIES)}")
+        self.name = name
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.base_eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._members = [_Member(endpoint, weight) for endpoint, weight in members]
+
+    @classmethod
+    def from_env(cls, role: str, fallback: Optional[LLMEndpoint] = None) -> Optional["EndpointPool"]:
+        """
+        按AgentConfig中的 {role}_ENDPOINTS 创建池，未配置时返回None
+
+        ARGUS_LLM_BALANCE: least_outstanding / latency
+        ARGUS_LLM_EJECT_FAILURES / ARGUS_LLM_EJECT_TIME: 移出轮换的连续失败次数和秒数
+        """
+        from argus.config import AgentConfig
+
+        config = AgentConfig.from_env()
+        pool = config.gui_endpoints if role == "GUIAgent" else config.code_endpoints
+        if not pool:
+            return None
+        base = LLMEndpoint.from_env(role, fallback)
+        members = [
+            (
+                LLMEndpoint(
+                    base.model, item.api_base or None, item.api_key or None,
+                    rpm=base.rpm, tpm=base.tpm, label=str(index)
+                ),
+                item.weight,
+            )
+            for index, item in enumerate(pool, 1)
+        ]
+        return cls(
+            members,
+            name=f"{role}/{base.model}",
+            strategy=os.getenv("ARGUS_LLM_BALANCE", BALANCE_LEAST_OUTSTANDING).strip() or BALANCE_LEAST_OUTSTANDING,
+            failure_threshold=int(os.getenv("ARGUS_LLM_EJECT_FAILURES", "3")),
+            eject_time=float(os.getenv("ARGUS_LLM_EJECT_TIME", "30")),
+        )
+
+    @property
+    def model(self) -> Optional[str]:
+        return self._members[0].endpoint.model
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    @property
+    def endpoints(self) -> List[LLMEndpoint]:
+        return [member.endpoint for member in self._members]
+
+    def acquire(self) -> _Member:
+        """选出一个成员并计入进行中的请求，用完后必须调用release"""
+        with self._lock:
+            member = self._select()
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def _select(self) -> _Member:
+        now = self._clock()
+        healthy = []
+        for member in self._members:
+            if member.ejected_until is None:
+                healthy.append(member)
+            elif not member.probing and now >= member.ejected_until:
+                # 移出时间已到，放行一个试探请求
+                member.probing = True
+                logging.info(f"[EndpointPool] {member.endpoint.key} 试探恢复")
+                return member
+        if not healthy:
+            # 全部被移出时选最早到期的一个，不让请求直接失败
+            return min(self._members, key=lambda m: m.ejected_until)
+        if len(healthy) == 1:
+            return healthy[0]
+        first = random.choices(healthy, weights=[m.weight for m in healthy])[0]
+        others = [m for m in healthy if m is not first]
+        second = random.choices(others, weights=[m.weight for m in others])[0]
+        return min((first, second), key=self._load)
+
+    def _load(self, member: _Member) -> float:
+        if self.strategy == BALANCE_LATENCY:
+            # 没有延迟数据的成员优先，以便尽快得到数据
+            return (member.outstanding + 1) / member.weight * (member.latency or 0.0)
+        # 都空闲时负载相同，保留按权重抽中的第一个，空闲时的请求分布也按权重
+        return member.outstanding / member.weight
+
+    def release(self, member: _Member, latency: Optional[float] = None, error: Optional[BaseException] = None):
+        """
+        请求结束
+
+        Args:
+            latency: 首个数据块（非流式为完整响应）的耗时
+            error: 请求失败时的异常；非服务端原因的错误（如参数错误）不影响健康状态
+        """
+        with self._lock:
+            member.outstanding -= 1
+            if latency is not None:
+                member.latency = latency if member.latency is None else (
+                    _EWMA_ALPHA * latency + (1 - _EWMA_ALPHA) * member.latency
+                )
+            if error is None or not is_retryable(error):
+                member.failures = 0
+                if member.ejected_until is not None and (error is None or member.probing):
+                    logging.info(f"[EndpointPool] {member.endpoint.key} 已恢复")
+                    member.ejected_until = None
+                    member.eject_time = 0.0
+                member.probing = False
+                return
+            member.errors += 1
+            member.failures += 1
+            if member.probing or (member.ejected_until is None and member.failures >= self.failure_threshold):
+                member.eject_time = min(self.max_eject_time, member.eject_time * 2 or self.base_eject_time)
+                member.ejected_until = self._clock() + member.eject_time
+                member.probing = False
+                member.ejections += 1
+                logging.warning(
+                    f"[EndpointPool] {member.endpoint.key} 连续失败{member.failures}次，移出轮换{member.eject_time:.0f}s"
+                )
+
+    def call(self, send: Callable[[LLMEndpoint], Any], stream: bool) -> Any:
+        """选出一个成员发送请求；流式响应在流结束时才释放"""
+        member = self.acquire()
+        started = time.time()
+        try:
+            response = send(member.endpoint)
+        except Exception as e:
+            self.release(member, error=e)
+            raise
+        except BaseException:
+            self.release(member)
+            raise
+        if stream:
+            return self._track(member, response, started)
+        self.release(member, time.time() - started)
+        return response
+
+    def _track(self, member: _Member, response: Any, started: float) -> Iterator:
+        latency = None
+        error = None
+        complete = False
+        try:
+            for chunk in response:
+                if latency is None:
+                    latency = time.time() - started
+                yield chunk
+            complete = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not complete:
+                _close_stream(response)
+            self.release(member, latency, error)
+
+    async def acall(self, send: Callable[[LLMEndpoint], Awaitable[Any]], stream: bool) -> Any:
+        """call()的asyncio版本，send为协程函数，流式响应为异步迭代器"""
+        member = self.acquire()
+        started = time.time()
+        try:
+            response = await send(member.endpoint)
+        except Exception as e:
+            self.release(member, error=e)
+            raise
+        except BaseException:
+            self.release(member)
+            raise
+        if stream:
+            return self._atrack(member, response, started)
+        self.release(member, time.time() - started)
+        return response
+
+    async def _atrack(self, member: _Member, response: Any, started: float) -> AsyncIterator:
+        latency = None
+        error = None
+        complete = False
+        try:
+            async for chunk in response:
+                if latency is None:
+                    latency = time.time() - started
+                yield chunk
+            complete = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not complete:
+                await _aclose_stream(response)
+            self.release(member, latency, error)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            return {
+                member.endpoint.key: {
+                    "weight": member.weight,
+                    "outstanding": member.outstanding,
+                    "requests": member.requests,
+                    "errors": member.errors,
+                    "ejections": member.ejections,
+                    "healthy": member.ejected_until is None,
+                    "ejected_for": round(max(0.0, member.ejected_until - now), 1) if member.ejected_until else None,
+                    "latency": round(member.latency, 3) if member.latency is not None else None,
+                }
+                for member in self._members
+            }
+
+
+_shared_pools: Dict[Tuple[str, LLMEndpoint], Optional[EndpointPool]] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def resolve_endpoint(role: str, fallback: Optional[LLMEndpoint] = None) -> Any:
+    """
+    角色配置了endpoint池时返回EndpointPool，否则返回单个LLMEndpoint
+
+    同一角色和模型的池在进程内共享，所有Agent实例和路由器的进行中请求数与健康状态统一统计
+    """
+    endpoint = LLMEndpoint.from_env(role, fallback)
+    with _shared_pools_lock:
+        key = (role, endpoint)
+        if key not in _shared_pools:
+            _shared_pools[key] = EndpointPool.from_env(role, fallback)
+        pool = _shared_pools[key]
+    return pool or endpoint
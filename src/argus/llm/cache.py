@@ -0,0 +1,437 @@
+"""
+LLM请求录制/回放缓存
+按规范化后的请求（模型、消息、工具定义和采样参数）计算哈希，消息中的图片数据只取内容哈希。
+record模式调用模型并录制响应，replay模式只从录制中回放（未命中时报错，用于离线回归），
+auto模式命中回放、未命中调用并录制，off模式直接透传。
+流式响应按数据块录制，回放时按原样逐块返回；相同请求并发时只发出一次（single-flight），
+等待超时或领头的流未被读取就被丢弃时，等待方各自调用模型。
+asyncio调用（acompletion）与同步调用共用录制文件和进行中的请求表。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+CACHE_OFF = "off"
+CACHE_RECORD = "record"
+CACHE_REPLAY = "replay"
+CACHE_AUTO = "auto"
+CACHE_MODES = (CACHE_OFF, CACHE_RECORD, CACHE_REPLAY, CACHE_AUTO)
+
+DEFAULT_CACHE_DIR = "./memory_storage/llm_cache"
+DEFAULT_WAIT_TIMEOUT = 600.0
+# 不影响模型输出的参数不参与哈希
+_IGNORED_PARAMS = {"stream", "timeout", "api_base", "api_key", "stream_options"}
+
+
+class LLMCacheMiss(LookupError):
+    """replay模式下请求没有录制"""
+
+
+def _normalize(value: Any) -> Any:
+    """把图片等内嵌的base64数据替换为内容哈希，其余结构保持不变"""
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str) and value.startswith("data:") and len(value) > 256:
+        return "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+    return value
+
+
+def request_hash(model: str, messages: list, params: Dict[str, Any]) -> str:
+    """计算请求哈希"""
+    payload = {
+        "model": model,
+        "messages": _normalize(messages),
+        "params": _normalize({key: value for key, value in params.items() if key not in _IGNORED_PARAMS}),
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _plain(value: Any) -> Any:
+    """把litellm/OpenAI的响应对象转换为可JSON序列化的结构"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    for method in ("model_dump", "dict"):
+        if hasattr(value, method):
+            try:
+                return _plain(getattr(value, method)())
+            except Exception:
+                pass
+    return {key: _plain(item) for key, item in vars(value).items() if not key.startswith("_") and item is not None}
+
+
+def _delta_fields(delta: Any) -> Dict[str, Any]:
+    fields = {}
+    for name in ("role", "content", "tool_calls", "reasoning_content"):
+        value = delta.get(name) if isinstance(delta, dict) else getattr(delta, name, None)
+        if value:
+            fields[name] = _plain(value)
+    return fields
+
+
+def _chunk_record(chunk: Any) -> Dict[str, Any]:
+    choices = chunk.get("choices") if isinstance(chunk, dict) else getattr(chunk, "choices", None)
+    if not choices:
+        return {}
+    choice = choices[0]
+    delta = choice.get("delta") if isinstance(choice, dict) else getattr(choice, "delta", None)
+    finish_reason = choice.get("finish_reason") if isinstance(choice, dict) else getattr(choice, "finish_reason", None)
+    record = {"delta": _delta_fields(delta) if delta is not None else {}}
+    if finish_reason:
+        record["finish_reason"] = finish_reason
+    return record
+
+
+def _response_record(response: Any) -> Dict[str, Any]:
+    choice = response.choices[0]
+    record = {"message": _delta_fields(choice.message), "finish_reason": getattr(choice, "finish_reason", None)}
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record["usage"] = _plain(usage)
+    return record
+
+
+def _merge_chunks(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    把流式录制的数据块合并为一条非流式响应记录
+
+    文本逐块拼接；tool_calls的增量按index合并，id和name取自首个片段，arguments依次拼接。
+    """
+    message: Dict[str, Any] = {}
+    calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = None
+    for record in records:
+        delta = record.get("delta", {})
+        for name in ("content", "reasoning_content"):
+            if delta.get(name):
+                message[name] = message.get(name, "") + delta[name]
+        for position, fragment in enumerate(delta.get("tool_calls") or []):
+            index = fragment.get("index", position)
+            call = calls.setdefault(index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            function = fragment.get("function") or {}
+            call["id"] = call["id"] or fragment.get("id")
+            call["function"]["name"] = call["function"]["name"] or function.get("name") or ""
+            call["function"]["arguments"] += function.get("arguments") or ""
+        finish_reason = record.get("finish_reason") or finish_reason
+    if calls:
+        message["tool_calls"] = [calls[index] for index in sorted(calls)]
+    return {"message": message, "finish_reason": finish_reason}
+
+
+def _namespace(value: Any) -> Any:
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_namespace(item) for item in value]
+    return value
+
+
+def _replay_chunk(record: Dict[str, Any]) -> SimpleNamespace:
+    if not record:
+        return SimpleNamespace(choices=[])
+    delta = {"role": None, "content": None, "tool_calls": None, **record.get("delta", {})}
+    choice = {"index": 0, "delta": delta, "finish_reason": record.get("finish_reason")}
+    return _namespace({"choices": [choice]})
+
+
+def _replay_response(record: Dict[str, Any]) -> SimpleNamespace:
+    message = {"role": "assistant", "content": None, "tool_calls": None, **record.get("message", {})}
+    choice = {"index": 0, "message": message, "finish_reason": record.get("finish_reason")}
+    return _namespace({"choices": [choice], "usage": record.get("usage")})
+
+
+async def _aiter(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
+
+
+class _Flight:
+    """进行中的请求，同一哈希的后续请求等待其录制结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        # 等待中的asyncio调用：(事件循环, future)
+        self._waiters: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def land(self):
+        with self._lock:
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def wait(self, timeout: Optional[float]) -> bool:
+        """在事件循环中等待完成（不占用线程），超时返回False"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.done.is_set():
+                return True
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMResponseCache:
+    """
+    录制/回放缓存，每个请求一个JSON文件（按哈希前两位分目录）
+
+    Args:
+        mode: off / record / replay / auto
+        directory: 录制文件目录
+        wait_timeout: 相同请求等待进行中的请求的最长时间（秒），超时后自己调用模型
+    """
+
+    def __init__(
+        self,
+        mode: str = CACHE_OFF,
+        directory: str = DEFAULT_CACHE_DIR,
+        wait_timeout: Optional[float] = DEFAULT_WAIT_TIMEOUT
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的LLM缓存模式: {mode}，可选 {', '.join(CACHE_MODES)}")
+        self.mode = mode
+        self.directory = directory
+        self.wait_timeout = wait_timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0, "deduplicated": 0}
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        """
+        ARGUS_LLM_CACHE: off / record / replay / auto
+        ARGUS_LLM_CACHE_DIR: 录制文件目录
+        ARGUS_LLM_CACHE_WAIT: 相同请求等待进行中的请求的最长时间（秒，0表示不等待）
+        """
+        return cls(
+            mode=os.getenv("ARGUS_LLM_CACHE", CACHE_OFF).strip().lower() or CACHE_OFF,
+            directory=os.getenv("ARGUS_LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+            wait_timeout=float(os.getenv("ARGUS_LLM_CACHE_WAIT", DEFAULT_WAIT_TIMEOUT)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != CACHE_OFF
+
+    def completion(self, key: str, stream: bool, live: Callable[[], Any]) -> Any:
+        """
+        按缓存模式返回响应
+
+        Args:
+            key: 请求哈希
+            stream: 是否以流的形式返回
+            live: 实际调用模型的函数
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._replay(entry, stream)
+        flight, leader = self._join(key)
+        if not leader:
+            # 相同请求正在进行，等待其完成后回放；对方未完成录制（如中途停止）或等待超时时自己调用
+            if not flight.done.wait(self.wait_timeout):
+                logging.warning(f"[LLMCache] 等待相同请求 {key[:12]} 超时，直接调用模型")
+            elif flight.error is not None:
+                raise flight.error
+            elif flight.entry is not None:
+                return self._replay(flight.entry, stream)
+            return self._record(key, stream, live, _Flight())
+
+        return self._record(key, stream, live, flight)
+
+    async def acompletion(self, key: str, stream: bool, live: Callable[[], Awaitable[Any]]) -> Any:
+        """completion()的asyncio版本，live为协程函数，流式响应以异步迭代器返回"""
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._areplay(entry, stream)
+        flight, leader = self._join(key)
+        if not leader:
+            # 领头的请求可能在另一个线程（同步调用）中，完成时通过事件循环唤醒，等待不占用线程
+            if not await flight.wait(self.wait_timeout):
+                logging.warning(f"[LLMCache] 等待相同请求 {key[:12]} 超时，直接调用模型")
+            elif flight.error is not None:
+                raise flight.error
+            elif flight.entry is not None:
+                return self._areplay(flight.entry, stream)
+            flight = _Flight()
+        try:
+            response = await live()
+        except Exception as e:
+            flight.error = e
+            self._land(key, flight)
+            raise
+        except BaseException:
+            self._land(key, flight)
+            raise
+        if stream:
+            return self._track(key, self._arecord_stream(key, response, flight), flight)
+        self._finish(key, {"stream": False, "response": _response_record(response)}, flight)
+        return response
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """replay/auto模式下查找录制，replay模式未命中时报错"""
+        if self.mode not in (CACHE_REPLAY, CACHE_AUTO):
+            return None
+        entry = self._load(key)
+        if entry is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry
+        if self.mode == CACHE_REPLAY:
+            with self._lock:
+                self.stats["misses"] += 1
+            raise LLMCacheMiss(f"[LLMCache] 请求 {key[:12]} 没有录制（replay模式）")
+        return None
+
+    def _join(self, key: str):
+        """登记进行中的请求，返回 (flight, 是否由自己发出)"""
+        with self._lock:
+            self.stats["misses"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats["deduplicated"] += 1
+        return flight, leader
+
+    def _record(self, key: str, stream: bool, live: Callable[[], Any], flight: _Flight) -> Any:
+        try:
+            response = live()
+        except Exception as e:
+            flight.error = e
+            self._land(key, flight)
+            raise
+        except BaseException:
+            self._land(key, flight)
+            raise
+        if stream:
+            return self._track(key, self._record_stream(key, response, flight), flight)
+        entry = {"stream": False, "response": _response_record(response)}
+        self._finish(key, entry, flight)
+        return response
+
+    def _track(self, key: str, stream: Any, flight: _Flight) -> Any:
+        """
+        流从未被读取就被丢弃时，生成器的finally不会执行：对象回收时结束登记，等待中的相同请求各自调用
+        （已正常结束的流再次结束登记没有影响）
+        """
+        weakref.finalize(stream, self._land, key, flight)
+        return stream
+
+    def _record_stream(self, key: str, response: Iterable, flight: _Flight) -> Iterator:
+        chunks: List[Dict[str, Any]] = []
+        complete = False
+        try:
+            for chunk in response:
+                chunks.append(_chunk_record(chunk))
+                yield chunk
+            complete = True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # 调用方中途停止读取（GeneratorExit）时不录制，等待中的相同请求各自重新调用
+            if complete:
+                self._finish(key, {"stream": True, "chunks": chunks}, flight)
+            else:
+                self._land(key, flight)
+
+    async def _arecord_stream(self, key: str, response: Any, flight: _Flight) -> AsyncIterator:
+        chunks: List[Dict[str, Any]] = []
+        complete = False
+        try:
+            async for chunk in response:
+                chunks.append(_chunk_record(chunk))
+                yield chunk
+            complete = True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            if complete:
+                self._finish(key, {"stream": True, "chunks": chunks}, flight)
+            else:
+                self._land(key, flight)
+
+    def _finish(self, key: str, entry: Dict[str, Any], flight: _Flight):
+        flight.entry = entry
+        self._save(key, entry)
+        with self._lock:
+            self.stats["recorded"] += 1
+        self._land(key, flight)
+
+    def _land(self, key: str, flight: _Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.land()
+
+    def _replay(self, entry: Dict[str, Any], stream: bool) -> Any:
+        if entry.get("stream"):
+            if stream:
+                return iter([_replay_chunk(record) for record in entry["chunks"]])
+            # 流式录制按非流式请求回放：合并文本和tool_calls
+            return _replay_response(_merge_chunks(entry["chunks"]))
+        response = entry["response"]
+        if not stream:
+            return _replay_response(response)
+        return iter([_replay_chunk({"delta": response.get("message", {}), "finish_reason": response.get("finish_reason")})])
+
+    def _areplay(self, entry: Dict[str, Any], stream: bool) -> Any:
+        response = self._replay(entry, stream)
+        return _aiter(response) if stream else response
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"[LLMCache] 读取录制失败 {path}: {e}")
+            return None
+
+    def _save(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".llm_cache_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"[LLMCache] 保存录制失败 {path}: {e}")
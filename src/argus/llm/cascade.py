@@ -0,0 +1,226 @@
+"""
+按迭代的模型级联
+Agent每次迭代前判断这一步是否简单（如确认工具结果、确认对话框已关闭），简单的步骤先用便宜/快速的模型，
+出现以下情况时升级到主模型重新生成这一步：
+- 回复无法解析（动作格式错误、工具参数不是合法JSON、调用了不存在的工具、空回复）
+- 置信度低（开启logprobs时按token平均概率，或回复因长度被截断）
+- 便宜模型的调用失败
+同一任务中便宜模型生成的步骤连续执行失败达到阈值后，本任务余下的步骤都使用主模型。
+按模型统计调用次数、延迟、token、费用和升级率。
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .client import LLMEndpoint
+from .ratelimit import estimate_tokens
+
+TIER_CHEAP = "cheap"
+TIER_PRIMARY = "primary"
+
+
+def _chunk_logprobs(chunk: Any) -> List[float]:
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return []
+    content = getattr(getattr(choices[0], "logprobs", None), "content", None) or []
+    values = []
+    for item in content:
+        logprob = item.get("logprob") if isinstance(item, dict) else getattr(item, "logprob", None)
+        if isinstance(logprob, (int, float)):
+            values.append(float(logprob))
+    return values
+
+
+class CascadeStep:
+    """一次迭代中对一个模型的一次尝试，流式数据块需经observe()记录"""
+
+    def __init__(self, cascade: "ModelCascade", endpoint: Any, tier: str, messages: list):
+        self.cascade = cascade
+        self.endpoint = endpoint
+        self.tier = tier
+        self.messages = messages
+        self.started = time.time()
+        self.logprobs: List[float] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Any = None
+        self.finished = False
+
+    @property
+    def cheap(self) -> bool:
+        return self.tier == TIER_CHEAP
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """额外的请求参数：便宜模型按置信度判断升级时请求logprobs"""
+        return {"logprobs": True} if self.cheap and self.cascade.logprobs else {}
+
+    def observe(self, chunk: Any):
+        choices = getattr(chunk, "choices", None)
+        if choices:
+            self.finish_reason = getattr(choices[0], "finish_reason", None) or self.finish_reason
+            if self.cheap and self.cascade.logprobs:
+                self.logprobs.extend(_chunk_logprobs(chunk))
+        self.usage = getattr(chunk, "usage", None) or self.usage
+
+    @property
+    def confidence(self) -> Optional[float]:
+        """token平均概率（几何平均），没有logprobs时为None"""
+        if not self.logprobs:
+            return None
+        return math.exp(sum(self.logprobs) / len(self.logprobs))
+
+    def low_confidence(self) -> Optional[str]:
+        """置信度低时返回原因"""
+        if self.finish_reason == "length":
+            return "回复被截断"
+        confidence = self.confidence
+        if confidence is not None and confidence < self.cascade.min_confidence:
+            return f"置信度低({confidence:.2f})"
+        return None
+
+    def finish(self, content: str = "", error: Optional[BaseException] = None):
+        """记录这次尝试的延迟、token和费用"""
+        if self.finished:
+            return
+        self.finished = True
+        prompt = getattr(self.usage, "prompt_tokens", None)
+        completion = getattr(self.usage, "completion_tokens", None)
+        if not isinstance(prompt, int):
+            prompt = estimate_tokens(self.messages, {})
+        if not isinstance(completion, int):
+            completion = len(content or "") // 3
+        self.cascade._record(self, time.time() - self.started, prompt, completion, error)
+
+
+class ModelCascade:
+    """
+    一个Agent的模型级联策略（每个Agent实例一个，按任务重置）
+
+    Args:
+        primary: 主模型endpoint（LLMEndpoint或EndpointPool）
+        cheap: 便宜模型endpoint，None表示不级联
+        min_confidence: 便宜模型回复的最低token平均概率，0表示不请求logprobs
+        max_cheap_failures: 便宜模型的步骤连续失败多少次后本任务不再使用
+        prices: 模型 -> (输入价格, 输出价格)，每百万token
+    """
+
+    def __init__(
+        self,
+        primary: Any,
+        cheap: Optional[LLMEndpoint] = None,
+        min_confidence: float = 0.0,
+        max_cheap_failures: int = 2,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        name: str = "Agent"
+    ):
+        self.primary = primary
+        self.cheap = cheap
+        self.min_confidence = min_confidence
+        self.max_cheap_failures = max_cheap_failures
+        self.prices = prices or {}
+        self.name = name
+        self._failures = 0
+        self._cheap_disabled = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls, role: str, primary: Any) -> "ModelCascade":
+        """
+        按AgentConfig的 {role}_CHEAP_MODEL 配置便宜模型（地址和Key可用 {role}_CHEAP_API_BASE/KEY 单独指定）
+
+        ARGUS_CASCADE_MIN_CONFIDENCE: 便宜模型回复的最低token平均概率（0-1），0不请求logprobs
+        ARGUS_CASCADE_MAX_FAILURES: 便宜模型步骤连续失败多少次后本任务只用主模型
+        ARGUS_MODEL_PRICES: 模型价格，"model=输入/输出,..."（每百万token）
+        """
+        from argus.config import AgentConfig
+
+        config = AgentConfig.from_env()
+        cheap_model = config.gui_cheap_model if role == "GUIAgent" else config.code_cheap_model
+        cheap = None
+        if cheap_model:
+            cheap = LLMEndpoint.from_env(f"{role}_CHEAP", fallback=LLMEndpoint.from_env(role))
+            cheap = LLMEndpoint(cheap_model, cheap.api_base, cheap.api_key, cheap.rpm, cheap.tpm)
+        return cls(
+            primary,
+            cheap,
+            min_confidence=float(os.getenv("ARGUS_CASCADE_MIN_CONFIDENCE", "0")),
+            max_cheap_failures=int(os.getenv("ARGUS_CASCADE_MAX_FAILURES", "2")),
+            prices={model: (prompt, completion) for model, prompt, completion in config.model_prices},
+            name=role,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.cheap is not None
+
+    @property
+    def logprobs(self) -> bool:
+        return self.min_confidence > 0
+
+    def start_task(self):
+        self._failures = 0
+        self._cheap_disabled = False
+
+    def begin(self, messages: list, easy: bool) -> CascadeStep:
+        """开始一步：简单的步骤用便宜模型，否则用主模型"""
+        if self.enabled and easy and not self._cheap_disabled:
+            return CascadeStep(self, self.cheap, TIER_CHEAP, messages)
+        return CascadeStep(self, self.primary, TIER_PRIMARY, messages)
+
+    def escalate(
+        self, step: CascadeStep, reason: str, content: str = "", error: Optional[BaseException] = None
+    ) -> CascadeStep:
+        """便宜模型的这一步不可用，升级到主模型重新生成"""
+        step.finish(content, error)
+        with self._lock:
+            self._model_stats(step.endpoint.model)["escalations"] += 1
+        logging.info(f"[{self.name}] {step.endpoint.model} 的回复不可用（{reason}），升级到 {self.primary.model}")
+        return CascadeStep(self, self.primary, TIER_PRIMARY, step.messages)
+
+    def outcome(self, step: CascadeStep, success: bool):
+        """一步执行完成（工具/动作的执行结果），便宜模型的步骤连续失败时本任务不再使用便宜模型"""
+        if not step.cheap:
+            return
+        self._failures = 0 if success else self._failures + 1
+        if self._failures >= self.max_cheap_failures and not self._cheap_disabled:
+            self._cheap_disabled = True
+            logging.info(f"[{self.name}] {step.endpoint.model} 的步骤连续失败{self._failures}次，本任务改用主模型")
+
+    def _model_stats(self, model: str) -> Dict[str, float]:
+        return self._stats.setdefault(model, {
+            "calls": 0, "errors": 0, "escalations": 0, "latency": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+        })
+
+    def _record(self, step: CascadeStep, latency: float, prompt: int, completion: int, error: Optional[BaseException]):
+        model = step.endpoint.model
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        with self._lock:
+            stats = self._model_stats(model)
+            stats["calls"] += 1
+            stats["errors"] += int(error is not None)
+            stats["latency"] += latency
+            stats["prompt_tokens"] += prompt
+            stats["completion_tokens"] += completion
+            stats["cost"] += (prompt * prompt_price + completion * completion_price) / 1_000_000
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                model: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_latency": round(stats["latency"] / stats["calls"], 3) if stats["calls"] else None,
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cost": round(stats["cost"], 6),
+                    "escalation_rate": round(stats["escalations"] / stats["calls"], 3) if stats["calls"] else 0.0,
+                }
+                for model, stats in self._stats.items()
+            }
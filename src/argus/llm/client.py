@@ -0,0 +1,499 @@
+"""
+共享LLM客户端
+所有Agent和路由器的completion调用都经过同一个LLMClient：
+一个进程共享一个带连接池的httpx客户端（支持时使用HTTP/2），按endpoint保持keep-alive连接，
+启动时可预先建立TCP/TLS连接；超时集中配置；请求和连接指标统一统计；
+可选的录制/回放缓存位于最前面，命中时不发出请求；未命中的请求经过重试/对冲/熔断策略后发出，
+每次实际发出前按endpoint的RPM/TPM配额排队。
+acompletion()是同一调用链的asyncio版本（litellm.acompletion + httpx.AsyncClient），
+缓存、熔断、限流和endpoint池的状态与同步调用共享。
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from .cache import LLMResponseCache, request_hash
+from .ratelimit import RateLimiter, estimate_tokens
+from .resilience import ResilientCaller, _aclose_stream, _close_stream
+
+DEFAULT_PROVIDER = "volcengine"
+
+
+@dataclass(frozen=True)
+class LLMEndpoint:
+    """
+    一个模型服务端点，rpm/tpm为该端点的每分钟请求数和token数配额（None使用全局默认值），
+    label区分endpoint池中使用同一地址和模型的不同Key
+    """
+
+    model: Optional[str]
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    label: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, role: str, fallback: Optional["LLMEndpoint"] = None) -> "LLMEndpoint":
+        """
+        读取 {role}_MODEL / {role}_API_BASE / {role}_API_KEY / {role}_RPM / {role}_TPM，未设置的项使用fallback的值
+
+        Args:
+            role: "GUIAgent" 或 "CodeAgent"
+        """
+        fallback = fallback or cls(None)
+        return cls(
+            model=os.getenv(f"{role}_MODEL", fallback.model),
+            api_base=os.getenv(f"{role}_API_BASE", fallback.api_base),
+            api_key=os.getenv(f"{role}_API_KEY", fallback.api_key),
+            rpm=int(os.getenv(f"{role}_RPM") or 0) or fallback.rpm,
+            tpm=int(os.getenv(f"{role}_TPM") or 0) or fallback.tpm,
+        )
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.api_base or "").netloc or "default"
+
+    @property
+    def key(self) -> str:
+        """指标和连接统计使用的标识（不含API Key）"""
+        key = f"{self.host}/{self.model}"
+        return f"{key}#{self.label}" if self.label else key
+
+
+class _EndpointStats:
+    __slots__ = ("requests", "streams", "errors", "in_flight", "latency", "ttft", "ttft_count", "last_error")
+
+    def __init__(self):
+        self.requests = 0
+        self.streams = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = 0.0
+        self.ttft = 0.0
+        self.ttft_count = 0
+        self.last_error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        done = self.requests - self.in_flight
+        return {
+            "requests": self.requests,
+            "streams": self.streams,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_latency": round(self.latency / done, 3) if done else None,
+            "avg_ttft": round(self.ttft / self.ttft_count, 3) if self.ttft_count else None,
+            "last_error": self.last_error,
+        }
+
+
+class LLMClient:
+    """
+    进程内共享的LLM客户端
+
+    Args:
+        provider: litellm的provider前缀，模型名按 "{provider}/{model}" 传给litellm
+        timeout: 单次请求的读超时（秒），流式响应为两个数据块之间的最长间隔
+        connect_timeout: 建立连接的超时（秒）
+        max_connections: 连接池最大连接数
+        max_keepalive: 连接池保留的空闲连接数
+        keepalive_expiry: 空闲连接保留的秒数，需覆盖从启动预热到第一个请求的时间
+        http2: 是否使用HTTP/2（未安装h2时自动退回HTTP/1.1）
+        backend: 实际发送请求的函数，默认litellm.completion
+        abackend: asyncio调用实际发送请求的协程函数，默认litellm.acompletion
+        cache: 请求录制/回放缓存，None表示不缓存
+        resilience: 重试/对冲/熔断策略，None表示每个请求只发一次
+        limiter: RPM/TPM限流，None表示不限流
+    """
+
+    def __init__(
+        self,
+        provider: str = DEFAULT_PROVIDER,
+        timeout: float = 600.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 120.0,
+        http2: bool = True,
+        backend: Optional[Callable[..., Any]] = None,
+        cache: Optional[LLMResponseCache] = None,
+        resilience: Optional[ResilientCaller] = None,
+        limiter: Optional[RateLimiter] = None,
+        abackend: Optional[Callable[..., Any]] = None
+    ):
+        self.provider = provider
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logging.warning("[LLMClient] 未安装h2，连接池使用HTTP/1.1（pip install 'httpx[http2]'）")
+        self._backend = backend
+        self._abackend = abackend
+        self.cache = cache
+        self.resilience = resilience
+        self.limiter = limiter
+        self._http = None
+        self._ahttp = None
+        self._ahttp_loop = None
+        self._http_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _EndpointStats] = {}
+        self._prewarmed: Dict[str, float] = {}
+        self._pools: Dict[str, Any] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        """
+        ARGUS_LLM_PROVIDER: litellm的provider前缀
+        ARGUS_LLM_TIMEOUT / ARGUS_LLM_CONNECT_TIMEOUT: 读超时和连接超时（秒）
+        ARGUS_LLM_MAX_CONNECTIONS: 连接池大小
+        ARGUS_LLM_KEEPALIVE: 空闲连接保留的秒数
+        ARGUS_LLM_HTTP2: 1使用HTTP/2（默认，h2随httpx[http2]安装），0使用HTTP/1.1
+        """
+        return cls(
+            provider=os.getenv("ARGUS_LLM_PROVIDER", DEFAULT_PROVIDER),
+            timeout=float(os.getenv("ARGUS_LLM_TIMEOUT", "600")),
+            connect_timeout=float(os.getenv("ARGUS_LLM_CONNECT_TIMEOUT", "10")),
+            max_connections=int(os.getenv("ARGUS_LLM_MAX_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("ARGUS_LLM_KEEPALIVE", "120")),
+            http2=os.getenv("ARGUS_LLM_HTTP2", "1") != "0",
+            cache=LLMResponseCache.from_env(),
+            resilience=ResilientCaller.from_env(),
+            limiter=RateLimiter.from_env(),
+        )
+
+    @property
+    def http(self):
+        """共享的httpx连接池，首次使用时创建并交给litellm的OpenAI兼容provider使用"""
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    import httpx
+                    import litellm
+
+                    self._http = httpx.Client(
+                        http2=self.http2,
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive,
+                            keepalive_expiry=self.keepalive_expiry,
+                        ),
+                    )
+                    litellm.client_session = self._http
+                    logging.info(f"[LLMClient] 连接池已创建 (http2={self.http2})")
+        return self._http
+
+    @property
+    def ahttp(self):
+        """asyncio调用使用的httpx.AsyncClient连接池，与创建它的事件循环绑定，换了事件循环时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._ahttp is None or self._ahttp_loop is not loop:
+            with self._http_lock:
+                if self._ahttp is None or self._ahttp_loop is not loop:
+                    import httpx
+                    import litellm
+
+                    self._ahttp = httpx.AsyncClient(
+                        http2=self.http2,
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive,
+                            keepalive_expiry=self.keepalive_expiry,
+                        ),
+                    )
+                    self._ahttp_loop = loop
+                    litellm.aclient_session = self._ahttp
+                    logging.info(f"[LLMClient] 异步连接池已创建 (http2={self.http2})")
+        return self._ahttp
+
+    def completion(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        """
+        调用模型，参数与litellm.completion相同；stream=True时返回逐块迭代的流
+
+        Args:
+            endpoint: LLMEndpoint（模型、API地址和Key）或EndpointPool（每次尝试从池中选一个）
+            messages: 对话消息
+        """
+        if self.cache is not None and self.cache.enabled:
+            key = request_hash(f"{self.provider}/{endpoint.model}", messages, kwargs)
+            return self.cache.completion(
+                key, bool(kwargs.get("stream")), lambda: self._resilient_completion(endpoint, messages, **kwargs)
+            )
+        return self._resilient_completion(endpoint, messages, **kwargs)
+
+    def _resilient_completion(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        if self.resilience is None:
+            return self._attempt(endpoint, messages, **kwargs)
+        return self.resilience.call(
+            endpoint.key, bool(kwargs.get("stream")), lambda: self._attempt(endpoint, messages, **kwargs)
+        )
+
+    def _attempt(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        if isinstance(endpoint, LLMEndpoint):
+            return self._live_completion(endpoint, messages, **kwargs)
+        with self._lock:
+            self._pools.setdefault(endpoint.key, endpoint)
+        return endpoint.call(lambda member: self._live_completion(member, messages, **kwargs), bool(kwargs.get("stream")))
+
+    def _live_completion(self, endpoint: LLMEndpoint, messages: list, **kwargs) -> Any:
+        stream = bool(kwargs.get("stream"))
+        tokens = 0
+        if self.limiter is not None:
+            tokens = estimate_tokens(messages, kwargs)
+            self.limiter.acquire(endpoint.key, tokens, endpoint.rpm, endpoint.tpm)
+        stats = self._begin(endpoint, stream)
+        started = time.time()
+        try:
+            response = self._send(endpoint, messages, **kwargs)
+        except Exception as e:
+            self._end(stats, started, e)
+            raise
+        if stream:
+            return self._metered_stream(response, stats, started, endpoint, tokens)
+        self._end(stats, started)
+        self._settle(endpoint, tokens, getattr(response, "usage", None))
+        return response
+
+    async def acompletion(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        """
+        completion()的asyncio版本；stream=True时返回异步迭代器
+
+        等待响应、限流排队和重试退避都不占用线程，任务被取消时关闭进行中的连接
+        """
+        if self.cache is not None and self.cache.enabled:
+            key = request_hash(f"{self.provider}/{endpoint.model}", messages, kwargs)
+            return await self.cache.acompletion(
+                key, bool(kwargs.get("stream")), lambda: self._aresilient_completion(endpoint, messages, **kwargs)
+            )
+        return await self._aresilient_completion(endpoint, messages, **kwargs)
+
+    async def _aresilient_completion(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        if self.resilience is None:
+            return await self._aattempt(endpoint, messages, **kwargs)
+        return await self.resilience.acall(
+            endpoint.key, bool(kwargs.get("stream")), lambda: self._aattempt(endpoint, messages, **kwargs)
+        )
+
+    async def _aattempt(self, endpoint: Any, messages: list, **kwargs) -> Any:
+        if isinstance(endpoint, LLMEndpoint):
+            return await self._alive_completion(endpoint, messages, **kwargs)
+        with self._lock:
+            self._pools.setdefault(endpoint.key, endpoint)
+        return await endpoint.acall(
+            lambda member: self._alive_completion(member, messages, **kwargs), bool(kwargs.get("stream"))
+        )
+
+    async def _alive_completion(self, endpoint: LLMEndpoint, messages: list, **kwargs) -> Any:
+        stream = bool(kwargs.get("stream"))
+        tokens = 0
+        if self.limiter is not None:
+            tokens = estimate_tokens(messages, kwargs)
+            await self.limiter.aacquire(endpoint.key, tokens, endpoint.rpm, endpoint.tpm)
+        stats = self._begin(endpoint, stream)
+        started = time.time()
+        try:
+            response = await self._asend(endpoint, messages, **kwargs)
+        except BaseException as e:
+            self._end(stats, started, e if isinstance(e, Exception) else None)
+            raise
+        if stream:
+            return self._ametered_stream(response, stats, started, endpoint, tokens)
+        self._end(stats, started)
+        self._settle(endpoint, tokens, getattr(response, "usage", None))
+        return response
+
+    def _settle(self, endpoint: LLMEndpoint, tokens: int, usage: Any):
+        """按响应中的usage修正限流预留的token数"""
+        total = getattr(usage, "total_tokens", None)
+        if self.limiter is not None and isinstance(total, int):
+            self.limiter.settle(endpoint.key, tokens, total, endpoint.tpm)
+
+    def _send(self, endpoint: LLMEndpoint, messages: list, **kwargs) -> Any:
+        backend = self._backend
+        if backend is None:
+            import litellm
+
+            # 确保litellm使用共享连接池
+            _ = self.http
+            backend = litellm.completion
+        kwargs.setdefault("timeout", self.timeout)
+        return backend(
+            model=f"{self.provider}/{endpoint.model}",
+            api_base=endpoint.api_base,
+            api_key=endpoint.api_key,
+            messages=messages,
+            **kwargs
+        )
+
+    async def _asend(self, endpoint: LLMEndpoint, messages: list, **kwargs) -> Any:
+        backend = self._abackend
+        if backend is None:
+            import litellm
+
+            _ = self.ahttp
+            backend = litellm.acompletion
+        kwargs.setdefault("timeout", self.timeout)
+        return await backend(
+            model=f"{self.provider}/{endpoint.model}",
+            api_base=endpoint.api_base,
+            api_key=endpoint.api_key,
+            messages=messages,
+            **kwargs
+        )
+
+    def _metered_stream(
+        self, response: Iterable, stats: _EndpointStats, started: float, endpoint: LLMEndpoint, tokens: int
+    ) -> Iterator:
+        """透传流式数据块，记录首个数据块的时间（TTFT）和整体耗时"""
+        error = None
+        first = True
+        complete = False
+        usage = None
+        try:
+            for chunk in response:
+                if first:
+                    first = False
+                    with self._lock:
+                        stats.ttft += time.time() - started
+                        stats.ttft_count += 1
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            complete = True
+            self._settle(endpoint, tokens, usage)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not complete:
+                # 调用方中途停止读取或出错时关闭连接，避免未读完的响应占用连接池
+                _close_stream(response)
+            self._end(stats, started, error)
+
+    async def _ametered_stream(
+        self, response: Any, stats: _EndpointStats, started: float, endpoint: LLMEndpoint, tokens: int
+    ) -> AsyncIterator:
+        """_metered_stream()的asyncio版本"""
+        error = None
+        first = True
+        complete = False
+        usage = None
+        try:
+            async for chunk in response:
+                if first:
+                    first = False
+                    with self._lock:
+                        stats.ttft += time.time() - started
+                        stats.ttft_count += 1
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            complete = True
+            self._settle(endpoint, tokens, usage)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not complete:
+                await _aclose_stream(response)
+            self._end(stats, started, error)
+
+    def _begin(self, endpoint: LLMEndpoint, stream: bool) -> _EndpointStats:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint.key, _EndpointStats())
+            stats.requests += 1
+            stats.streams += int(stream)
+            stats.in_flight += 1
+        return stats
+
+    def _end(self, stats: _EndpointStats, started: float, error: Optional[BaseException] = None):
+        with self._lock:
+            stats.in_flight -= 1
+            stats.latency += time.time() - started
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = f"{type(error).__name__}: {error}"[:200]
+
+    def prewarm(self, api_bases: Iterable[Optional[str]]):
+        """
+        预先建立到各API地址的连接（DNS、TCP、TLS握手），连接留在池中供后续请求复用
+
+        只关心连接是否建立，不关心响应状态码
+        """
+        http = self.http
+        for api_base in dict.fromkeys(base for base in api_bases if base):
+            begin = time.time()
+            try:
+                http.request("HEAD", api_base, timeout=self.connect_timeout)
+            except Exception as e:
+                logging.warning(f"[LLMClient] 预热连接 {api_base} 失败: {e}")
+                continue
+            with self._lock:
+                self._prewarmed[urlparse(api_base).netloc] = round(time.time() - begin, 3)
+            logging.info(f"[LLMClient] 已预热连接 {api_base} ({time.time() - begin:.2f}s)")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """请求指标（按endpoint）和连接池状态"""
+        with self._lock:
+            endpoints = {key: stats.to_dict() for key, stats in self._stats.items()}
+            prewarmed = dict(self._prewarmed)
+            pools = dict(self._pools)
+        return {
+            "endpoints": endpoints,
+            "connections": self._connection_stats(),
+            "prewarmed": prewarmed,
+            "cache": dict(self.cache.stats, mode=self.cache.mode) if self.cache is not None else None,
+            "resilience": self.resilience.get_metrics() if self.resilience is not None else None,
+            "rate_limit": self.limiter.get_metrics() if self.limiter is not None else None,
+            "pools": {key: pool.get_metrics() for key, pool in pools.items()},
+        }
+
+    def _connection_stats(self) -> Dict[str, Any]:
+        result = {"http2": self.http2, "open": 0, "idle": 0}
+        if self._http is None:
+            return result
+        # httpx没有公开连接池状态，读取httpcore连接池（取不到时只返回配置）
+        pool = getattr(getattr(self._http, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", []) or []:
+            result["open"] += 1
+            try:
+                result["idle"] += int(connection.is_idle())
+            except Exception:
+                pass
+        return result
+
+    def close(self):
+        with self._http_lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+
+    async def aclose(self):
+        """关闭当前事件循环的异步连接池"""
+        with self._http_lock:
+            ahttp, self._ahttp, self._ahttp_loop = self._ahttp, None, None
+        if ahttp is not None:
+            await ahttp.aclose()
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取进程内共享的LLM客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient.from_env()
+    return _client
@@ -0,0 +1,192 @@
+"""
+LLM请求限流（令牌桶）
+每个endpoint两个桶：每分钟请求数（RPM）和每分钟token数（TPM），桶容量为一分钟的配额。
+请求发出前先从桶中预留，余量不足时余量记为负数、调用方等待到余量回到0再发出，
+因此等待的请求按到达顺序依次放行（先到先得），大请求不会被小请求一直插队。
+token数在请求前按消息长度粗略估算，拿到响应中的usage后按实际值修正。
+默认进程内共享；配置SQLite路径后多个进程（多个会话）共享同一组桶。
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 图片按固定token数估算
+_IMAGE_TOKENS = 1000
+
+
+def estimate_tokens(messages: list, params: Dict[str, Any]) -> int:
+    """粗略估算请求占用的token数：文本约3个字符一个token，加上max_tokens"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if not isinstance(part, dict):
+                    continue
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(str(part.get("text", "")))
+        if isinstance(message, dict) and message.get("tool_calls"):
+            chars += len(str(message["tool_calls"]))
+    chars += len(str(params.get("tools", ""))) if params.get("tools") else 0
+    completion = params.get("max_tokens") or params.get("max_completion_tokens") or 0
+    return chars // 3 + images * _IMAGE_TOKENS + int(completion) + 1
+
+
+class _MemoryStore:
+    """进程内的桶状态"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, name: str, amount: float, capacity: float, now: float) -> float:
+        """预留amount（负数表示归还），返回需要等待的秒数"""
+        with self._lock:
+            level, updated = self._buckets.get(name, (capacity, now))
+            level = min(capacity, level + max(0.0, now - updated) * capacity / 60.0) - amount
+            self._buckets[name] = (level, now)
+        return max(0.0, -level * 60.0 / capacity)
+
+
+class _SQLiteStore:
+    """多进程共享的桶状态，每次预留在一个写事务中完成"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+
+    def take(self, name: str, amount: float, capacity: float, now: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                level, updated = row if row else (capacity, now)
+                level = min(capacity, level + max(0.0, now - updated) * capacity / 60.0) - amount
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (name, level, now)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return max(0.0, -level * 60.0 / capacity)
+
+
+class RateLimiter:
+    """
+    按endpoint的RPM/TPM限流
+
+    Args:
+        rpm: 默认每分钟请求数，0不限制
+        tpm: 默认每分钟token数，0不限制
+        path: SQLite文件路径，设置后多个进程共享配额；None只在进程内共享
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        path: Optional[str] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.time
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        self._store = _SQLiteStore(path) if path else _MemoryStore()
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """
+        ARGUS_LLM_RPM / ARGUS_LLM_TPM: 每个endpoint默认的每分钟请求数和token数，0不限制
+        ARGUS_LLM_RATE_LIMIT_DB: SQLite路径，设置后多个进程共享配额
+        """
+        return cls(
+            rpm=int(os.getenv("ARGUS_LLM_RPM", "0")),
+            tpm=int(os.getenv("ARGUS_LLM_TPM", "0")),
+            path=os.getenv("ARGUS_LLM_RATE_LIMIT_DB") or None,
+        )
+
+    def acquire(self, key: str, tokens: int, rpm: Optional[int] = None, tpm: Optional[int] = None) -> float:
+        """
+        预留一次请求和tokens个token，配额不足时等待
+
+        Args:
+            key: endpoint标识
+            tokens: 估算的token数
+            rpm / tpm: 该endpoint的配额，None使用默认值
+
+        Returns:
+            排队等待的秒数
+        """
+        wait = self._reserve(key, tokens, rpm, tpm)
+        if wait > 0:
+            self._sleep(wait)
+        return self._account(key, wait)
+
+    async def aacquire(self, key: str, tokens: int, rpm: Optional[int] = None, tpm: Optional[int] = None) -> float:
+        """acquire()的asyncio版本，排队时不占用线程"""
+        wait = self._reserve(key, tokens, rpm, tpm)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return self._account(key, wait)
+
+    def _reserve(self, key: str, tokens: int, rpm: Optional[int], tpm: Optional[int]) -> float:
+        rpm = self.rpm if rpm is None else rpm
+        tpm = self.tpm if tpm is None else tpm
+        now = self._clock()
+        wait = 0.0
+        if rpm > 0:
+            wait = max(wait, self._store.take(f"{key}#rpm", 1, rpm, now))
+        if tpm > 0:
+            wait = max(wait, self._store.take(f"{key}#tpm", tokens, tpm, now))
+        if wait >= 1:
+            logging.info(f"[RateLimiter] {key} 达到配额，排队 {wait:.1f}s")
+        return wait
+
+    def _account(self, key: str, wait: float) -> float:
+        with self._lock:
+            stats = self._stats.setdefault(key, {"requests": 0, "queued": 0, "queue_delay": 0.0, "max_delay": 0.0})
+            stats["requests"] += 1
+            if wait > 0:
+                stats["queued"] += 1
+                stats["queue_delay"] += wait
+                stats["max_delay"] = max(stats["max_delay"], wait)
+        return wait
+
+    def settle(self, key: str, estimated: int, actual: int, tpm: Optional[int] = None):
+        """按响应中的实际token数修正预留量"""
+        tpm = self.tpm if tpm is None else tpm
+        if tpm > 0 and actual != estimated:
+            self._store.take(f"{key}#tpm", actual - estimated, tpm, self._clock())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                result[key] = {
+                    "requests": stats["requests"],
+                    "queued": stats["queued"],
+                    "avg_queue_delay": round(stats["queue_delay"] / stats["requests"], 3),
+                    "max_queue_delay": round(stats["max_delay"], 3),
+                }
+        return {"rpm": self.rpm, "tpm": self.tpm, "shared": self.path, "endpoints": result}
@@ -0,0 +1,435 @@
+"""
+LLM调用的重试、对冲请求和熔断
+- 重试：连接错误、超时、429和5xx按指数退避加随机抖动重试，优先使用服务端的Retry-After
+- 对冲：首个token的等待时间超过该endpoint历史TTFT的分位数时，再发一个相同请求，取先返回首个token的一个，
+  另一个关闭连接
+- 熔断：每个endpoint连续失败达到阈值后熔断，冷却期内直接失败，冷却结束后放行一个试探请求，成功则恢复
+错误只在首个token之前重试/对冲；流已经开始输出后出错时原样抛给调用方。
+同步调用和asyncio调用（acall）共用同一组熔断器和TTFT统计。
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """endpoint已熔断，请求未发出"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """按状态码判断（litellm/OpenAI的异常都带status_code），没有状态码时连接和超时类错误可重试"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """读取响应头中的Retry-After（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _close_stream(stream: Any):
+    """关闭流式响应，释放连接"""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+            return
+
+
+async def _aclose_stream(stream: Any):
+    """关闭异步流式响应，释放连接"""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "aclose", None) or getattr(target, "close", None)
+        if close is not None:
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                pass
+            return
+
+
+class CircuitBreaker:
+    """
+    连续失败熔断器
+
+    Args:
+        failure_threshold: 连续失败多少次后熔断
+        cooldown: 熔断后多少秒放行试探请求
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return BREAKER_CLOSED
+            if self._probing or self._clock() - self._opened_at >= self.cooldown:
+                return BREAKER_HALF_OPEN
+            return BREAKER_OPEN
+
+    def allow(self) -> bool:
+        """是否放行请求；半开状态只放行一个试探请求"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or self._clock() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logging.warning(f"[CircuitBreaker] 连续失败{self._failures}次，熔断{self.cooldown}s")
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class _EndpointState:
+    def __init__(self, breaker: CircuitBreaker, samples: int):
+        self.breaker = breaker
+        self.ttft: Deque[float] = deque(maxlen=samples)
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0,
+                      "hedges": 0, "hedge_wins": 0, "rejected": 0}
+
+
+class ResilientCaller:
+    """
+    重试/对冲/熔断策略
+
+    Args:
+        max_retries: 首次请求之外最多重试的次数
+        base_delay / max_delay: 指数退避的初始和最大等待（秒），实际等待在[0, 退避值]之间随机
+        hedge_percentile: 触发对冲的TTFT分位数（0-100），0关闭对冲
+        hedge_min_delay: 对冲等待的下限（秒），避免在历史TTFT很短时频繁对冲
+        hedge_min_samples: 该endpoint至少有多少个TTFT样本后才开始对冲
+        breaker_failures / breaker_cooldown: 熔断阈值和冷却时间
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay: float = 2.0,
+        hedge_min_samples: int = 20,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, _EndpointState] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        """
+        ARGUS_LLM_RETRIES: 最多重试次数
+        ARGUS_LLM_RETRY_BASE_DELAY / ARGUS_LLM_RETRY_MAX_DELAY: 退避时间（秒）
+        ARGUS_LLM_HEDGE_PERCENTILE: 触发对冲的TTFT分位数，0关闭
+        ARGUS_LLM_HEDGE_MIN_DELAY: 对冲等待下限（秒）
+        ARGUS_LLM_BREAKER_FAILURES / ARGUS_LLM_BREAKER_COOLDOWN: 熔断阈值和冷却时间（秒）
+        """
+        return cls(
+            max_retries=int(os.getenv("ARGUS_LLM_RETRIES", "2")),
+            base_delay=float(os.getenv("ARGUS_LLM_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv("ARGUS_LLM_RETRY_MAX_DELAY", "30")),
+            hedge_percentile=float(os.getenv("ARGUS_LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("ARGUS_LLM_HEDGE_MIN_DELAY", "2")),
+            breaker_failures=int(os.getenv("ARGUS_LLM_BREAKER_FAILURES", "5")),
+            breaker_cooldown=float(os.getenv("ARGUS_LLM_BREAKER_COOLDOWN", "30")),
+        )
+
+    def _state(self, key: str) -> _EndpointState:
+        with self._lock:
+            state = self._endpoints.get(key)
+            if state is None:
+                breaker = CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+                state = self._endpoints[key] = _EndpointState(breaker, max(self.hedge_min_samples, 200))
+            return state
+
+    def is_available(self, key: str) -> bool:
+        """endpoint当前是否未熔断（不占用半开状态的试探名额）"""
+        return self._state(key).breaker.state != BREAKER_OPEN
+
+    def call(self, key: str, stream: bool, attempt: Callable[[], Any]) -> Any:
+        """
+        执行一次调用，失败时按策略重试
+
+        Args:
+            key: endpoint标识，熔断和TTFT统计按此区分
+            stream: attempt返回的是否为流
+            attempt: 发出一次请求的函数
+        """
+        state = self._state(key)
+        self._count(state, "calls")
+        for attempt_number in range(self.max_retries + 1):
+            self._admit(state, key)
+            try:
+                result = self._first_token(state, stream, attempt)
+            except Exception as e:
+                self._sleep(self._failed(state, key, e, attempt_number))
+                continue
+            state.breaker.record_success()
+            return result
+
+    async def acall(self, key: str, stream: bool, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """call()的asyncio版本，attempt为协程函数，流式响应为异步迭代器"""
+        state = self._state(key)
+        self._count(state, "calls")
+        for attempt_number in range(self.max_retries + 1):
+            self._admit(state, key)
+            try:
+                result = await self._afirst_token(state, stream, attempt)
+            except Exception as e:
+                await asyncio.sleep(self._failed(state, key, e, attempt_number))
+                continue
+            state.breaker.record_success()
+            return result
+
+    def _admit(self, state: _EndpointState, key: str):
+        if not state.breaker.allow():
+            self._count(state, "rejected")
+            raise CircuitOpenError(f"[LLM] {key} 已熔断，{self.breaker_cooldown}s后重试")
+
+    def _failed(self, state: _EndpointState, key: str, error: Exception, attempt_number: int) -> float:
+        """记录一次失败；不可重试或已用完重试次数时重新抛出，否则返回退避时间"""
+        retryable = is_retryable(error)
+        self._count(state, "failures")
+        if retryable:
+            state.breaker.record_failure()
+        else:
+            # 请求本身的问题（参数、鉴权等），endpoint是健康的，释放半开状态的试探名额
+            state.breaker.record_success()
+        if not retryable or attempt_number >= self.max_retries:
+            raise error
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt_number))
+        self._count(state, "retries")
+        logging.warning(
+            f"[LLM] {key} 第{attempt_number + 1}次请求失败({type(error).__name__}: {str(error)[:120]})，"
+            f"{delay:.1f}s后重试"
+        )
+        return delay
+
+    def _hedge_delay(self, state: _EndpointState) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(state.ttft) < self.hedge_min_samples:
+            return None
+        samples = sorted(state.ttft)
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, samples[index])
+
+    def _first_token(self, state: _EndpointState, stream: bool, attempt: Callable[[], Any]) -> Any:
+        """发出请求并等到首个token（非流式为完整响应），需要时发出对冲请求"""
+        hedge_delay = self._hedge_delay(state)
+        if hedge_delay is None:
+            result = self._start(state, stream, attempt)
+            return self._resume(*result) if stream else result[0]
+
+        results: "queue.Queue" = queue.Queue()
+        decided = threading.Event()
+        lock = threading.Lock()
+
+        def run(hedge: bool):
+            try:
+                result = self._start(state, stream, attempt)
+            except Exception as e:
+                results.put((hedge, None, e))
+                return
+            with lock:
+                lost = decided.is_set()
+                decided.set()
+            if lost:
+                # 另一个请求已经胜出，关闭这个的连接
+                if stream:
+                    _close_stream(result[2])
+                return
+            results.put((hedge, result, None))
+
+        threading.Thread(target=run, args=(False,), daemon=True).start()
+        pending = 1
+        try:
+            outcome = results.get(timeout=hedge_delay)
+        except queue.Empty:
+            self._count(state, "hedges")
+            logging.info(f"[LLM] 首个token超过{hedge_delay:.1f}s，发出对冲请求")
+            threading.Thread(target=run, args=(True,), daemon=True).start()
+            pending = 2
+            outcome = results.get()
+        while True:
+            hedge, result, error = outcome
+            pending -= 1
+            if error is None:
+                if hedge:
+                    self._count(state, "hedge_wins")
+                return self._resume(*result) if stream else result[0]
+            if pending == 0:
+                raise error
+            outcome = results.get()
+
+    def _start(self, state: _EndpointState, stream: bool, attempt: Callable[[], Any]):
+        """返回(首个数据块或完整响应, 剩余迭代器, 流对象)"""
+        self._count(state, "attempts")
+        started = time.time()
+        response = attempt()
+        if not stream:
+            state.ttft.append(time.time() - started)
+            return response, None, None
+        iterator = iter(response)
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return None, iterator, response
+        except BaseException:
+            _close_stream(response)
+            raise
+        state.ttft.append(time.time() - started)
+        return first, iterator, response
+
+    @staticmethod
+    def _resume(first: Any, iterator: Iterator, response: Any) -> Iterator:
+        """把已经取出的首个数据块和剩余数据块接成一个流"""
+        complete = False
+        try:
+            if first is not None:
+                yield first
+            yield from iterator
+            complete = True
+        finally:
+            if not complete:
+                _close_stream(response)
+
+    async def _afirst_token(self, state: _EndpointState, stream: bool, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """_first_token()的asyncio版本：对冲请求是另一个任务，胜出后取消另一个"""
+        hedge_delay = self._hedge_delay(state)
+        if hedge_delay is None:
+            result = await self._astart(state, stream, attempt)
+            return self._aresume(*result) if stream else result[0]
+
+        primary = asyncio.ensure_future(self._astart(state, stream, attempt))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self._count(state, "hedges")
+                logging.info(f"[LLM] 首个token超过{hedge_delay:.1f}s，发出对冲请求")
+                tasks.add(asyncio.ensure_future(self._astart(state, stream, attempt)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if not winners:
+                    error = next(iter(done)).exception()
+                    continue
+                winner = winners[0]
+                for loser in winners[1:]:
+                    if stream:
+                        await _aclose_stream(loser.result()[2])
+                if winner is not primary:
+                    self._count(state, "hedge_wins")
+                result = winner.result()
+                return self._aresume(*result) if stream else result[0]
+            raise error
+        finally:
+            # 胜出或调用方取消时，未完成的请求一并取消（取消会关闭其连接）
+            for task in tasks:
+                task.cancel()
+
+    async def _astart(self, state: _EndpointState, stream: bool, attempt: Callable[[], Awaitable[Any]]):
+        self._count(state, "attempts")
+        started = time.time()
+        response = await attempt()
+        if not stream:
+            state.ttft.append(time.time() - started)
+            return response, None, None
+        iterator = response.__aiter__()
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            return None, iterator, response
+        except BaseException:
+            await _aclose_stream(response)
+            raise
+        state.ttft.append(time.time() - started)
+        return first, iterator, response
+
+    @staticmethod
+    async def _aresume(first: Any, iterator: AsyncIterator, response: Any) -> AsyncIterator:
+        complete = False
+        try:
+            if first is not None:
+                yield first
+            async for chunk in iterator:
+                yield chunk
+            complete = True
+        finally:
+            if not complete:
+                await _aclose_stream(response)
+
+    def _count(self, state: _EndpointState, name: str):
+        with self._lock:
+            state.stats[name] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        result = {}
+        for key, state in endpoints.items():
+            with self._lock:
+                stats = dict(state.stats)
+            stats["breaker"] = state.breaker.state
+            stats["hedge_delay"] = self._hedge_delay(state)
+            result[key] = stats
+        return result
@@ -0,0 +1,464 @@
+"""
+本地OpenAI兼容的桩LLM服务
+不需要网络和真实模型，按OpenAI chat/completions协议返回脚本或录制的回复（支持流式和tool_calls），
+首个token延迟（TTFT）和生成速率可配置，用于在CI上确定性地压测Agent循环、路由器和LLMClient的连接池/重试/限流。
+
+回复来源（按顺序）：
+1. 录制目录（LLMResponseCache的录制文件），按与客户端相同的请求哈希查找
+2. 脚本规则：match（正则，匹配最后一条用户消息的文本）和model都满足的第一条规则；
+   没有match和model的规则按顺序轮流使用
+3. 默认回复 "The task is done."（CodeAgent据此结束任务）
+
+脚本为JSON数组或JSONL，每条规则：
+{"match": "计算", "model": "m", "content": "文本", "tool_calls": [{"name": "execute_code", "arguments": {"code": "1+1"}}],
+ "finish_reason": "stop", "ttft": 0.2, "tokens_per_second": 50, "status": 503, "retry_after": 1}
+status不为200时返回该HTTP错误（用于测试重试、熔断和endpoint池）。
+
+python -m argus.llm.stub_server --port 8765 --script responses.jsonl --ttft 0.3 --tps 40
+然后把 {role}_API_BASE 设为 http://127.0.0.1:8765/v1、ARGUS_LLM_PROVIDER 设为 openai。
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import _IGNORED_PARAMS, LLMResponseCache, request_hash
+from .ratelimit import estimate_tokens
+
+DEFAULT_CONTENT = "The task is done."
+
+# 英文单词/数字按一个token，其余字符（中文、标点、空白）每个一个token
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|\s+|.", re.S)
+
+
+def split_tokens(text: str) -> List[str]:
+    """把文本切成模拟的token，拼接后与原文相同"""
+    return _TOKEN_PATTERN.findall(text or "")
+
+
+def load_script(path: str) -> List[Dict[str, Any]]:
+    """读取脚本文件（JSON数组或JSONL）"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.strip()
+    if stripped.startswith("["):
+        rules = json.loads(stripped)
+    else:
+        rules = [json.loads(line) for line in text.splitlines() if line.strip() and not line.startswith("#")]
+    for number, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f"脚本第{number}条规则不是JSON对象")
+    return rules
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content or ""
+    return ""
+
+
+def _tool_calls(rule_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """脚本中的tool_calls转换为OpenAI格式，arguments可以直接写对象"""
+    calls = []
+    for call in rule_calls or []:
+        function = call.get("function", call)
+        arguments = function.get("arguments", {})
+        calls.append({
+            "id": call.get("id") or f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {
+                "name": function["name"],
+                "arguments": arguments if isinstance(arguments, str) else json.dumps(arguments, ensure_ascii=False),
+            },
+        })
+    return calls
+
+
+class StubReply:
+    """一次请求的回复内容和时序"""
+
+    def __init__(
+        self,
+        content: str = "",
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        finish_reason: Optional[str] = None,
+        status: int = 200,
+        retry_after: Optional[float] = None,
+        ttft: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        source: str = "script"
+    ):
+        self.content = content or ""
+        self.tool_calls = tool_calls or []
+        self.finish_reason = finish_reason or ("tool_calls" if self.tool_calls else "stop")
+        self.status = status
+        self.retry_after = retry_after
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.source = source
+
+    @classmethod
+    def from_rule(cls, rule: Dict[str, Any]) -> "StubReply":
+        return cls(
+            content=rule.get("content", ""),
+            tool_calls=_tool_calls(rule.get("tool_calls")),
+            finish_reason=rule.get("finish_reason"),
+            status=int(rule.get("status", 200)),
+            retry_after=rule.get("retry_after"),
+            ttft=rule.get("ttft"),
+            tokens_per_second=rule.get("tokens_per_second"),
+        )
+
+    @classmethod
+    def from_recording(cls, entry: Dict[str, Any]) -> "StubReply":
+        """LLMResponseCache的录制转换为回复，流式录制合并为一条消息"""
+        if not entry.get("stream"):
+            response = entry["response"]
+            message = response.get("message", {})
+            return cls(message.get("content", ""), message.get("tool_calls"), response.get("finish_reason"),
+                       source="recording")
+        content = ""
+        calls: Dict[int, Dict[str, Any]] = {}
+        finish_reason = None
+        for chunk in entry.get("chunks", []):
+            delta = chunk.get("delta", {})
+            content += delta.get("content") or ""
+            for fragment in delta.get("tool_calls") or []:
+                call = calls.setdefault(fragment.get("index", 0), {
+                    "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                })
+                call["id"] = fragment.get("id") or call["id"]
+                function = fragment.get("function") or {}
+                call["function"]["name"] += function.get("name") or ""
+                call["function"]["arguments"] += function.get("arguments") or ""
+            finish_reason = chunk.get("finish_reason") or finish_reason
+        tool_calls = [calls[index] for index in sorted(calls)]
+        for call in tool_calls:
+            call["id"] = call["id"] or f"call_{uuid.uuid4().hex[:12]}"
+        return cls(content, tool_calls, finish_reason, source="recording")
+
+    @property
+    def completion_tokens(self) -> int:
+        tokens = len(split_tokens(self.content))
+        for call in self.tool_calls:
+            tokens += len(split_tokens(call["function"]["arguments"])) + 1
+        return tokens
+
+
+class StubLLMServer:
+    """
+    桩LLM服务
+
+    Args:
+        rules: 脚本规则
+        ttft: 默认首个token延迟（秒）
+        tokens_per_second: 默认生成速率，0表示不限速
+        jitter: 延迟的随机波动比例（0.1表示±10%），按seed确定
+        error_rate: 按比例随机返回503（在脚本规则之外额外注入）
+        recordings: LLMResponseCache的录制目录，命中时优先回放
+        provider: 计算录制哈希时使用的provider前缀，需与客户端的ARGUS_LLM_PROVIDER一致
+        host / port: 监听地址，port为0时随机分配
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[Dict[str, Any]]] = None,
+        ttft: float = 0.0,
+        tokens_per_second: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        recordings: Optional[str] = None,
+        provider: str = "openai",
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.rules = rules or []
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.recordings = LLMResponseCache("replay", recordings) if recordings else None
+        self.provider = provider
+        self._random = random.Random(seed)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0,
+                      "recorded": 0, "scripted": 0}
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        """在后台线程中开始服务"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, name="stub-llm", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"[StubLLM] 已启动 {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reply(self, body: Dict[str, Any]) -> StubReply:
+        """选出一次请求的回复"""
+        reply = self._select(body)
+        key = {"recording": "recorded", "script": "scripted"}.get(reply.source)
+        if key:
+            with self._lock:
+                self.stats[key] += 1
+        return reply
+
+    def _select(self, body: Dict[str, Any]) -> StubReply:
+        messages = body.get("messages") or []
+        if self.recordings is not None:
+            params = {key: value for key, value in body.items()
+                      if key not in ("model", "messages") and key not in _IGNORED_PARAMS}
+            entry = self.recordings._load(request_hash(f"{self.provider}/{body.get('model')}", messages, params))
+            if entry is not None:
+                return StubReply.from_recording(entry)
+
+        text = _last_user_text(messages)
+        model = body.get("model")
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                return StubReply(status=503, source="injected")
+            for rule in self.rules:
+                if "match" not in rule and "model" not in rule:
+                    continue
+                if rule.get("model") not in (None, model):
+                    continue
+                if "match" in rule and not re.search(rule["match"], text):
+                    continue
+                return StubReply.from_rule(rule)
+            sequence = [rule for rule in self.rules if "match" not in rule and "model" not in rule]
+            if sequence:
+                rule = sequence[self._sequence % len(sequence)]
+                self._sequence += 1
+                return StubReply.from_rule(rule)
+        return StubReply(DEFAULT_CONTENT, source="default")
+
+    def delays(self, reply: StubReply) -> Tuple[float, float]:
+        """返回 (首个token延迟, 每个token的间隔)"""
+        ttft = self.ttft if reply.ttft is None else reply.ttft
+        rate = self.tokens_per_second if reply.tokens_per_second is None else reply.tokens_per_second
+        interval = 1.0 / rate if rate else 0.0
+        if self.jitter:
+            with self._lock:
+                ttft *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, ttft), interval
+
+    def _enter(self, stream: bool):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["streams"] += int(stream)
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def _exit(self, status: int):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["errors"] += int(status != 200)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1保持连接，客户端连接池的复用效果与真实服务一致
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def stub(self) -> StubLLMServer:
+        return self.server.stub
+
+    def log_message(self, format, *args):
+        logging.debug("[StubLLM] " + format % args)
+
+    def do_HEAD(self):
+        # LLMClient.prewarm用HEAD请求建立连接
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/models"):
+            models = sorted({rule["model"] for rule in self.stub.rules if rule.get("model")} or {"stub"})
+            self._json(200, {"object": "list", "data": [{"id": model, "object": "model"} for model in models]})
+        elif path.endswith("/stats"):
+            with self.stub._lock:
+                self._json(200, dict(self.stub.stats))
+        else:
+            self._json(404, {"error": {"message": f"not found: {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": f"not found: {self.path}"}})
+            return
+
+        stream = bool(body.get("stream"))
+        reply = self.stub.reply(body)
+        self.stub._enter(stream)
+        try:
+            if reply.status != 200:
+                time.sleep(self.stub.delays(reply)[0])
+                headers = {"Retry-After": str(reply.retry_after)} if reply.retry_after is not None else {}
+                self._json(reply.status, {"error": {"message": "stub error", "code": reply.status}}, headers)
+            elif stream:
+                self._stream(body, reply)
+            else:
+                self._complete(body, reply)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中途关闭连接（停止、取消或对冲请求落败）
+            self.close_connection = True
+        finally:
+            self.stub._exit(reply.status)
+
+    def _complete(self, body: Dict[str, Any], reply: StubReply):
+        ttft, interval = self.stub.delays(reply)
+        time.sleep(ttft + interval * reply.completion_tokens)
+        message: Dict[str, Any] = {"role": "assistant", "content": reply.content or None}
+        if reply.tool_calls:
+            message["tool_calls"] = reply.tool_calls
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": reply.finish_reason}],
+            "usage": self._usage(body, reply),
+        })
+
+    def _stream(self, body: Dict[str, Any], reply: StubReply):
+        ttft, interval = self.stub.delays(reply)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+        created = int(time.time())
+        logprobs = bool(body.get("logprobs"))
+
+        def send(delta: Dict[str, Any], finish_reason: Optional[str] = None, token: Optional[str] = None):
+            choice: Dict[str, Any] = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+            if logprobs and token is not None:
+                choice["logprobs"] = {"content": [{"token": token, "logprob": -0.01, "top_logprobs": []}]}
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": body.get("model"), "choices": [choice]})
+
+        time.sleep(ttft)
+        send({"role": "assistant", "content": ""})
+        for token in split_tokens(reply.content):
+            send({"content": token}, token=token)
+            time.sleep(interval)
+        for index, call in enumerate(reply.tool_calls):
+            send({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                  "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            for token in split_tokens(call["function"]["arguments"]):
+                send({"tool_calls": [{"index": index, "function": {"arguments": token}}]}, token=token)
+                time.sleep(interval)
+        send({}, reply.finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": body.get("model"), "choices": [], "usage": self._usage(body, reply)})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _usage(self, body: Dict[str, Any], reply: StubReply) -> Dict[str, int]:
+        prompt = estimate_tokens(body.get("messages") or [], {})
+        completion = reply.completion_tokens
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    def _event(self, payload: Dict[str, Any]):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容的桩LLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="回复脚本（JSON数组或JSONL）")
+    parser.add_argument("--recordings", help="LLMResponseCache录制目录，命中时优先回放")
+    parser.add_argument("--provider", default="openai", help="计算录制哈希时使用的provider前缀")
+    parser.add_argument("--ttft", type=float, default=0.3, help="首个token延迟（秒）")
+    parser.add_argument("--tps", type=float, default=50.0, help="每秒生成的token数，0表示不限速")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机波动比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回503的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = StubLLMServer(
+        rules=load_script(args.script) if args.script else None,
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        recordings=args.recordings,
+        provider=args.provider,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+    logging.info(f"[StubLLM] 监听 {server.base_url}，Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import argparse
+import asyncio
 import logging
 import queue
+import sys
 import threading
 from typing import Optional
 
@@ -8,7 +10,30 @@ from argus.config import AgentConfig
 from argus.doctor import run_doctor
 
 
+def _print_message(msg: dict) -> bool:
+    """打印一条Agent消息，收到[STOP]状态时返回True"""
+    msg_type = msg.get("type", "")
+    content = msg.get("content", "")
+
+    if msg_type == "status":
+        if content == "[START]":
+            print("[状态] Agent已启动")
+        elif content == "[STOP]":
+            print("\n[状态] Agent已停止")
+            return True
+    elif msg_type == "ai_content":
+        if content not in ["[BEGIN]", "[END]"]:
+            print(content, end="", flush=True)
+    elif msg_type == "text":
+        print(f"\n{content}")
+    elif msg_type == "tool_result":
+        tool_info = content
+        print(f"\n[工具] {tool_info.get('function')}: {'成功' if tool_info.get('success') else '失败'}")
+    return False
+
+
 def run_smart_agent(task_description: str, force_agent: Optional[str] = None):
+    from argus.agents.prewarm import PREWARM_LLM, targets_from_env
     from argus.agents.smart_router import get_router
 
     print(f"\n{'=' * 60}")
@@ -18,6 +43,11 @@ def run_smart_agent(task_description: str, force_agent: Optional[str] = None):
     print(f"{'=' * 60}\n")
 
     router = get_router()
+    # 路由分析期间在后台构建Agent；强制指定Agent时不预热另一个
+    targets = targets_from_env()
+    if force_agent:
+        targets = [target for target in targets if target in (force_agent, PREWARM_LLM)]
+    router.prewarm(targets)
     message_from_client = queue.Queue()
     message_to_client = queue.Queue()
 
@@ -27,27 +57,13 @@ def run_smart_agent(task_description: str, force_agent: Optional[str] = None):
         while not stop_flag.is_set():
             try:
                 msg = message_to_client.get(timeout=0.5)
-                msg_type = msg.get("type", "")
                 content = msg.get("content", "")
-
-                if msg_type == "status":
-                    if content == "[START]":
-                        print("[状态] Agent已启动")
-                    elif content == "[STOP]":
-                        print("\n[状态] Agent已停止")
-                        stop_flag.set()
-                        break
-                elif msg_type == "ai_content":
-                    if content not in ["[BEGIN]", "[END]"]:
-                        print(content, end="", flush=True)
-                elif msg_type == "text":
-                    print(f"\n{content}")
-                elif msg_type == "tool_result":
-                    tool_info = content
-                    print(f"\n[工具] {tool_info.get('function')}: {'成功' if tool_info.get('success') else '失败'}")
-                elif msg_type == "request" and "need_permission" in content:
+                if msg.get("type") == "request" and "need_permission" in content:
                     print("\n[请求] 自动批准代码执行")
                     message_from_client.put({"type": "request", "content": "approve"})
+                elif _print_message(msg):
+                    stop_flag.set()
+                    break
             except queue.Empty:
                 continue
             except Exception as exc:
@@ -75,11 +91,102 @@ def run_smart_agent(task_description: str, force_agent: Optional[str] = None):
     listener.join(timeout=2)
 
 
+async def run_smart_agent_async(task_description: str, force_agent: Optional[str] = None):
+    """以asyncio会话执行任务：模型调用不占用线程，Ctrl+C立即取消进行中的请求和代码执行"""
+    from argus.agents.prewarm import PREWARM_LLM, targets_from_env
+    from argus.agents.smart_router import get_router
+    from argus.llm import get_llm_client
+    from argus.sessions import SessionManager
+
+    print(f"\n{'=' * 60}")
+    print("🤖 智能任务路由器（asyncio）")
+    print(f"任务: {task_description}")
+    print(f"模式: {'强制 ' + force_agent.upper() + 'Agent' if force_agent else '自动判断 + 失败切换'}")
+    print(f"{'=' * 60}\n")
+
+    router = get_router()
+    # 会话使用独立的CodeAgent，这里只预热LLM调用路径；候选Agent在路由时与LLM调用重叠构建
+    router.prewarm([target for target in targets_from_env() if target == PREWARM_LLM])
+    manager = SessionManager.from_env(router)
+    session = manager.start(task_description, force_agent)
+    try:
+        async for msg in session.events:
+            _print_message(msg)
+        result = await session.wait()
+        print(f"\n\n✓ 任务结果: {result}")
+    except asyncio.CancelledError:
+        print("\n用户中断")
+    finally:
+        await manager.shutdown()
+        await get_llm_client().aclose()
+
+
+def run_batch(
+    source: str,
+    output_path: str,
+    workers: int = 2,
+    resume: bool = False,
+    force_agent: Optional[str] = None,
+    fallback: bool = True,
+) -> dict:
+    from argus.agents.prewarm import PREWARM_LLM, targets_from_env
+    from argus.agents.smart_router import get_router
+    from argus.batch import BatchRunner, completed_ids, load_tasks
+
+    if source == "-":
+        tasks = load_tasks(sys.stdin)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            tasks = load_tasks(f)
+    if force_agent:
+        for task in tasks:
+            task.agent = task.agent or force_agent
+
+    skip_ids = completed_ids(output_path) if resume else set()
+    remaining = sum(1 for task in tasks if task.id not in skip_ids)
+    print(f"\n{'=' * 60}")
+    print(f"📦 批量执行: {len(tasks)} 个任务，待执行 {remaining} 个")
+    print(f"并发: {workers} 个CodeAgent + 1 个GUI桌面队列 → {output_path}")
+    print(f"{'=' * 60}\n")
+
+    router = get_router()
+    # 工作池中的CodeAgent由各worker在路由的同时构建，这里只预热LLM调用路径
+    router.prewarm([target for target in targets_from_env() if target == PREWARM_LLM])
+    finished = []
+
+    def on_result(record: dict):
+        finished.append(record)
+        mark = "✓" if record["status"] == "success" else "✗"
+        print(f"[{len(finished)}/{remaining}] {mark} {record['id']} ({record['agent']}, {record['elapsed']:.1f}s)")
+
+    runner = BatchRunner(router, workers=workers, fallback=fallback, on_result=on_result)
+    mode = "a" if resume else "w"
+    with open(output_path, mode, encoding="utf-8") as output:
+        try:
+            summary = runner.run(tasks, output, skip_ids)
+        except KeyboardInterrupt:
+            print("\n用户中断，已完成的结果已写入，可使用 --resume 继续")
+            summary = runner.summary
+    print(
+        f"\n总计 {summary['total']}，跳过 {summary['skipped']}，"
+        f"成功 {summary['success']}，失败 {summary['failed']}"
+    )
+    return summary
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Argus - 智能任务路由器")
     parser.add_argument("--task", type=str, required=False, help="任务描述")
     parser.add_argument("--force", type=str, choices=["gui", "code"], help="强制使用特定Agent")
     parser.add_argument("--doctor", action="store_true", help="运行环境自检")
+    parser.add_argument("--batch", type=str, help="批量执行JSONL任务文件（- 表示从stdin读取）")
+    parser.add_argument("--output", type=str, default="batch_results.jsonl", help="批量结果输出文件（JSONL）")
+    parser.add_argument("--workers", type=int, default=2, help="并发执行代码任务的CodeAgent数量")
+    parser.add_argument("--resume", action="store_true", help="跳过输出文件中已有结果的任务")
+    parser.add_argument("--no-fallback", action="store_true", help="批量任务失败后不切换到另一个Agent")
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true", help="以asyncio会话执行任务（不适用于--batch）"
+    )
     return parser
 
 
@@ -102,8 +209,8 @@ def run_cli(argv: list[str] | None = None):
         print_doctor_result(result)
         raise SystemExit(1 if result["failed"] > 0 else 0)
 
-    if not args.task:
-        parser.error("--task is required unless --doctor is used")
+    if not args.task and not args.batch:
+        parser.error("--task or --batch is required unless --doctor is used")
 
     from argus.bootstrap import setup_environment
 
@@ -114,6 +221,17 @@ def run_cli(argv: list[str] | None = None):
         print(f"❌ 错误: 命令行模式检测到配置缺失: {', '.join(missing_env)}")
         raise SystemExit(1)
 
+    if args.batch:
+        summary = run_batch(args.batch, args.output, args.workers, args.resume, args.force, not args.no_fallback)
+        raise SystemExit(1 if summary["failed"] > 0 else 0)
+
+    if args.use_async:
+        try:
+            asyncio.run(run_smart_agent_async(args.task, args.force))
+        except KeyboardInterrupt:
+            pass
+        return
+
     run_smart_agent(args.task, args.force)
 
 
@@ -138,8 +256,6 @@ def run_gui():
 
 def main(argv: list[str] | None = None):
     if argv is None:
-        import sys
-
         argv = sys.argv[1:]
 
     if argv:
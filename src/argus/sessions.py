@@ -0,0 +1,271 @@
+"""
+asyncio会话运行时
+一个事件循环承载多个会话：每个会话是一个asyncio任务，Agent的模型调用、限流排队和等待工具结果都不占用线程，
+并发会话数不再受线程数限制；只有代码执行、截屏和鼠标键盘动作这类阻塞操作在线程池中进行。
+代码任务从CodeAgent池中取一个独立的实例并发执行，GUI任务共用一个GUIAgent，按到达顺序独占桌面。
+会话的事件（与Agent发给客户端的消息格式相同）通过EventStream以 async for 读取；
+取消会话会立即关闭进行中的模型请求并中断正在执行的代码。
+
+与execute_with_fallback相同，自动路由的会话失败后切换到另一个Agent重试一次；会话没有交互通道，不请求人类介入。
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from argus.agents.agent_types import AGENT_CODE, AGENT_GUI, isolated_code_agent, other_agent
+
+SESSION_PENDING = "pending"
+SESSION_RUNNING = "running"
+SESSION_SUCCESS = "success"
+SESSION_FAILED = "failed"
+SESSION_CANCELLED = "cancelled"
+
+_CLOSED = object()
+
+
+class EventStream:
+    """
+    一个会话的事件流
+
+    put()是线程安全的，Agent在线程池中执行的部分（截屏、工具）也可以直接发送事件；
+    消费方用 async for 读取，close()之后读完剩余事件即结束
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+        self.failed = False
+
+    def put(self, event: Any):
+        if self._closed:
+            return
+        if isinstance(event, dict) and event.get("type") == "status" and event.get("content") == "[ERROR]":
+            # Agent在LLM调用失败时只发送[ERROR]状态，返回值仍是正常结束
+            self.failed = True
+        self._put(event)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._put(_CLOSED)
+
+    def _put(self, item: Any):
+        # 事件循环内外都经回调入队，线程中发送的事件与循环中发送的事件保持先后顺序
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSED:
+                return
+            yield item
+
+
+class Session:
+    """一个会话：一次任务的执行过程和结果"""
+
+    def __init__(self, session_id: str, task: str, force_agent: Optional[str] = None):
+        self.id = session_id
+        self.task = task
+        self.force_agent = force_agent
+        self.events = EventStream()
+        self.status = SESSION_PENDING
+        self.result: Optional[str] = None
+        self.attempts: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    def cancel(self):
+        """取消会话，进行中的模型请求立即关闭，正在执行的代码被中断"""
+        if self._task is not None:
+            self._task.cancel()
+
+    async def wait(self) -> Optional[str]:
+        """等待会话结束，返回结果（取消时为None）"""
+        if self._task is not None:
+            await asyncio.wait({self._task})
+        return self.result
+
+
+class SessionManager:
+    """
+    在一个事件循环中并发执行多个会话
+
+    Args:
+        router: SmartRouter，用于路由、判断结果成功与否并反馈路由结果
+        max_sessions: 同时执行的会话数，超出的会话排队
+        code_agent_factory: 创建CodeAgent池中实例的函数（同步函数，在线程中调用）
+    """
+
+    def __init__(
+        self,
+        router,
+        max_sessions: int = 8,
+        code_agent_factory: Optional[Callable[[], Any]] = None
+    ):
+        self.router = router
+        self.max_sessions = max(1, max_sessions)
+        self.code_agent_factory = code_agent_factory or isolated_code_agent
+        self.sessions: Dict[str, Session] = {}
+        self._ids = itertools.count(1)
+        self._slots = asyncio.Semaphore(self.max_sessions)
+        # 空闲的CodeAgent，会话结束后放回复用
+        self._code_agents: List[Any] = []
+        # 路由期间在后台构建的CodeAgent，供下一个代码会话使用
+        self._code_warmup: Optional[asyncio.Future] = None
+        # 只有一个桌面，GUI任务依次执行
+        self._desktop = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, router) -> "SessionManager":
+        """
+        ARGUS_MAX_SESSIONS: 同时执行的会话数
+        """
+        return cls(router, max_sessions=int(os.getenv("ARGUS_MAX_SESSIONS", "8")))
+
+    def start(self, task: str, force_agent: Optional[str] = None) -> Session:
+        """创建会话并立即开始执行（需在事件循环中调用）"""
+        session = Session(f"s{next(self._ids)}", task, force_agent)
+        self.sessions[session.id] = session
+        session._task = asyncio.ensure_future(self._run(session))
+        return session
+
+    def cancel(self, session_id: str):
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.cancel()
+
+    async def shutdown(self):
+        """取消所有未结束的会话并等待其退出"""
+        pending = [session for session in self.sessions.values() if not session.done]
+        for session in pending:
+            session.cancel()
+        for session in pending:
+            await session.wait()
+
+    async def _run(self, session: Session):
+        try:
+            async with self._slots:
+                session.status = SESSION_RUNNING
+                await self._execute(session)
+        except asyncio.CancelledError:
+            session.status = SESSION_CANCELLED
+            logging.info(f"[Session] 会话 {session.id} 已取消")
+        except Exception as e:
+            logging.error(f"[Session] 会话 {session.id} 出错: {e}", exc_info=True)
+            session.status = SESSION_FAILED
+            session.result = f"任务失败: {e}"
+        finally:
+            session.events.close()
+
+    async def _execute(self, session: Session):
+        if session.force_agent:
+            route = (session.force_agent, 1.0)
+        else:
+            route = await self._route(session)
+        agents = [route[0]]
+        if not session.force_agent:
+            agents.append(other_agent(route[0]))
+
+        for number, agent_type in enumerate(agents, 1):
+            if number > 1:
+                logging.info(f"[Session] 会话 {session.id} 切换到 {agent_type.upper()}Agent")
+                session.events.put({
+                    "name": "SmartRouter",
+                    "type": "text",
+                    "content": f"[路由] {agents[0].upper()}Agent失败，切换到 {agent_type.upper()}Agent"
+                })
+            else:
+                session.events.put({
+                    "name": "SmartRouter",
+                    "type": "text",
+                    "content": f"[路由] 使用 {agent_type.upper()}Agent (置信度: {route[1]:.2f})"
+                })
+            success = await self._attempt(session, agent_type, route)
+            if success:
+                session.status = SESSION_SUCCESS
+                return
+        session.status = SESSION_FAILED
+
+    async def _route(self, session: Session) -> Tuple[str, float]:
+        # 需要调用LLM路由时，路由期间在后台构建候选Agent：共享的GUIAgent由路由器预热，
+        # 没有空闲的CodeAgent时构建一个；未被选中的留给失败切换和后续会话使用
+        try:
+            decision, _ = self.router.warm_candidates(session.task, (AGENT_GUI,))
+            if decision is None:
+                self._warm_code_agent()
+                decision = await self.router.allm_route(session.task)
+            agent_type, confidence = decision
+        except Exception as e:
+            logging.error(f"[Session] 会话 {session.id} 路由失败，使用CodeAgent: {e}")
+            return AGENT_CODE, 0.0
+        logging.info(f"[Session] 会话 {session.id} 路由到 {agent_type.upper()}Agent (置信度: {confidence:.2f})")
+        return agent_type, confidence
+
+    async def _attempt(self, session: Session, agent_type: str, route: Tuple[str, float]) -> bool:
+        """在指定Agent上执行一次任务，返回是否成功"""
+        session.events.failed = False
+        started = time.time()
+        error = None
+        result = None
+        try:
+            if agent_type == AGENT_CODE:
+                result = await self._run_code(session, route)
+            else:
+                result = await self._run_gui(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            logging.error(f"[Session] 会话 {session.id} 在{agent_type.upper()}Agent上执行出错: {e}")
+        elapsed = time.time() - started
+        success = error is None and not session.events.failed and self.router.is_success(result)
+        session.result = result if error is None else f"任务失败: {error}"
+        session.attempts.append({
+            "agent": agent_type, "success": success, "result": result, "error": error, "elapsed": round(elapsed, 3)
+        })
+        self.router.record_outcome(session.task, agent_type, success, elapsed)
+        return success
+
+    def _warm_code_agent(self):
+        if not self._code_agents and self._code_warmup is None:
+            self._code_warmup = asyncio.ensure_future(asyncio.to_thread(self.code_agent_factory))
+
+    async def _acquire_code_agent(self) -> Any:
+        """取一个空闲的CodeAgent，优先使用后台已在构建的，都没有时新建"""
+        if self._code_agents:
+            return self._code_agents.pop()
+        warmup, self._code_warmup = self._code_warmup, None
+        if warmup is not None:
+            try:
+                return await asyncio.shield(warmup)
+            except asyncio.CancelledError:
+                # 会话被取消时构建继续，留给下一个代码会话
+                self._code_warmup = self._code_warmup or warmup
+                raise
+            except Exception as e:
+                logging.warning(f"[Session] 后台构建CodeAgent失败，重新构建: {e}")
+        return await asyncio.to_thread(self.code_agent_factory)
+
+    async def _run_code(self, session: Session, route: Tuple[str, float]) -> str:
+        agent = await self._acquire_code_agent()
+        try:
+            # 会话互相独立，不共享对话上下文
+            agent.memory.clear_short_term()
+            return await agent.atask(session.task, session.events, route=route)
+        finally:
+            self._code_agents.append(agent)
+
+    async def _run_gui(self, session: Session) -> str:
+        async with self._desktop:
+            agent = await asyncio.to_thread(self.router.get_gui_agent)
+            return await agent.atask(session.task, session.events)
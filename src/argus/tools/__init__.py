@@ -3,10 +3,21 @@
 自动注册所有工具到全局注册中心
 """
 
-from .tools_registry import get_global_registry
+import threading
+
+from .base_tool import (
+    TOOL_GROUP_CODE,
+    TOOL_GROUP_KEYBOARD,
+    TOOL_GROUP_MOUSE,
+    TOOL_GROUP_SCREEN,
+    TOOL_GROUP_WINDOW,
+)
+from .tools_registry import ToolsRegistry, get_global_registry
 
 _initialized = False
 _code_executor = None
+# GUIAgent和CodeAgent可能在后台预热线程上同时初始化
+_init_lock = threading.Lock()
 
 
 def initialize_all_tools():
@@ -20,9 +31,30 @@ def initialize_all_tools():
     global _initialized, _code_executor
 
     registry = get_global_registry()
-    if _initialized and _code_executor is not None:
-        return registry, _code_executor
+    with _init_lock:
+        if _initialized and _code_executor is not None:
+            return registry, _code_executor
+        _code_executor = _register_all_tools(registry)
+        _initialized = True
+    return registry, _code_executor
+
+
+def create_tools_registry():
+    """
+    创建独立的工具注册中心和代码执行器（不影响全局注册中心）
+
+    并发执行多个任务时每个Agent使用各自的执行环境，变量和会话状态互不干扰。
 
+    Returns:
+        ToolsRegistry: 新的工具注册中心
+        Code: 新的代码执行器实例
+    """
+    registry = ToolsRegistry()
+    return registry, _register_all_tools(registry)
+
+
+def _register_all_tools(registry):
+    """注册所有工具，返回代码执行器"""
     from .code.code import create_code_tools
     from .keyboard.keyboard import create_keyboard_tools
     from .mouse.mouse import create_mouse_tools
@@ -31,28 +63,26 @@ def initialize_all_tools():
 
     # 注册鼠标工具
     mouse_tools = create_mouse_tools()
-    registry.register_multiple(mouse_tools)
+    registry.register_multiple(mouse_tools, TOOL_GROUP_MOUSE)
 
     # 注册键盘工具
     keyboard_tools = create_keyboard_tools()
-    registry.register_multiple(keyboard_tools)
+    registry.register_multiple(keyboard_tools, TOOL_GROUP_KEYBOARD)
 
     # 注册屏幕工具
     screen_tools = create_screen_tools()
-    registry.register_multiple(screen_tools)
+    registry.register_multiple(screen_tools, TOOL_GROUP_SCREEN)
 
     # 注册窗口工具
     window_tools = create_window_tools()
-    registry.register_multiple(window_tools)
+    registry.register_multiple(window_tools, TOOL_GROUP_WINDOW)
 
     # 注册代码执行工具
     code_tools, code_executor = create_code_tools()
-    registry.register_multiple(code_tools)
+    registry.register_multiple(code_tools, TOOL_GROUP_CODE)
 
-    _code_executor = code_executor
-    _initialized = True
-    return registry, _code_executor
+    return code_executor
 
 
 # 导出注册中心获取函数
-__all__ = ['get_global_registry', 'initialize_all_tools']
+__all__ = ['create_tools_registry', 'get_global_registry', 'initialize_all_tools']
@@ -6,7 +6,24 @@
 import inspect
 import json
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 工具并发类别，决定同一轮中的多个工具调用能否并行执行
+CONCURRENCY_READ_ONLY = "read_only"  # 只读查询，可与其他只读调用并行，但需等待之前的桌面操作
+CONCURRENCY_DESKTOP = "desktop"  # 独占桌面（鼠标、键盘、窗口操作），按顺序串行
+CONCURRENCY_EXECUTOR = "executor"  # 按执行器资源串行，不同执行器之间可以并行
+
+# 缓存失效标签：执行后会改变桌面状态的工具触发，依赖桌面状态的缓存结果随之失效
+CACHE_TAG_DESKTOP = "desktop"
+
+# 工具分组，CodeAgent按任务只下发相关分组的schema
+TOOL_GROUP_GENERAL = "general"
+TOOL_GROUP_CODE = "code"
+TOOL_GROUP_MOUSE = "mouse"
+TOOL_GROUP_KEYBOARD = "keyboard"
+TOOL_GROUP_SCREEN = "screen"
+TOOL_GROUP_WINDOW = "window"
+TOOL_GROUP_META = "meta"  # 工具管理类工具（如按需申请更多工具），始终下发
 
 
 class BaseTool(ABC):
@@ -14,6 +31,17 @@ class BaseTool(ABC):
     所有工具的基类，定义工具接口和自动schema生成能力
     """
     
+    # 默认按独占桌面处理，保证未声明的工具不会被错误地并行
+    concurrency: str = CONCURRENCY_DESKTOP
+    # 结果缓存秒数，None表示不缓存（仅适用于幂等的只读工具）
+    cache_ttl: Optional[float] = None
+    # 缓存结果在这些标签被触发时失效
+    invalidated_by: Tuple[str, ...] = ()
+    # 执行后触发的失效标签
+    invalidates: Tuple[str, ...] = (CACHE_TAG_DESKTOP,)
+    # 所属分组，未指定时由注册中心在注册时设置
+    group: str = TOOL_GROUP_GENERAL
+    
     def __init__(self):
         self.name = self.get_name()
         self.description = self.get_description()
@@ -75,6 +103,23 @@ class BaseTool(ABC):
             }
         }
     
+    def get_resource_key(self, params: Dict[str, Any]) -> str:
+        """
+        返回执行器资源标识，相同标识的executor类调用会被串行化
+        
+        Args:
+            params: 工具参数
+        """
+        return self.name
+    
+    def get_cache_version(self) -> Any:
+        """
+        返回缓存版本（例如画面哈希），版本变化时旧的缓存结果不再命中
+        
+        默认不区分版本，只依靠TTL和失效标签
+        """
+        return None
+    
     def validate_parameters(self, params: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """
         验证参数是否符合schema
@@ -111,12 +156,30 @@ class FunctionTool(BaseTool):
         name: str,
         description: str,
         parameters_schema: Dict[str, Any],
-        execute_func: Callable
+        execute_func: Callable,
+        concurrency: str = CONCURRENCY_DESKTOP,
+        resource_key: Optional[Callable[..., str]] = None,
+        cache_ttl: Optional[float] = None,
+        invalidated_by: Tuple[str, ...] = (),
+        invalidates: Optional[Tuple[str, ...]] = None,
+        cache_version: Optional[Callable[[], Any]] = None,
+        group: Optional[str] = None
     ):
         self._name = name
         self._description = description
         self._parameters_schema = parameters_schema
         self._execute_func = execute_func
+        self._resource_key = resource_key
+        self._cache_version = cache_version
+        self.concurrency = concurrency
+        self.cache_ttl = cache_ttl
+        self.invalidated_by = tuple(invalidated_by)
+        # 未指定时只读工具不触发失效，其余工具视为会改变桌面状态
+        if invalidates is None:
+            invalidates = () if concurrency == CONCURRENCY_READ_ONLY else (CACHE_TAG_DESKTOP,)
+        self.invalidates = tuple(invalidates)
+        if group:
+            self.group = group
         super().__init__()
     
     def get_name(self) -> str:
@@ -128,6 +191,17 @@ class FunctionTool(BaseTool):
     def get_parameters_schema(self) -> Dict[str, Any]:
         return self._parameters_schema
     
+    def get_cache_version(self) -> Any:
+        return self._cache_version() if self._cache_version else None
+    
+    def get_resource_key(self, params: Dict[str, Any]) -> str:
+        if self._resource_key is None:
+            return self.name
+        try:
+            return self._resource_key(**params)
+        except Exception:
+            return self.name
+    
     def execute(self, **kwargs) -> Dict[str, Any]:
         try:
             result = self._execute_func(**kwargs)
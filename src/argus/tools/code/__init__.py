@@ -1,4 +1,6 @@
 # 代码执行工具模块
 from .code import Code, create_code_tools
+from .execution import Execution
+from .kernel_pool import KernelPool, get_kernel_pool
 
-__all__ = ['Code', 'create_code_tools']
\ No newline at end of file
+__all__ = ['Code', 'create_code_tools', 'Execution', 'KernelPool', 'get_kernel_pool']
\ No newline at end of file
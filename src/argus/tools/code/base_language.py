@@ -1,4 +1,10 @@
+import logging
+import threading
 import time
+from typing import Optional
+
+from .execution import Execution
+from .limits import LIMIT_OUTPUT, LIMIT_WALL_TIME, ExecutionLimits, limit_violation
 
 
 class BaseLanguage:
@@ -7,8 +13,67 @@ class BaseLanguage:
         self.start_time = None
         self.elapsed_time = 0
         self.should_stop = False
+        self.limits = ExecutionLimits()
+    
+    def run(self, code: str, limits: Optional[ExecutionLimits] = None) -> Execution:
+        """在后台线程执行代码，立即返回执行句柄"""
+        execution = Execution()
+        self.is_running = True
+        execution_thread = threading.Thread(
+            target=self._run_execution, args=(code, execution, limits or self.limits)
+        )
+        execution_thread.daemon = True
+        execution_thread.start()
+        return execution
+    
+    def _run_execution(self, code: str, execution: Execution, limits: ExecutionLimits):
+        self.start_time = time.time()
+        self.should_stop = False
+        exit_code = None
+        timers = []
+        if limits.wall_time:
+            timers.append(threading.Timer(
+                limits.wall_time, self._enforce_limit, args=(execution, limits, LIMIT_WALL_TIME, timers)
+            ))
+        if limits.output_bytes:
+            execution.set_output_limit(
+                limits.output_bytes,
+                lambda: self._enforce_limit(execution, limits, LIMIT_OUTPUT, timers)
+            )
+        for timer in timers:
+            timer.daemon = True
+            timer.start()
+        try:
+            exit_code = self._execute(code, execution, limits)
+        except Exception as e:
+            execution.put({"type": "error", "content": f"[{type(self).__name__}]Error: {e}"})
+        finally:
+            for timer in list(timers):
+                timer.cancel()
+            self.is_running = False
+            self.elapsed_time = time.time() - self.start_time
+            self.start_time = None
+            execution.finish(exit_code)
+    
+    def _enforce_limit(self, execution: Execution, limits: ExecutionLimits, limit: str, timers: list):
+        """超限时先中断执行，宽限期后仍未结束则强制结束"""
+        if execution.done.done() or execution.violation is not None:
+            return
+        execution.violation = limit_violation(limit, limits)
+        logging.warning("[%s]%s", type(self).__name__, execution.violation["message"])
+        self.interrupt()
+        kill_timer = threading.Timer(limits.grace_period, self._kill_if_running, args=(execution,))
+        kill_timer.daemon = True
+        timers.append(kill_timer)
+        kill_timer.start()
     
-    def run(self, code: str):
+    def _kill_if_running(self, execution: Execution):
+        if not execution.done.done():
+            logging.warning("[%s]中断后仍未结束，强制结束执行", type(self).__name__)
+            self.kill()
+    
+    def _execute(self, code: str, execution: Execution, limits: ExecutionLimits) -> Optional[int]:
+        """执行代码，输出写入execution，返回退出码"""
         raise NotImplementedError("[BaseLanguage]Subclasses must implement this method")
     
     def get_elapsed_time(self):
@@ -17,4 +82,16 @@ class BaseLanguage:
         return self.elapsed_time
     
     def interrupt(self):
-        self.should_stop = True
\ No newline at end of file
+        self.should_stop = True
+
+    def kill(self):
+        """强制结束当前执行（中断无效时使用），默认等同于中断"""
+        self.interrupt()
+
+    def reset(self):
+        """清空会话状态（任务之间调用），无状态的语言无需实现"""
+        pass
+
+    def stop(self):
+        """释放常驻资源，无常驻资源的语言无需实现"""
+        pass
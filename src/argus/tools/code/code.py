@@ -3,17 +3,40 @@
 包装原有的代码执行功能为工具
 """
 
+import atexit
+import logging
+import os
 import queue
+from typing import Optional
 
-from ..base_tool import FunctionTool
-from .languages import BashLanguage, PowerShellLanguage, PythonLanguage
+from ..base_tool import CONCURRENCY_EXECUTOR, CONCURRENCY_READ_ONLY, FunctionTool
+from .execution import Execution
+from .kernel_pool import get_kernel_pool
+from .languages import BashLanguage, ForkPythonLanguage, PowerShellLanguage, PythonLanguage
+from .limits import ExecutionLimits
+from .output_buffer import DEFAULT_HEAD_BYTES, OutputBuffer, OutputStore
+
+PYTHON_ENGINE_JUPYTER = "jupyter"
+PYTHON_ENGINE_FORK = "fork"
 
 
 class Code:
     """代码执行器"""
     
-    def __init__(self):
-        self.python = PythonLanguage()
+    def __init__(self, limits: Optional[ExecutionLimits] = None):
+        # 每次执行的资源限制，可在run时覆盖
+        self.limits = limits or ExecutionLimits.from_env()
+        # 后台预热内核，首次执行Python时无需等待内核启动
+        self.kernel_pool = get_kernel_pool()
+        if self.kernel_pool is not None:
+            self.kernel_pool.start()
+        # Python执行引擎：jupyter（功能完整）或fork（启动和通信开销小），可按任务切换
+        self.python_engines = {
+            PYTHON_ENGINE_JUPYTER: PythonLanguage(pool=self.kernel_pool),
+            PYTHON_ENGINE_FORK: ForkPythonLanguage(),
+        }
+        self.default_python_engine = os.getenv("ARGUS_PYTHON_ENGINE", PYTHON_ENGINE_JUPYTER)
+        self.python = self._resolve_python_engine(self.default_python_engine)
         self.bash = BashLanguage()
         self.powershell = PowerShellLanguage()
         self.current_language = None
@@ -24,6 +47,8 @@ class Code:
             "bash": self.bash,
             "sh": self.bash,
         }
+        for lang_obj in set(self.language_map.values()) | set(self.python_engines.values()):
+            lang_obj.limits = self.limits
         self.language_list = []
         for lang, lang_obj in self.language_map.items():
             if hasattr(lang_obj, 'is_available'):
@@ -32,16 +57,60 @@ class Code:
             else:
                 self.language_list.append(lang)
 
-    def run(self, lang: str, code: str):
-        """运行代码"""
+    def prewarm(self):
+        """启动默认Python引擎并完成预加载（后台预热时调用）"""
+        if getattr(self.python, "pool", None) is not None:
+            # 内核池已在后台预热，任务开始时reset会把提前领取的内核交回池中，这里不领取
+            return
+        try:
+            self.python.start()
+        except Exception as e:
+            logging.warning("[Code]预热Python引擎失败: %s", e)
+
+    def run(self, lang: str, code: str, limits: Optional[ExecutionLimits] = None) -> Execution:
+        """运行代码，返回执行句柄"""
         lang = lang.lower()
         if lang in self.language_list:
             self.current_language = self.language_map[lang]
-            return self.current_language.run(code)
+            return self.current_language.run(code, limits or self.limits)
         else:
-            message = queue.Queue()
-            message.put({"type": "error", "content": f"[Code]不支持的语言:{lang}"})
-            return message
+            execution = Execution()
+            execution.put({"type": "error", "content": f"[Code]不支持的语言:{lang}"})
+            execution.finish()
+            return execution
+
+    def _resolve_python_engine(self, engine: str):
+        language_obj = self.python_engines.get(engine)
+        if language_obj is None:
+            logging.warning("[Code]未知的Python引擎: %s，使用%s", engine, PYTHON_ENGINE_JUPYTER)
+        elif hasattr(language_obj, "is_available") and not language_obj.is_available():
+            logging.warning("[Code]Python引擎 %s 在当前平台不可用，使用%s", engine, PYTHON_ENGINE_JUPYTER)
+            language_obj = None
+        return language_obj or self.python_engines[PYTHON_ENGINE_JUPYTER]
+
+    def set_python_engine(self, engine: Optional[str] = None) -> str:
+        """
+        切换Python执行引擎（任务开始时调用）
+
+        Args:
+            engine: "jupyter" 或 "fork"，None表示使用默认引擎（ARGUS_PYTHON_ENGINE）
+
+        Returns:
+            实际使用的引擎名
+        """
+        self.python = self._resolve_python_engine(engine or self.default_python_engine)
+        self.language_map["python"] = self.python
+        return next(name for name, obj in self.python_engines.items() if obj is self.python)
+
+    def get_language(self, lang: str):
+        """获取语言对应的执行器，不支持时返回None"""
+        lang = lang.lower()
+        return self.language_map[lang] if lang in self.language_list else None
+
+    def get_resource_key(self, lang: str) -> str:
+        """同一执行器的调用需要串行，别名（如sh/bash）共享同一个标识"""
+        language_obj = self.get_language(lang)
+        return f"code:{type(language_obj).__name__ if language_obj else lang.lower()}"
 
     def interrupt(self):
         """中断执行中的代码"""
@@ -53,6 +122,26 @@ class Code:
             message.put({"type": "text", "content": "没有正在运行的代码"})
         return message
 
+    def reset(self):
+        """重置所有语言的会话状态，用于任务之间的隔离"""
+        for lang_obj in set(self.language_map.values()) | set(self.python_engines.values()):
+            try:
+                lang_obj.reset()
+            except Exception as e:
+                logging.error("[Code]重置 %s 失败: %s", type(lang_obj).__name__, e)
+
+    def shutdown(self):
+        """
+        关闭本执行器常驻的执行环境（内核、shell会话等）
+
+        内核池是所有执行器共享的，不在这里关闭，由kernel_pool在进程退出时关闭
+        """
+        for lang_obj in set(self.language_map.values()) | set(self.python_engines.values()):
+            try:
+                lang_obj.stop()
+            except Exception as e:
+                logging.error("[Code]关闭 %s 失败: %s", type(lang_obj).__name__, e)
+
     def get_elapsed_time(self):
         """获取代码已运行时间"""
         if self.current_language:
@@ -68,47 +157,57 @@ class Code:
 def create_code_tools():
     """创建所有代码执行工具并返回工具列表"""
     
-    # 创建全局Code实例
+    # 创建全局Code实例，进程退出时关闭常驻内核
     code_executor = Code()
+    atexit.register(code_executor.shutdown)
     
     tools = []
     
+    # 最近的输出缓冲区，供 read_code_output 分页读取
+    output_store = OutputStore()
+    
     # Code Execution Tool
-    def execute_code_func(language: str, code: str):
+    def execute_code_func(language: str, code: str, timeout: Optional[float] = None):
         """执行代码工具函数"""
+        output = OutputBuffer()
+        errors = []
         try:
-            result_queue = code_executor.run(language, code)
+            execution = code_executor.run(language, code, code_executor.limits.with_timeout(timeout))
             
-            # 收集所有输出
-            outputs = []
-            errors = []
+            # 输出写入有界缓冲区，超过上限的部分转存到临时文件；
+            # 迭代在消息到达时立即返回，执行结束时停止
+            for msg in execution:
+                msg_type = msg.get("type", "")
+                content = msg.get("content", "")
+                
+                if msg_type == "text":
+                    output.write(content)
+                elif msg_type == "error":
+                    errors.append(content)
             
-            while True:
-                try:
-                    msg = result_queue.get(timeout=0.1)
-                    msg_type = msg.get("type", "")
-                    content = msg.get("content", "")
-                    
-                    if msg_type == "text":
-                        outputs.append(content)
-                    elif msg_type == "error":
-                        errors.append(content)
-                    elif msg_type == "end":
-                        break
-                except queue.Empty:
-                    # 检查是否还在运行
-                    if not code_executor.is_running():
-                        break
-            
-            return {
+            result = {
                 "success": len(errors) == 0,
                 "language": language,
-                "outputs": outputs,
-                "errors": errors,
-                "output": "\n".join(outputs) if outputs else "",
-                "error": "\n".join(errors) if errors else ""
+                "output": output.excerpt(),
+                "output_bytes": output.total_bytes,
+                "exit_code": execution.exit_code,
             }
+            if output.truncated:
+                result["truncated"] = True
+                result["output_id"] = output.output_id
+                output_store.add(output)
+            else:
+                output.close()
+            if errors:
+                result["error"] = "\n".join(errors)
+            if execution.violation is not None:
+                # 超限以结构化错误返回，Agent可据此调整代码（缩小数据、分批处理、加大timeout等）
+                result["success"] = False
+                result["error"] = "\n".join(filter(None, [execution.violation["message"], result.get("error")]))
+                result["limit_exceeded"] = execution.violation
+            return result
         except Exception as e:
+            output.close()
             return {
                 "success": False,
                 "language": language,
@@ -130,11 +229,18 @@ def create_code_tools():
                 "code": {
                     "type": "string",
                     "description": "要执行的代码"
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": f"墙钟时间限制（秒），默认{code_executor.limits.wall_time or '不限制'}",
+                    "minimum": 1
                 }
             },
             "required": ["language", "code"]
         },
-        execute_func=execute_code_func
+        execute_func=execute_code_func,
+        concurrency=CONCURRENCY_EXECUTOR,
+        resource_key=lambda language, code=None, timeout=None: code_executor.get_resource_key(language)
     )
     tools.append(code_tool)
     
@@ -163,8 +269,51 @@ def create_code_tools():
             "properties": {},
             "required": []
         },
-        execute_func=interrupt_code_func
+        execute_func=interrupt_code_func,
+        concurrency=CONCURRENCY_READ_ONLY
     )
     tools.append(interrupt_tool)
     
+    # Output Paging Tool
+    def read_code_output_func(output_id: str, offset: int = 0, length: int = DEFAULT_HEAD_BYTES):
+        """分页读取被截断的代码输出"""
+        output = output_store.get(output_id)
+        if output is None:
+            return {
+                "success": False,
+                "error": f"输出不存在或已过期: {output_id}"
+            }
+        return {"success": True, "output_id": output_id, **output.read(offset, length)}
+    
+    read_output_tool = FunctionTool(
+        name="read_code_output",
+        description="分页读取execute_code被截断的完整输出（execute_code返回truncated时使用）",
+        parameters_schema={
+            "type": "object",
+            "properties": {
+                "output_id": {
+                    "type": "string",
+                    "description": "execute_code返回的output_id"
+                },
+                "offset": {
+                    "type": "integer",
+                    "description": "起始字节偏移，默认0",
+                    "default": 0,
+                    "minimum": 0
+                },
+                "length": {
+                    "type": "integer",
+                    "description": f"读取的字节数，默认{DEFAULT_HEAD_BYTES}",
+                    "default": DEFAULT_HEAD_BYTES,
+                    "minimum": 1
+                }
+            },
+            "required": ["output_id"]
+        },
+        execute_func=read_code_output_func,
+        concurrency=CONCURRENCY_READ_ONLY
+    )
+    tools.append(read_output_tool)
+    atexit.register(output_store.clear)
+    
     return tools, code_executor
\ No newline at end of file
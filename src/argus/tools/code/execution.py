@@ -0,0 +1,96 @@
+"""
+执行句柄
+Code.run 返回的对象：既是消息队列（兼容原有的 get/empty 用法），
+也提供完成 future、退出码，以及同步/异步的输出事件迭代，
+调用方在输出到达或执行结束时立即被唤醒，无需轮询。
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class Execution(queue.Queue):
+    """一次代码执行的句柄，执行结束时放入 {"type": "end"} 消息并完成 done"""
+
+    def __init__(self):
+        super().__init__()
+        self.done: Future = Future()
+        # 超出资源限制时记录的结构化信息，见 limits.limit_violation
+        self.violation: Optional[Dict[str, Any]] = None
+        self.output_bytes = 0
+        self._output_limit: Optional[int] = None
+        self._on_output_limit: Optional[Callable[[], None]] = None
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._waiters_lock = threading.Lock()
+
+    def set_output_limit(self, limit: Optional[int], callback: Callable[[], None]):
+        """文本输出超过limit字节时调用一次callback"""
+        self._output_limit = limit
+        self._on_output_limit = callback
+
+    def put(self, item, block=True, timeout=None):
+        if item.get("type") == "text" and self._output_limit is not None:
+            self.output_bytes += len(item.get("content", "").encode("utf-8", errors="replace"))
+            if self.output_bytes > self._output_limit and self._on_output_limit is not None:
+                callback, self._on_output_limit = self._on_output_limit, None
+                callback()
+        super().put(item, block, timeout)
+        with self._waiters_lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    def finish(self, exit_code: Optional[int] = None):
+        """标记执行结束（只生效一次）"""
+        if self.done.done():
+            return
+        self.done.set_result(exit_code)
+        self.put({"type": "end", "content": exit_code})
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        return self.done.result() if self.done.done() else None
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """阻塞直到执行结束，返回退出码"""
+        return self.done.result(timeout=timeout)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """逐条返回输出消息，执行结束后停止"""
+        while True:
+            msg = self.get()
+            if msg.get("type") == "end":
+                return
+            yield msg
+
+    async def __aiter__(self):
+        """异步逐条返回输出消息，执行结束后停止"""
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        waiter = (loop, wakeup)
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+        try:
+            while True:
+                try:
+                    msg = self.get_nowait()
+                except queue.Empty:
+                    wakeup.clear()
+                    try:
+                        msg = self.get_nowait()
+                    except queue.Empty:
+                        await wakeup.wait()
+                        continue
+                if msg.get("type") == "end":
+                    return
+                yield msg
+        finally:
+            with self._waiters_lock:
+                self._waiters.remove(waiter)
@@ -0,0 +1,246 @@
+"""
+Python forkserver进程（独立脚本，只依赖标准库）
+
+启动时导入常用库，然后在stdin上逐行读取JSON命令。每次执行fork一个写时复制的子进程：
+子进程的stdout/stderr重定向到管道并转发为stream消息，执行结束后子进程接替父进程成为新的server，
+因此变量在多次执行之间保留；子进程被杀死（超时强制结束、CPU超限、崩溃）时，
+父进程继续服务，命名空间回滚到执行前的状态。
+
+协议：stdin/stdout上每行一个JSON对象
+    命令: {"op": "exec", "code": ..., "limits": {"cpu": s, "memory": bytes, "processes": n}} / {"op": "reset"}
+    消息: ready / started / stream / image / done
+    processes是RLIMIT_NPROC的软限制（已按用户当前的进程数加上限额算好）
+"""
+
+import ast
+import base64
+import codecs
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_CTRL_IN = None
+_CTRL_OUT = None
+_SEND_LOCK = threading.Lock()
+_BASE_LIMITS = {}
+
+
+def send(message):
+    data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+    with _SEND_LOCK:
+        view = memoryview(data)
+        while view:
+            written = os.write(_CTRL_OUT, view)
+            view = view[written:]
+
+
+def _limit_names():
+    if resource is None:
+        return {}
+    return {"cpu": resource.RLIMIT_CPU, "memory": resource.RLIMIT_AS, "processes": resource.RLIMIT_NPROC}
+
+
+def _set_soft(which, value):
+    soft, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY and value != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(which, (value, hard))
+
+
+def apply_limits(limits):
+    """恢复server启动时的软限制，再按本次执行的限额设置（CPU和地址空间在当前用量基础上增加）"""
+    for name, which in _limit_names().items():
+        _set_soft(which, _BASE_LIMITS[name])
+        value = int(limits.get(name) or 0)
+        if not value:
+            continue
+        if name == "cpu":
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            value += int(usage.ru_utime + usage.ru_stime) + 1
+        elif name == "memory":
+            value += _vm_size()
+        _set_soft(which, value)
+
+
+def restore_limits():
+    for name, which in _limit_names().items():
+        _set_soft(which, _BASE_LIMITS[name])
+
+
+def _vm_size():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _pump(read_fd):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = os.read(read_fd, 65536)
+        text = decoder.decode(data, final=not data)
+        if text:
+            send({"type": "stream", "text": text})
+        if not data:
+            break
+    os.close(read_fd)
+
+
+def _capture_figures():
+    """执行后把matplotlib中打开的图像作为图片发送（Agg后端，plt.show()不会显示窗口）"""
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return
+    try:
+        for number in plt.get_fignums():
+            buffer = io.BytesIO()
+            plt.figure(number).savefig(buffer, format="png", bbox_inches="tight")
+            send({"type": "image", "format": "png", "content": base64.b64encode(buffer.getvalue()).decode("ascii")})
+        plt.close("all")
+    except Exception as e:
+        print(f"[fork_server]保存图像失败: {e}", file=sys.stderr)
+
+
+def run_code(code, namespace):
+    """执行代码，最后一个表达式的值像交互式解释器一样输出，返回(退出码, 异常名)"""
+    try:
+        tree = ast.parse(code, "<cell>", "exec")
+        last_expr = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last_expr = ast.Expression(tree.body.pop().value)
+        exec(compile(tree, "<cell>", "exec"), namespace)
+        if last_expr is not None:
+            value = eval(compile(last_expr, "<cell>", "eval"), namespace)
+            if value is not None:
+                print(repr(value))
+        return 0, None
+    except SystemExit as e:
+        return (e.code if isinstance(e.code, int) else (0 if e.code is None else 1)), None
+    except BaseException as e:
+        # 去掉server自身的调用帧，只保留用户代码的traceback
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename == __file__:
+            tb = tb.tb_next
+        sys.stderr.write("".join(traceback.format_exception(type(e), e, tb)))
+        return 1, type(e).__name__
+
+
+def execute_in_child(command, namespace, status_fd):
+    """子进程：执行代码，结束后接替父进程成为server"""
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    send({"type": "started", "pid": os.getpid()})
+
+    read_fd, write_fd = os.pipe()
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    os.close(write_fd)
+    pump = threading.Thread(target=_pump, args=(read_fd,), daemon=True)
+    pump.start()
+
+    exit_code, error = 1, None
+    try:
+        if resource is not None:
+            try:
+                apply_limits(command.get("limits") or {})
+            except (ValueError, OSError) as e:
+                print(f"[fork_server]设置资源限制失败: {e}", file=sys.stderr)
+        exit_code, error = run_code(command["code"], namespace)
+        _capture_figures()
+    finally:
+        if resource is not None:
+            restore_limits()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        os.close(devnull)
+        # 后台子进程仍持有管道时不无限等待
+        pump.join(timeout=1)
+
+    send({"type": "done", "exit_code": exit_code, "error": error, "pid": os.getpid()})
+    os.write(status_fd, b"P")
+    os.close(status_fd)
+
+
+def serve(namespace, baseline):
+    # 客户端总是等到done后才发送下一条命令，fork时读缓冲区中不会有未处理的数据
+    reader = os.fdopen(_CTRL_IN, "rb")
+    for line in iter(reader.readline, b""):
+        command = json.loads(line)
+        if command.get("op") == "reset":
+            namespace.clear()
+            namespace.update(baseline)
+            send({"type": "done", "exit_code": 0, "error": None, "pid": os.getpid()})
+            continue
+
+        status_r, status_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(status_r)
+            execute_in_child(command, namespace, status_w)
+            continue
+
+        os.close(status_w)
+        promoted = os.read(status_r, 1)
+        os.close(status_r)
+        if promoted == b"P":
+            # 子进程已接替为server，父进程退出
+            os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        send({
+            "type": "done",
+            "exit_code": -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status),
+            "signal": os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+            "rolled_back": True,
+            "error": None,
+            "pid": os.getpid(),
+        })
+    os._exit(0)
+
+
+def main():
+    global _CTRL_IN, _CTRL_OUT
+    # 控制通道使用私有fd，0/1/2留给用户代码
+    _CTRL_IN = os.dup(0)
+    _CTRL_OUT = os.dup(1)
+    devnull_in = os.open(os.devnull, os.O_RDONLY)
+    devnull_out = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_in, 0)
+    os.dup2(devnull_out, 1)
+    os.dup2(devnull_out, 2)
+    os.close(devnull_in)
+    os.close(devnull_out)
+    # server等待期间忽略SIGINT，中断只发给执行中的子进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for name, which in _limit_names().items():
+        _BASE_LIMITS[name] = resource.getrlimit(which)[0]
+
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    for module in json.loads(os.environ.get("ARGUS_FORK_PRELOAD", "[]")):
+        try:
+            exec(f"import {module}", namespace)
+        except Exception:
+            pass
+    baseline = dict(namespace)
+
+    send({"type": "ready", "pid": os.getpid()})
+    serve(namespace, baseline)
+
+
+if __name__ == "__main__":
+    main()
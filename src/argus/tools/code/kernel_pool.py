@@ -0,0 +1,220 @@
+"""
+Jupyter内核池
+预先启动K个内核并导入常用库，PythonLanguage从池中领取已预热的内核，
+用完后交回，由后台线程重启并重新预热，保证下一个会话拿到的是热内核。
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from jupyter_client.manager import KernelManager
+
+DEFAULT_PRELOAD = ["numpy as np", "pandas as pd", "matplotlib.pyplot as plt"]
+
+
+def preload_from_env() -> List[str]:
+    value = os.getenv("ARGUS_KERNEL_PRELOAD")
+    if value is None:
+        return list(DEFAULT_PRELOAD)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def build_preload_code(modules: List[str]) -> str:
+    """生成预热代码，缺失的模块静默跳过（没有matplotlib时%matplotlib也会失败，不能让它中断后续导入）"""
+    lines = ['try:\n    get_ipython().run_line_magic("matplotlib", "inline")\nexcept Exception:\n    pass']
+    for module in modules:
+        lines.append(f"try:\n    import {module}\nexcept ImportError:\n    pass")
+    return "\n".join(lines)
+
+
+class KernelPool:
+    """
+    线程安全的预热内核池
+
+    Args:
+        size: 保持的热内核数量
+        preload: 预热时导入的模块（支持 "numpy as np" 形式）
+        kernel_name: Jupyter内核名称
+    """
+
+    def __init__(self, size: int = 1, preload: Optional[List[str]] = None, kernel_name: str = "python3"):
+        self.size = max(0, size)
+        self.preload = list(DEFAULT_PRELOAD) if preload is None else list(preload)
+        self.kernel_name = kernel_name
+        self._idle: "queue.Queue[Tuple[KernelManager, object]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._started = False
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.size), thread_name_prefix="kernel-pool")
+        self.stats: Dict[str, float] = {
+            "acquired": 0,
+            "warm_hits": 0,
+            "cold_starts": 0,
+            "recycled": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def start(self):
+        """在后台把池子填满（重复调用无副作用）"""
+        with self._lock:
+            if self._started or self._closed:
+                return
+            self._started = True
+        self._fill()
+
+    def acquire(self, timeout: float = 30.0):
+        """
+        领取一个热内核
+
+        池中没有现成内核时等待后台预热，超时后直接冷启动一个。
+
+        Returns:
+            (KernelManager, KernelClient)
+        """
+        self.start()
+        begin = time.time()
+        try:
+            kernel = self._idle.get_nowait()
+            warm = True
+        except queue.Empty:
+            try:
+                kernel = self._idle.get(timeout=timeout) if self._pending else None
+            except queue.Empty:
+                kernel = None
+            warm = kernel is not None
+        if kernel is None:
+            kernel = self._spawn()
+        waited = time.time() - begin
+
+        with self._lock:
+            self.stats["acquired"] += 1
+            self.stats["warm_hits" if warm else "cold_starts"] += 1
+            self.stats["wait_seconds"] += waited
+        logging.info("[KernelPool]领取内核 (warm=%s, 等待%.2fs)", warm, waited)
+        self._fill()
+        return kernel
+
+    def release(self, km: KernelManager, kc):
+        """交回内核，后台重启并重新预热后放回池中"""
+        if self._closed:
+            self._shutdown(km, kc)
+            return
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._recycle, km, kc)
+
+    def shutdown(self):
+        """关闭池中所有内核"""
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        while True:
+            try:
+                km, kc = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._shutdown(km, kc)
+
+    def _fill(self):
+        with self._lock:
+            missing = self.size - self._idle.qsize() - self._pending
+            if self._closed or missing <= 0:
+                return
+            self._pending += missing
+        for _ in range(missing):
+            self._executor.submit(self._spawn_into_pool)
+
+    def _spawn(self):
+        km = KernelManager(kernel_name=self.kernel_name)
+        km.start_kernel()
+        kc = km.client()
+        kc.start_channels()
+        try:
+            kc.wait_for_ready(timeout=60)
+            self.warm(kc)
+        except Exception:
+            self._shutdown(km, kc)
+            raise
+        return km, kc
+
+    def warm(self, kc):
+        """在内核中执行预热代码（新启动或重启后的内核都需要重新导入）"""
+        if not self.preload:
+            return
+        msg_id = kc.execute(build_preload_code(self.preload), silent=True, store_history=False)
+        while True:
+            reply = kc.get_shell_msg(timeout=120)
+            if reply["parent_header"].get("msg_id") == msg_id:
+                break
+
+    def _spawn_into_pool(self):
+        try:
+            kernel = self._spawn()
+        except Exception as e:
+            logging.error("[KernelPool]预热内核失败: %s", e)
+            with self._lock:
+                self._pending -= 1
+            return
+        self._put_idle(kernel)
+
+    def _recycle(self, km: KernelManager, kc):
+        try:
+            km.restart_kernel(now=True)
+            kc.wait_for_ready(timeout=60)
+            self.warm(kc)
+        except Exception as e:
+            logging.warning("[KernelPool]回收内核失败，改为替换: %s", e)
+            self._shutdown(km, kc)
+            with self._lock:
+                self._pending -= 1
+            self._fill()
+            return
+        with self._lock:
+            self.stats["recycled"] += 1
+        self._put_idle((km, kc))
+
+    def _put_idle(self, kernel):
+        with self._lock:
+            self._pending -= 1
+            surplus = self._closed or self._idle.qsize() >= self.size
+        if surplus:
+            self._shutdown(*kernel)
+        else:
+            self._idle.put(kernel)
+
+    @staticmethod
+    def _shutdown(km: KernelManager, kc):
+        try:
+            kc.stop_channels()
+            km.shutdown_kernel(now=True)
+        except Exception as e:
+            logging.error("[KernelPool]关闭内核失败: %s", e)
+
+
+_pool: Optional[KernelPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_kernel_pool() -> Optional[KernelPool]:
+    """
+    获取全局内核池
+
+    池大小由 ARGUS_KERNEL_POOL_SIZE 控制（默认1，0表示禁用），
+    预加载模块由 ARGUS_KERNEL_PRELOAD 控制（逗号分隔）。
+    池由所有代码执行器共享，只在进程退出时关闭一次。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = int(os.getenv("ARGUS_KERNEL_POOL_SIZE", "1"))
+            if size <= 0:
+                return None
+            _pool = KernelPool(size=size, preload=preload_from_env())
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -6,7 +6,8 @@
 from .bash import BashLanguage
 from .powershell import PowerShellLanguage
 from .python import PythonLanguage
+from .python_fork import ForkPythonLanguage
 
-__all__ = ['PythonLanguage', 'BashLanguage', 'PowerShellLanguage']
+__all__ = ['PythonLanguage', 'ForkPythonLanguage', 'BashLanguage', 'PowerShellLanguage']
 
 __version__ = '1.0.0'
\ No newline at end of file
@@ -1,63 +1,51 @@
-import queue
 import shutil
-import subprocess
-import threading
-import time
 
 from ..base_language import BaseLanguage
+from ..execution import Execution
+from ..limits import LIMIT_CPU_TIME, SIGXCPU, ExecutionLimits, limit_violation
+from ..shell_session import BashSession
 
 
 class BashLanguage(BaseLanguage):
     def __init__(self):
         super().__init__()
-        self.process = None
+        self.session = None
 
     def is_available(self):
         return shutil.which("bash") is not None
 
-    def run(self, code: str):
-        message = queue.Queue()
-        execution_thread = threading.Thread(target=self._execute, args=(code, message))
-        execution_thread.daemon = True
-        execution_thread.start()
-        return message
-
-    def _execute(self, code: str, message: queue.Queue):
-        self.is_running = True
-        self.start_time = time.time()
-        self.should_stop = False
-        
-        try:
-            self.process = subprocess.Popen(
-                ["bash"],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            self.process.stdin.write(code)
-            self.process.stdin.close()
-            
-            for line in self.process.stdout:
-                message.put({"type": "text", "content": line})
-            
-            return_code = self.process.wait()
-            message.put({"type": "text", "content": f"Return code: {return_code}"})
-            
-        except Exception as e:
-            message.put({"type": "error", "content": f"[BashLanguage]Error: {e}"})
-        finally:
-            self.is_running = False
-            self.process = None
+    def _execute(self, code: str, execution: Execution, limits: ExecutionLimits):
+        if self.session is None:
+            self.session = BashSession()
+        last_chunk = ""
+
+        def on_output(chunk: str):
+            nonlocal last_chunk
+            last_chunk = chunk
+            execution.put({"type": "text", "content": chunk})
+
+        return_code = self.session.execute(code, on_output, limits)
+        separator = "" if not last_chunk or last_chunk.endswith("\n") else "\n"
+        execution.put({"type": "text", "content": f"{separator}Return code: {return_code}\n"})
+        # 受限的子shell被SIGXCPU终止时退出码为128+SIGXCPU；会话进程本身被终止时为-SIGXCPU
+        if limits.cpu_time and return_code in (128 + SIGXCPU, -SIGXCPU) and execution.violation is None:
+            execution.violation = limit_violation(LIMIT_CPU_TIME, limits)
+        return return_code
             
     def interrupt(self):
         self.should_stop = True
-        if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+        if self.session:
+            self.session.interrupt()
+
+    def kill(self):
+        self.should_stop = True
+        if self.session:
+            self.session.kill()
+
+    def reset(self):
+        """结束当前会话，下次执行时在干净的shell中开始"""
+        self.stop()
+
+    def stop(self):
+        if self.session:
+            self.session.close()
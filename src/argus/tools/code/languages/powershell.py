@@ -1,64 +1,49 @@
-import queue
 import shutil
-import subprocess
-import threading
-import time
 
 from ..base_language import BaseLanguage
+from ..execution import Execution
+from ..limits import ExecutionLimits
+from ..shell_session import PowerShellSession
 
 
 class PowerShellLanguage(BaseLanguage):
     def __init__(self):
         super().__init__()
-        self.process = None
+        self.session = None
 
     def is_available(self):
         return shutil.which("powershell") is not None or shutil.which("pwsh") is not None
 
-    def run(self, code: str):
-        message = queue.Queue()
-        execution_thread = threading.Thread(target=self._execute, args=(code, message))
-        execution_thread.daemon = True
-        execution_thread.start()
-        return message
+    def _execute(self, code: str, execution: Execution, limits: ExecutionLimits):
+        if self.session is None:
+            executable = "pwsh" if shutil.which("pwsh") else "powershell"
+            self.session = PowerShellSession(executable)
+        last_chunk = ""
 
-    def _execute(self, code: str, message: queue.Queue):
-        self.is_running = True
-        self.start_time = time.time()
-        self.should_stop = False
-        
-        executable = "pwsh" if shutil.which("pwsh") else "powershell"
-        
-        try:
-            # -Command - tells powershell to read command from stdin
-            self.process = subprocess.Popen(
-                [executable, "-NoProfile", "-Command", code],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            for line in self.process.stdout:
-                if self.should_stop:
-                    break
-                message.put({"type": "text", "content": line})
-            
-            return_code = self.process.wait()
-            message.put({"type": "text", "content": f"Return code: {return_code}"})
-            
-        except Exception as e:
-            message.put({"type": "error", "content": f"[PowerShellLanguage]Error: {e}"})
-        finally:
-            self.is_running = False
-            self.process = None
+        def on_output(chunk: str):
+            nonlocal last_chunk
+            last_chunk = chunk
+            execution.put({"type": "text", "content": chunk})
+
+        return_code = self.session.execute(code, on_output, limits)
+        separator = "" if not last_chunk or last_chunk.endswith("\n") else "\n"
+        execution.put({"type": "text", "content": f"{separator}Return code: {return_code}\n"})
+        return return_code
             
     def interrupt(self):
         super().interrupt()
-        if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+        if self.session:
+            self.session.interrupt()
+
+    def kill(self):
+        self.should_stop = True
+        if self.session:
+            self.session.kill()
+
+    def reset(self):
+        """结束当前会话，下次执行时在干净的PowerShell中开始"""
+        self.stop()
+
+    def stop(self):
+        if self.session:
+            self.session.close()
@@ -7,90 +7,282 @@ import time
 from jupyter_client.manager import KernelManager
 
 from ..base_language import BaseLanguage
+from ..execution import Execution
+from ..limits import (
+    LIMIT_CPU_TIME,
+    LIMIT_MEMORY,
+    SIGXCPU,
+    ExecutionLimits,
+    limit_violation,
+    process_quota,
+)
+
+# 在内核中设置rlimit：CPU和地址空间在当前用量基础上增加限额，因此是按单次执行计算的；
+# 进程数按用户计算，限额由process_quota()在该用户当前的进程数基础上算好后传入。
+# 第一次设置前把内核原始的软限制记录在sys模块上（%reset不会清除），每次执行后用_RESTORE_LIMITS_CODE恢复
+_LIMITS_TEMPLATE = """
+def __argus_limits(cpu, memory, processes):
+    try:
+        import resource
+    except ImportError:
+        return
+    import sys
+    if not hasattr(sys, "_argus_base_limits"):
+        sys._argus_base_limits = {{
+            which: resource.getrlimit(which)[0]
+            for which in (resource.RLIMIT_CPU, resource.RLIMIT_AS, resource.RLIMIT_NPROC)
+        }}
+    def set_soft(which, value):
+        soft, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(which, (value, hard))
+    if cpu:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        set_soft(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime) + 1 + cpu)
+    if memory:
+        base = 0
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmSize:"):
+                        base = int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        set_soft(resource.RLIMIT_AS, base + memory)
+    if processes:
+        set_soft(resource.RLIMIT_NPROC, processes)
+__argus_limits({cpu}, {memory}, {processes})
+del __argus_limits
+"""
+
+_RESTORE_LIMITS_CODE = """
+def __argus_restore_limits():
+    import sys
+    try:
+        import resource
+    except ImportError:
+        return
+    for which, soft in getattr(sys, "_argus_base_limits", {}).items():
+        try:
+            resource.setrlimit(which, (soft, resource.getrlimit(which)[1]))
+        except (ValueError, OSError):
+            pass
+__argus_restore_limits()
+del __argus_restore_limits
+"""
+
+
+def build_limits_code(limits: ExecutionLimits) -> str:
+    """生成设置资源限制的内核代码，没有需要rlimit的限制时返回空字符串"""
+    if not (limits.cpu_time or limits.memory_bytes or limits.max_processes):
+        return ""
+    return _LIMITS_TEMPLATE.format(
+        cpu=int(limits.cpu_time or 0),
+        memory=int(limits.memory_bytes or 0),
+        processes=process_quota(limits),
+    )
 
 
 class PythonLanguage(BaseLanguage):
-    def __init__(self):
+    """
+    基于Jupyter内核的Python执行器
+
+    内核在会话期间常驻，变量在多次执行之间保留；
+    执行通过锁串行化，每次执行前做健康检查，内核死亡时自动重启。
+    配置了内核池时从池中领取预热好的内核，reset时把内核交回池中回收。
+    """
+
+    def __init__(self, pool=None):
         super().__init__()
+        self.pool = pool
         self.km = None
         self.kc = None
         self.current_msg_id = None
-    
+        self._lock = threading.Lock()
+        self._kernel_lock = threading.Lock()
+        self._abort = threading.Event()
+
     def start(self):
-        self.should_stop = False
-        self.start_time = time.time()
-        self.elapsed_time = 0
-        
-        if self.km:
-            self.stop()
+        """启动内核（已存活时直接复用）"""
+        with self._kernel_lock:
+            if self.is_alive():
+                return
+            if self.km or self.kc:
+                self._shutdown_kernel()
+            try:
+                if self.pool is not None:
+                    self.km, self.kc = self.pool.acquire()
+                    logging.info("[PythonLanguage]Acquired kernel from pool")
+                    return
+                self.km = KernelManager(kernel_name='python3')
+                self.km.start_kernel()
+                self.kc = self.km.client()
+                self.kc.start_channels()
+                self.kc.wait_for_ready(timeout=60)
+                logging.info("[PythonLanguage]Started kernel client&manager")
+            except Exception as e:
+                self._shutdown_kernel()
+                logging.error("[PythonLanguage]Error starting kernel: %s", e)
+
+    def is_alive(self):
+        """内核健康检查"""
         try:
-            self.km = KernelManager(kernel_name='python3')
-            self.is_running = True
-            self.km.start_kernel()
-            self.kc = self.km.client()
-            self.kc.start_channels()
-            self.kc.wait_for_ready()
-            logging.info("[PythonLanguage]Started kernel client&manager")
-        except Exception as e:
-            self.stop()
-            logging.error("[PythonLanguage]Error starting kernel: %s", e)
+            return self.km is not None and self.kc is not None and self.km.is_alive()
+        except Exception:
+            return False
 
     def stop(self):
-        self.is_running = False
-        if self.start_time:
-            self.elapsed_time = time.time() - self.start_time
-        self.start_time = None
-        
+        """关闭内核，释放进程"""
+        with self._kernel_lock:
+            self._shutdown_kernel()
+
+    def _shutdown_kernel(self):
         try:
-            if self.km:
-                self.km.shutdown_kernel()
-                self.is_running = False
-                self.km = None
             if self.kc:
                 self.kc.stop_channels()
-                self.current_msg_id = None
-                self.kc = None
+            if self.km:
+                self.km.shutdown_kernel(now=True)
             logging.info("[PythonLanguage]Stopped kernel client&manager")
         except Exception as e:
             logging.error("[PythonLanguage]Error during cleanup kernel: %s", e)
+        finally:
+            self.km = None
+            self.kc = None
+            self.current_msg_id = None
+
+    def restart(self):
+        """重启内核（内核卡死或需要彻底清空状态时使用）"""
+        with self._kernel_lock:
+            if self.km is not None:
+                try:
+                    self.km.restart_kernel(now=True)
+                    self.kc.wait_for_ready(timeout=60)
+                    if self.pool is not None:
+                        # 重启后内核是冷的，重新导入池的预加载模块
+                        self.pool.warm(self.kc)
+                    logging.info("[PythonLanguage]Restarted kernel")
+                    return
+                except Exception as e:
+                    logging.error("[PythonLanguage]Error restarting kernel: %s", e)
+                    self._shutdown_kernel()
+        self.start()
+
+    def reset(self):
+        """清空内核中的用户变量，用于任务之间的隔离"""
+        if self.pool is not None:
+            # 交回内核由池在后台重启预热，下次执行时领取新的热内核
+            with self._lock, self._kernel_lock:
+                if self.km is not None:
+                    self.pool.release(self.km, self.kc)
+                    self.km = None
+                    self.kc = None
+            return
+        with self._lock:
+            if not self.is_alive():
+                return
+            try:
+                msg_id = self.kc.execute("%reset -f", silent=True, store_history=False)
+                reply = self.kc.get_shell_msg(timeout=10)
+                while reply['parent_header'].get('msg_id') != msg_id:
+                    reply = self.kc.get_shell_msg(timeout=10)
+                if reply['content'].get('status') == 'ok':
+                    logging.info("[PythonLanguage]Kernel namespace reset")
+                    return
+            except Exception as e:
+                logging.warning("[PythonLanguage]Reset failed, restarting kernel: %s", e)
+        self.restart()
 
     def wait_for_shutdown(self):
-        while self.is_running or self.kc:
+        while self.is_running:
             time.sleep(0.1)
 
-    def run(self, code: str):
-        message = queue.Queue()
-
-        excecution_thread = threading.Thread(target=self._execute_jupyter, args=(code, message))
-        excecution_thread.daemon = True
-        excecution_thread.start()
+    def interrupt(self):
+        super().interrupt()
+        if self.is_running and self.km is not None:
+            try:
+                self.km.interrupt_kernel()
+            except Exception as e:
+                logging.error("[PythonLanguage]Error interrupting kernel: %s", e)
 
-        return message
+    def kill(self):
+        """中断无效时放弃当前执行，由执行线程重启内核"""
+        super().interrupt()
+        if self.is_running:
+            self._abort.set()
 
-    def _execute_jupyter(self, code: str, message: queue.Queue):
-        self.start()
+    def _execute(self, code: str, execution: Execution, limits: ExecutionLimits):
+        with self._lock:
+            self._abort.clear()
+            try:
+                return self._run_in_kernel(code, execution, limits)
+            finally:
+                self.current_msg_id = None
+                if build_limits_code(limits):
+                    # 无论正常结束、出错还是被中断，都恢复内核原来的软限制，之后的执行不受本次限制影响
+                    self._restore_limits()
 
-        if self.km.is_alive() is False:
-            message.put({"type": "error", "content": "[PythonLanguage]Faild to start Jupyter kernel"})
+    def _restore_limits(self):
+        if self._abort.is_set() or not self.is_alive():
+            # 内核已重启或死亡，新内核没有被限制
             return
+        try:
+            msg_id = self.kc.execute(_RESTORE_LIMITS_CODE, silent=True, store_history=False)
+            reply = self.kc.get_shell_msg(timeout=10)
+            while reply['parent_header'].get('msg_id') != msg_id:
+                reply = self.kc.get_shell_msg(timeout=10)
+            if reply['content'].get('status') != 'ok':
+                raise RuntimeError(reply['content'].get('status'))
+        except Exception as e:
+            logging.warning("[PythonLanguage]Failed to restore resource limits, restarting kernel: %s", e)
+            self.restart()
+
+    def _killed_by_sigxcpu(self) -> bool:
+        """内核进程是否因超出CPU时间被SIGXCPU终止"""
+        process = getattr(getattr(self.km, "provisioner", None), "process", None)
+        return process is not None and process.poll() == -SIGXCPU
+
+    def _run_in_kernel(self, code: str, execution: Execution, limits: ExecutionLimits):
+        if not self.is_alive():
+            if self.km is not None:
+                logging.warning("[PythonLanguage]Kernel is dead, restarting")
+            self.start()
+        if not self.is_alive():
+            execution.put({"type": "error", "content": "[PythonLanguage]Faild to start Jupyter kernel"})
+            return None
 
         # 只在需要时添加matplotlib魔法命令
         if "matplotlib" in code and "%matplotlib" not in code:
             code = "%matplotlib inline\n" + code
 
         try:
-            self.current_msg_id=self.kc.execute(code)
+            limits_code = build_limits_code(limits)
+            if limits_code:
+                self.kc.execute(limits_code, silent=True, store_history=False)
+            self.current_msg_id = self.kc.execute(code)
         except Exception as e:
-            message.put({"type": "error", "content": f"[PythonLanguage]Error while executing code: {e}"})
+            execution.put({"type": "error", "content": f"[PythonLanguage]Error while executing code: {e}"})
             logging.error("[PythonLanguage]Error while executing code: %s", e)
-        print("[PythonLanguage]start runing...")
-        while True:
-            if self.should_stop:
-                self.km.interrupt_kernel()
+            return None
 
+        exit_code = 0
+        while True:
+            # 阻塞等待iopub消息，超时只用于检测内核是否死亡
             try:
                 msg = self.kc.get_iopub_msg(timeout=1)
             except queue.Empty:
+                if self._abort.is_set():
+                    # 在执行线程中重启，重启完成后本次执行才结束，下一次执行不会发给正在重启的内核
+                    self.restart()
+                    execution.put({"type": "error", "content": "[PythonLanguage]Execution aborted, kernel restarted"})
+                    return None
+                if not self.is_alive():
+                    execution.put({"type": "error", "content": "[PythonLanguage]Kernel died during execution"})
+                    logging.error("[PythonLanguage]Kernel died during execution")
+                    # 只有内核确实死于SIGXCPU才算CPU超限（段错误、OOM、os._exit不算）
+                    if limits.cpu_time and execution.violation is None and self._killed_by_sigxcpu():
+                        execution.violation = limit_violation(LIMIT_CPU_TIME, limits)
+                    return None
                 continue
 
             if msg['parent_header'].get('msg_id') != self.current_msg_id:
@@ -99,33 +291,32 @@ class PythonLanguage(BaseLanguage):
             msg_type = msg['msg_type']
             content = msg['content']
 
-            print("get_one_msg")
-
             if msg_type == "stream":
-                message.put({"type": "text", "content": content['text']})
+                execution.put({"type": "text", "content": content['text']})
 
             elif msg_type == "error":
+                exit_code = 1
+                if content.get("ename") == "MemoryError" and limits.memory_bytes and execution.violation is None:
+                    execution.violation = limit_violation(LIMIT_MEMORY, limits)
                 content = "\n".join(content["traceback"])
                 # 移除颜色标识
                 ansi_escape = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
                 content = ansi_escape.sub("", content)
-                message.put({"type": "text", "content": content})
+                execution.put({"type": "text", "content": content + "\n"})
 
             elif msg_type in ["display_data", "execute_result"]:
                 data = content["data"]
                 if "image/png" in data:
-                    message.put({"type": "image/png", "content": data["image/png"]})
+                    execution.put({"type": "image/png", "content": data["image/png"]})
                 elif "image/jpeg" in data:
-                    message.put({"type": "image/jpeg", "content": data["image/jpeg"]})
+                    execution.put({"type": "image/jpeg", "content": data["image/jpeg"]})
                 elif "text/html" in data:
-                    message.put({"type": "html", "content": data["text/html"]})
+                    execution.put({"type": "html", "content": data["text/html"]})
                 elif "text/plain" in data:
-                    message.put({"type": "text", "content": data["text/plain"]})
+                    execution.put({"type": "text", "content": data["text/plain"] + "\n"})
                 elif "application/javascript" in data:
-                    message.put({"type": "javascript", "content": data["application/javascript"]})
+                    execution.put({"type": "javascript", "content": data["application/javascript"]})
 
             elif msg_type == 'status':
                 if content['execution_state'] == 'idle':
-                    break
-        print("[PythonLanguage]finished.")
-        self.stop()
+                    return exit_code
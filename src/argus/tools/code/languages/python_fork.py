@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from .. import fork_server
+from ..base_language import BaseLanguage
+from ..execution import Execution
+from ..kernel_pool import preload_from_env
+from ..limits import (
+    LIMIT_CPU_TIME,
+    LIMIT_MEMORY,
+    SIGXCPU,
+    ExecutionLimits,
+    limit_violation,
+    process_quota,
+)
+
+
+class ForkPythonLanguage(BaseLanguage):
+    """
+    基于forkserver的轻量Python执行器（仅POSIX）
+
+    server进程预先导入常用库，每次执行fork一个写时复制的子进程，通过管道收集输出，
+    没有Jupyter内核的ZMQ通道和消息协议开销，适合大量短小的代码片段。
+    变量在多次执行之间保留；执行被强制结束时命名空间回滚到执行前的状态。
+    """
+
+    def __init__(self, preload=None):
+        super().__init__()
+        self.preload = preload_from_env() if preload is None else list(preload)
+        self.process = None
+        self.child_pid = None
+        self._lock = threading.Lock()
+        self._process_lock = threading.Lock()
+
+    @staticmethod
+    def is_available():
+        return hasattr(os, "fork") and sys.platform != "win32"
+
+    def start(self):
+        """启动server进程并等待预加载完成（已存活时直接复用）"""
+        with self._process_lock:
+            if self.is_alive():
+                return
+            self._close_process()
+            env = dict(os.environ, ARGUS_FORK_PRELOAD=json.dumps(self.preload), MPLBACKEND="Agg")
+            # 新会话：server在每次执行后由子进程接替，结束时按进程组清理整条链
+            self.process = subprocess.Popen(
+                [sys.executable, "-u", fork_server.__file__],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                start_new_session=True,
+            )
+            ready = self._read_message()
+            if ready is None or ready.get("type") != "ready":
+                self._close_process()
+                raise RuntimeError("[ForkPythonLanguage]forkserver启动失败")
+            logging.info("[ForkPythonLanguage]forkserver已启动 (pid=%s)", ready.get("pid"))
+
+    def is_alive(self):
+        # 原始server进程在第一次执行后就会退出，以控制管道是否打开为准
+        return self.process is not None and not self.process.stdout.closed
+
+    def stop(self):
+        with self._process_lock:
+            self._close_process()
+
+    def _close_process(self):
+        process, self.process = self.process, None
+        self.child_pid = None
+        if process is None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def reset(self):
+        """恢复到只有预加载模块的命名空间"""
+        with self._lock:
+            if not self.is_alive():
+                return
+            try:
+                self._send({"op": "reset"})
+                while True:
+                    message = self._read_message()
+                    if message is None or message.get("type") == "done":
+                        break
+            except OSError as e:
+                logging.warning("[ForkPythonLanguage]重置失败，重启server: %s", e)
+                self.stop()
+
+    def interrupt(self):
+        super().interrupt()
+        self._signal_child(signal.SIGINT)
+
+    def kill(self):
+        """强制结束执行中的子进程，server回滚到执行前的状态继续服务"""
+        super().interrupt()
+        self._signal_child(signal.SIGKILL)
+
+    def _signal_child(self, sig):
+        pid = self.child_pid
+        if self.is_running and pid:
+            try:
+                os.kill(pid, sig)
+            except OSError as e:
+                logging.error("[ForkPythonLanguage]Error signaling child: %s", e)
+
+    def _execute(self, code: str, execution: Execution, limits: ExecutionLimits):
+        with self._lock:
+            try:
+                self.start()
+                self._send({
+                    "op": "exec",
+                    "code": code,
+                    "limits": {
+                        "cpu": limits.cpu_time,
+                        "memory": limits.memory_bytes,
+                        "processes": process_quota(limits),
+                    },
+                })
+                return self._collect(execution, limits)
+            finally:
+                self.child_pid = None
+
+    def _collect(self, execution: Execution, limits: ExecutionLimits):
+        while True:
+            message = self._read_message()
+            if message is None:
+                execution.put({"type": "error", "content": "[ForkPythonLanguage]forkserver意外退出"})
+                self.stop()
+                return None
+            msg_type = message.get("type")
+            if msg_type == "started":
+                self.child_pid = message["pid"]
+            elif msg_type == "stream":
+                execution.put({"type": "text", "content": message["text"]})
+            elif msg_type == "image":
+                execution.put({"type": f"image/{message['format']}", "content": message["content"]})
+            elif msg_type == "done":
+                if message.get("error") == "MemoryError" and limits.memory_bytes and execution.violation is None:
+                    execution.violation = limit_violation(LIMIT_MEMORY, limits)
+                if message.get("rolled_back"):
+                    if message.get("signal") == SIGXCPU and limits.cpu_time and execution.violation is None:
+                        execution.violation = limit_violation(LIMIT_CPU_TIME, limits)
+                    execution.put({
+                        "type": "text",
+                        "content": f"[执行进程被终止(signal={message.get('signal')})，变量已回滚到执行前的状态]\n",
+                    })
+                return message.get("exit_code")
+
+    def _send(self, command: dict):
+        self.process.stdin.write((json.dumps(command, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+
+    def _read_message(self):
+        line = self.process.stdout.readline() if self.process is not None else b""
+        if not line:
+            return None
+        return json.loads(line)
@@ -0,0 +1,125 @@
+"""
+代码执行资源限制
+每次执行的墙钟时间、CPU时间、地址空间、输出字节数和新建进程数限制。
+墙钟时间和输出字节数由执行线程监控（先中断，宽限期后强制结束）；
+CPU、内存和进程数通过rlimit交给操作系统执行（仅POSIX）。
+
+进程数限制使用RLIMIT_NPROC，它统计的是同一真实用户的全部进程（Linux上包括线程），不只是本次执行的子进程：
+执行开始时按该用户已有的数量加上限额设置，执行期间同一用户在别处新建的进程也占用限额；root不受此限制。
+"""
+
+import logging
+import os
+import signal
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+LIMIT_WALL_TIME = "wall_time"
+LIMIT_CPU_TIME = "cpu_time"
+LIMIT_MEMORY = "memory"
+LIMIT_OUTPUT = "output_bytes"
+LIMIT_PROCESSES = "processes"
+
+# 超出CPU时间的进程被SIGXCPU终止（Windows上没有该信号）
+SIGXCPU = getattr(signal, "SIGXCPU", 24)
+
+_MESSAGES = {
+    LIMIT_WALL_TIME: "执行超时（超过{value}秒），已中断",
+    LIMIT_CPU_TIME: "CPU时间超过{value}秒，进程已被终止",
+    LIMIT_MEMORY: "内存超过限制（{value}字节）",
+    LIMIT_OUTPUT: "输出超过{value}字节，已中断",
+    LIMIT_PROCESSES: "新建进程数超过{value}（按用户计算）",
+}
+
+
+def _env_number(name: str, scale: int = 1) -> Optional[int]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    number = float(value)
+    return int(number * scale) if number > 0 else None
+
+
+@dataclass(frozen=True)
+class ExecutionLimits:
+    """单次执行的资源限制，None表示不限制"""
+
+    wall_time: Optional[float] = 300
+    cpu_time: Optional[int] = None
+    memory_bytes: Optional[int] = None
+    output_bytes: Optional[int] = 50 * 1024 * 1024
+    max_processes: Optional[int] = None
+    # 中断后等待执行自行结束的秒数，超时则强制结束进程/重启内核
+    grace_period: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "ExecutionLimits":
+        defaults = cls()
+        wall_time = os.getenv("ARGUS_EXEC_WALL_TIME")
+        output_mb = os.getenv("ARGUS_EXEC_OUTPUT_MB")
+        max_processes = _env_number("ARGUS_EXEC_MAX_PROCS")
+        if max_processes and hasattr(os, "geteuid") and os.geteuid() == 0:
+            logging.warning("[ExecutionLimits] 以root运行时RLIMIT_NPROC不生效，ARGUS_EXEC_MAX_PROCS被忽略")
+        return cls(
+            wall_time=(float(wall_time) or None) if wall_time else defaults.wall_time,
+            cpu_time=_env_number("ARGUS_EXEC_CPU_TIME"),
+            memory_bytes=_env_number("ARGUS_EXEC_MEMORY_MB", 1024 * 1024),
+            output_bytes=_env_number("ARGUS_EXEC_OUTPUT_MB", 1024 * 1024) if output_mb else defaults.output_bytes,
+            max_processes=max_processes,
+        )
+
+    def with_timeout(self, timeout: Optional[float]) -> "ExecutionLimits":
+        """返回替换了墙钟时间限制的副本"""
+        if not timeout or timeout <= 0:
+            return self
+        return replace(self, wall_time=float(timeout))
+
+    def get_value(self, limit: str) -> Any:
+        return {
+            LIMIT_WALL_TIME: self.wall_time,
+            LIMIT_CPU_TIME: self.cpu_time,
+            LIMIT_MEMORY: self.memory_bytes,
+            LIMIT_OUTPUT: self.output_bytes,
+            LIMIT_PROCESSES: self.max_processes,
+        }.get(limit)
+
+
+def user_task_count(uid: Optional[int] = None) -> Optional[int]:
+    """真实用户uid当前的进程数（包括线程，与Linux的RLIMIT_NPROC计数一致），无法统计时返回None"""
+    if not os.path.isdir("/proc") or not hasattr(os, "getuid"):
+        return None
+    uid = os.getuid() if uid is None else uid
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            # 进程已退出
+            continue
+        if int(fields.get("Uid", "-1").split()[0]) == uid:
+            count += int(fields.get("Threads", "1"))
+    return count
+
+
+def process_quota(limits: ExecutionLimits) -> int:
+    """
+    本次执行的RLIMIT_NPROC软限制：该用户当前的进程数加上max_processes，0表示不限制
+
+    无法统计时（如macOS）直接使用max_processes，此时它是该用户的总进程数上限
+    """
+    if not limits.max_processes:
+        return 0
+    return (user_task_count() or 0) + int(limits.max_processes)
+
+
+def limit_violation(limit: str, limits: ExecutionLimits) -> Dict[str, Any]:
+    """构造结构化的超限信息，供Agent据此调整（如缩小数据规模、改用流式处理）"""
+    value = limits.get_value(limit)
+    return {
+        "limit": limit,
+        "value": value,
+        "message": _MESSAGES[limit].format(value=value),
+    }
@@ -0,0 +1,155 @@
+"""
+有界输出缓冲
+代码执行的输出先写入内存，超过上限后整体转存到临时文件；
+返回给Agent的只有头尾摘要、总字节数和一个可分页读取的output_id。
+"""
+
+import io
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_HEAD_BYTES = 4000
+DEFAULT_TAIL_BYTES = 4000
+DEFAULT_MEMORY_BYTES = 1024 * 1024
+
+
+class OutputBuffer:
+    """
+    输出缓冲区
+
+    Args:
+        head_bytes: 摘要保留的开头字节数
+        tail_bytes: 摘要保留的结尾字节数
+        memory_bytes: 内存中最多保存的字节数，超过后转存临时文件
+    """
+
+    def __init__(
+        self,
+        head_bytes: int = DEFAULT_HEAD_BYTES,
+        tail_bytes: int = DEFAULT_TAIL_BYTES,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+    ):
+        self.output_id = uuid.uuid4().hex[:12]
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.memory_bytes = memory_bytes
+        self.total_bytes = 0
+        self.path: Optional[str] = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spool = io.BytesIO()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, text: str):
+        data = text.encode("utf-8", errors="replace")
+        if not data:
+            return
+        with self._lock:
+            self.total_bytes += len(data)
+
+            if len(self._head) < self.head_bytes:
+                self._head += data[: self.head_bytes - len(self._head)]
+            self._tail += data
+            if len(self._tail) > self.tail_bytes:
+                del self._tail[: len(self._tail) - self.tail_bytes]
+
+            if self._file is None and self.total_bytes > self.memory_bytes:
+                self._spill()
+            (self._file or self._spool).write(data)
+
+    def _spill(self):
+        fd, self.path = tempfile.mkstemp(prefix="argus_output_", suffix=".log")
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(self._spool.getvalue())
+        self._spool = io.BytesIO()
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > self.head_bytes + self.tail_bytes
+
+    def excerpt(self) -> str:
+        """返回头尾摘要，未超过上限时返回完整内容"""
+        with self._lock:
+            if not self.truncated:
+                return self._read_all().decode("utf-8", errors="replace")
+            omitted = self.total_bytes - len(self._head) - len(self._tail)
+            head = bytes(self._head).decode("utf-8", errors="ignore")
+            tail = bytes(self._tail).decode("utf-8", errors="ignore")
+        return f"{head}\n... [省略 {omitted} 字节，使用 read_code_output 分页读取] ...\n{tail}"
+
+    def read(self, offset: int = 0, length: int = DEFAULT_HEAD_BYTES) -> Dict[str, Any]:
+        """按字节偏移分页读取完整输出"""
+        offset = max(0, offset)
+        length = max(1, length)
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._file.seek(offset)
+                data = self._file.read(length)
+                self._file.seek(0, os.SEEK_END)
+            else:
+                data = self._spool.getvalue()[offset:offset + length]
+        next_offset = offset + len(data)
+        return {
+            "content": data.decode("utf-8", errors="ignore"),
+            "offset": offset,
+            "next_offset": next_offset,
+            "total_bytes": self.total_bytes,
+            "eof": next_offset >= self.total_bytes,
+        }
+
+    def _read_all(self) -> bytes:
+        if self._file is None:
+            return self._spool.getvalue()
+        self._file.flush()
+        self._file.seek(0)
+        data = self._file.read()
+        self._file.seek(0, os.SEEK_END)
+        return data
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                self.path = None
+            self._spool = io.BytesIO()
+
+
+class OutputStore:
+    """保存最近的输出缓冲区，供分页工具按output_id读取"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._buffers: "OrderedDict[str, OutputBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, buffer: OutputBuffer):
+        with self._lock:
+            self._buffers[buffer.output_id] = buffer
+            while len(self._buffers) > self.max_entries:
+                _, evicted = self._buffers.popitem(last=False)
+                evicted.close()
+
+    def get(self, output_id: str) -> Optional[OutputBuffer]:
+        with self._lock:
+            buffer = self._buffers.get(output_id)
+            if buffer is not None:
+                self._buffers.move_to_end(output_id)
+            return buffer
+
+    def clear(self):
+        with self._lock:
+            for buffer in self._buffers.values():
+                buffer.close()
+            self._buffers.clear()
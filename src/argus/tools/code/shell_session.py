@@ -0,0 +1,296 @@
+"""
+常驻Shell会话
+一个会话对应一个长期存活的shell进程，工作目录、环境变量和函数定义在多次执行之间保留。
+每段代码写入临时脚本后在会话中dot-source执行，随后输出带随机标记的哨兵行，
+读到哨兵即表示执行结束，并从中解析出退出码。
+"""
+
+import codecs
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from typing import Callable, List, Optional
+
+from .limits import ExecutionLimits, process_quota
+
+
+class ShellSession:
+    """
+    常驻Shell会话基类，子类提供启动命令和命令封装方式
+
+    Args:
+        argv: 启动shell的命令行
+    """
+
+    script_suffix = ".sh"
+    script_encoding = "utf-8"
+
+    def __init__(self, argv: List[str]):
+        self.argv = argv
+        self.process: Optional[subprocess.Popen] = None
+        self.token = f"__ARGUS_DONE_{uuid.uuid4().hex}__"
+        self._chunks: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    # ----- 子类扩展点 -----
+
+    def _init_commands(self) -> str:
+        """会话启动后执行一次的初始化命令"""
+        return ""
+
+    def _frame(self, script_path: str, limits: Optional[ExecutionLimits]) -> str:
+        """返回执行脚本并输出哨兵行的命令（单行，以换行结尾），支持时在其中设置资源限制"""
+        raise NotImplementedError
+
+    def _interrupt_foreground(self) -> bool:
+        """中断前台任务但保留会话，不支持时返回False"""
+        return False
+
+    # ----- 生命周期 -----
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_started(self):
+        if self.is_alive():
+            return
+        self.close()
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            **kwargs,
+        )
+        self._chunks = queue.Queue()
+        reader = threading.Thread(target=self._reader, args=(self.process, self._chunks), daemon=True)
+        reader.start()
+        init = self._init_commands()
+        if init:
+            self._write(init)
+        logging.info("[ShellSession]已启动会话: %s (pid=%s)", " ".join(self.argv), self.process.pid)
+
+    def close(self):
+        """结束会话进程"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            if process.stdin:
+                process.stdin.close()
+        except OSError:
+            pass
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def interrupt(self):
+        """中断当前前台任务；无法只中断前台任务时结束整个会话"""
+        if not self.is_alive():
+            return
+        if not self._interrupt_foreground():
+            logging.info("[ShellSession]无法单独中断前台任务，重启会话")
+            self.kill()
+
+    def kill(self):
+        """强制结束会话及其所有子进程，下次执行时重新启动"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            if sys.platform == "win32":
+                subprocess.run(
+                    ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+
+    # ----- 执行 -----
+
+    def execute(
+        self,
+        code: str,
+        on_output: Callable[[str], None],
+        limits: Optional[ExecutionLimits] = None
+    ) -> int:
+        """
+        在会话中执行代码，输出以块为单位流式回调
+
+        Returns:
+            退出码；会话在执行中退出时返回进程的退出码
+        """
+        with self._lock:
+            self.ensure_started()
+            fd, script_path = tempfile.mkstemp(suffix=self.script_suffix, prefix="argus_")
+            try:
+                with os.fdopen(fd, "w", encoding=self.script_encoding, newline="\n") as f:
+                    f.write(code)
+                    if not code.endswith("\n"):
+                        f.write("\n")
+                self._write(self._frame(script_path, limits))
+                return self._collect(on_output)
+            finally:
+                try:
+                    os.remove(script_path)
+                except OSError:
+                    pass
+
+    def _write(self, text: str):
+        self.process.stdin.write(text.encode("utf-8"))
+        self.process.stdin.flush()
+
+    def _collect(self, on_output: Callable[[str], None]) -> int:
+        # 哨兵行前有一个额外的换行，不属于代码输出
+        marker = "\n" + self.token + ":"
+        buffer = ""
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                # 会话进程已退出（例如代码中调用了exit）
+                if buffer:
+                    on_output(buffer)
+                process = self.process
+                self.process = None
+                return process.wait() if process else -1
+
+            buffer += chunk
+            idx = buffer.find(marker)
+            if idx >= 0:
+                line_end = buffer.find("\n", idx + len(marker))
+                if line_end < 0:
+                    continue
+                if idx:
+                    on_output(buffer[:idx])
+                try:
+                    return int(buffer[idx + len(marker):line_end].strip())
+                except ValueError:
+                    return -1
+
+            # 立即输出，只保留可能是哨兵前缀的尾部
+            hold = buffer.rfind("\n")
+            if hold < 0 or not marker.startswith(buffer[hold:]):
+                hold = len(buffer)
+            if hold:
+                on_output(buffer[:hold])
+                buffer = buffer[hold:]
+
+    @staticmethod
+    def _reader(process: subprocess.Popen, chunks: queue.Queue):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        fd = process.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                data = b""
+            if not data:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    chunks.put(tail)
+                chunks.put(None)
+                return
+            text = decoder.decode(data)
+            if text:
+                chunks.put(text.replace("\r\n", "\n"))
+
+
+def _quote_single(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+# source中的脚本收到SIGINT时返回130，会话本身不退出
+_INT_TRAP = "trap 'return 130 2>/dev/null' INT"
+
+
+class BashSession(ShellSession):
+    """
+    常驻bash会话，中断时向进程组发送SIGINT，由trap结束当前脚本
+
+    trap在前台命令结束后、下一条命令开始前执行（循环中的内建命令之间也会执行）；
+    前台程序忽略SIGINT时脚本无法返回，只能由调用方在宽限期后结束整个会话，会话状态随之丢失。
+    """
+
+    script_suffix = ".sh"
+
+    def __init__(self):
+        super().__init__(["bash", "--noprofile", "--norc"])
+
+    def _init_commands(self) -> str:
+        return f"{_INT_TRAP}\n"
+
+    def _frame(self, script_path: str, limits: Optional[ExecutionLimits]) -> str:
+        path = script_path.replace("\\", "/").replace("'", "'\\''")
+        ulimits = self._ulimit_commands(limits)
+        if ulimits:
+            # rlimit只加在执行脚本的子shell上：CPU时间按进程累计，加在常驻会话上会把之前执行用掉的时间也算进去；
+            # 代价是受限执行中对工作目录、变量的修改不会保留到会话中
+            run = f"( {ulimits}source '{path}' < /dev/null )"
+        else:
+            run = f"source '{path}' < /dev/null"
+        # 每次执行前重新设置trap，上一段代码修改或忽略INT不会让之后的执行无法中断
+        return (
+            f"{_INT_TRAP}; {run}; __argus_rc=$?; "
+            f"printf '\\n%s:%s\\n' '{self.token}' \"$__argus_rc\"\n"
+        )
+
+    @staticmethod
+    def _ulimit_commands(limits: Optional[ExecutionLimits]) -> str:
+        """rlimit由子进程继承；CPU和地址空间按进程计算，进程数按用户计算（见process_quota）"""
+        if limits is None or sys.platform == "win32":
+            return ""
+        options = []
+        if limits.cpu_time:
+            options.append(("t", str(int(limits.cpu_time))))
+        if limits.memory_bytes:
+            options.append(("v", str(int(limits.memory_bytes) // 1024)))
+        if limits.max_processes:
+            options.append(("u", str(process_quota(limits))))
+        return "".join(f"ulimit -S -{flag} {value} 2>/dev/null; " for flag, value in options)
+
+    def _interrupt_foreground(self) -> bool:
+        if sys.platform == "win32" or not self.is_alive():
+            return False
+        try:
+            os.killpg(self.process.pid, signal.SIGINT)
+            return True
+        except OSError:
+            return False
+
+
+class PowerShellSession(ShellSession):
+    """常驻PowerShell会话，从stdin逐行读取命令"""
+
+    script_suffix = ".ps1"
+    script_encoding = "utf-8-sig"
+
+    def __init__(self, executable: str):
+        super().__init__([executable, "-NoProfile", "-NoLogo", "-NonInteractive", "-Command", "-"])
+
+    def _frame(self, script_path: str, limits: Optional[ExecutionLimits]) -> str:
+        # PowerShell没有rlimit，只受墙钟时间和输出字节数限制
+        return (
+            "$global:LASTEXITCODE = 0; $__argus_rc = 0; "
+            f"try {{ . {_quote_single(script_path)}; if (-not $?) {{ $__argus_rc = 1 }}; "
+            "if ($global:LASTEXITCODE) { $__argus_rc = $global:LASTEXITCODE } } "
+            "catch { $_ | Out-String | Write-Output; $__argus_rc = 1 }; "
+            f"Write-Output \"`n{self.token}:$__argus_rc\"\n"
+        )
@@ -0,0 +1,175 @@
+"""
+工具结果中的媒体附件
+截图等图片不能以base64文本的形式放进tool消息（一张PNG就是几十万个文本token），
+这里把结果中的图片抽取为附件，按尺寸和字节数上限缩放后交给Memory以图片形式发送，
+结果JSON中只保留一个引用占位。
+不支持图片输入的模型只收到引用，图片保存为文件，模型可以用代码读取。
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_MAX_SIDE = 1280
+DEFAULT_MAX_BYTES = 256 * 1024
+# 逐步降低JPEG质量，仍超限时再缩小尺寸
+_JPEG_QUALITIES = (85, 70, 55)
+_MIN_SIDE = 320
+
+
+class MediaAttachment:
+    """
+    工具结果附带的图片
+
+    Args:
+        mime_type: 如 image/png、image/jpeg
+        data: base64编码的图片数据
+        width/height: 图片尺寸（已知时）
+    """
+
+    def __init__(self, mime_type: str, data: str, width: Optional[int] = None, height: Optional[int] = None):
+        self.mime_type = mime_type
+        self.data = data
+        self.width = width
+        self.height = height
+        # 保存为文件后的路径
+        self.path: Optional[str] = None
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.data) * 3 // 4
+
+    def to_image_part(self) -> Dict[str, Any]:
+        """OpenAI格式的图片内容块"""
+        return {"type": "image_url", "image_url": {"url": f"data:{self.mime_type};base64,{self.data}"}}
+
+    def save(self, directory: str) -> str:
+        """保存为文件（按内容命名，重复保存同一图片只写一次），返回路径"""
+        raw = base64.b64decode(self.data, validate=False)
+        extension = self.mime_type.split("/", 1)[-1].replace("jpeg", "jpg")
+        path = os.path.abspath(os.path.join(directory, f"{hashlib.sha1(raw).hexdigest()[:16]}.{extension}"))
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(raw)
+        self.path = path
+        return path
+
+    def reference(self, index: int) -> Dict[str, Any]:
+        """结果JSON中代替图片数据的占位"""
+        ref = {"type": self.mime_type, "attachment": index, "bytes": self.size_bytes}
+        if self.width and self.height:
+            ref["width"], ref["height"] = self.width, self.height
+        if self.path:
+            ref["path"] = self.path
+        return ref
+
+
+def supports_vision(model: Optional[str]) -> bool:
+    """模型是否接受图片输入：ARGUS_VISION_MODELS中列出的模型（逗号分隔）"""
+    models = {name.strip() for name in os.getenv("ARGUS_VISION_MODELS", "").split(",")}
+    return bool(model) and model in models
+
+
+def _limits_from_env() -> Tuple[int, int]:
+    max_side = int(os.getenv("ARGUS_MEDIA_MAX_SIDE", DEFAULT_MAX_SIDE))
+    max_bytes = int(float(os.getenv("ARGUS_MEDIA_MAX_KB", DEFAULT_MAX_BYTES // 1024)) * 1024)
+    return max_side, max_bytes
+
+
+def downscale_image(
+    attachment: MediaAttachment,
+    max_side: int = DEFAULT_MAX_SIDE,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> MediaAttachment:
+    """
+    图片超过边长或字节数上限时缩放并转为JPEG
+
+    先把长边缩到max_side，再逐步降低JPEG质量，仍然超限则继续缩小尺寸。
+    未安装Pillow或图片无法解码时原样返回。
+    """
+    if Image is None:
+        return attachment
+    try:
+        raw = base64.b64decode(attachment.data, validate=False)
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except (binascii.Error, OSError, ValueError):
+        return attachment
+
+    attachment.width, attachment.height = image.size
+    if len(raw) <= max_bytes and max(image.size) <= max_side:
+        return attachment
+
+    image = image.convert("RGB")
+    side = min(max_side, max(image.size))
+    while True:
+        candidate = image.copy()
+        candidate.thumbnail((side, side), Image.Resampling.LANCZOS)
+        for quality in _JPEG_QUALITIES:
+            buffer = io.BytesIO()
+            candidate.save(buffer, format="JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                break
+        if buffer.tell() <= max_bytes or side <= _MIN_SIDE:
+            break
+        side = max(_MIN_SIDE, int(side * 0.75))
+
+    return MediaAttachment(
+        "image/jpeg",
+        base64.b64encode(buffer.getvalue()).decode("ascii"),
+        *candidate.size
+    )
+
+
+def _is_inline_image(value: Any) -> bool:
+    # 工具返回的图片格式: {"type": "image/png", "content": "<base64>"}
+    return (
+        isinstance(value, dict)
+        and str(value.get("type", "")).startswith("image/")
+        and isinstance(value.get("content"), str)
+    )
+
+
+def extract_attachments(
+    result: Dict[str, Any],
+    max_side: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    save_dir: Optional[str] = None
+) -> Tuple[Dict[str, Any], List[MediaAttachment]]:
+    """
+    从工具结果中抽取图片
+
+    Args:
+        save_dir: 指定时把图片保存到该目录，引用中附带文件路径（用于不支持图片输入的模型）
+
+    Returns:
+        (替换为占位引用后的结果, 附件列表)；上限默认读取ARGUS_MEDIA_MAX_SIDE和ARGUS_MEDIA_MAX_KB
+    """
+    env_side, env_bytes = _limits_from_env()
+    max_side = max_side or env_side
+    max_bytes = max_bytes or env_bytes
+    attachments: List[MediaAttachment] = []
+
+    def walk(value):
+        if _is_inline_image(value):
+            attachment = downscale_image(MediaAttachment(value["type"], value["content"]), max_side, max_bytes)
+            if save_dir:
+                attachment.save(save_dir)
+            attachments.append(attachment)
+            return attachment.reference(len(attachments) - 1)
+        if isinstance(value, dict):
+            return {key: walk(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        return value
+
+    return walk(result), attachments
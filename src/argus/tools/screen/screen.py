@@ -6,11 +6,12 @@
 import base64
 import ctypes
 import io
+import zlib
 from ctypes import windll
 
 from PIL import Image, ImageGrab
 
-from ..base_tool import FunctionTool
+from ..base_tool import CACHE_TAG_DESKTOP, CONCURRENCY_READ_ONLY, FunctionTool
 
 
 def smart_resize(height: int, width: int, max_size: int = 1024):
@@ -42,8 +43,13 @@ def smart_resize(height: int, width: int, max_size: int = 1024):
 
 
 
-def capture_screen_win32():
-    """使用Win32 API捕获主屏幕"""
+def capture_screen_win32(max_side: int = None):
+    """
+    使用Win32 API捕获主屏幕
+
+    Args:
+        max_side: 指定时由GDI直接缩小到该边长（StretchBlt），只把缩略图的像素复制回进程
+    """
     # Simply capture primary screen
     user32 = windll.user32
     gdi32 = windll.gdi32
@@ -60,18 +66,28 @@ def capture_screen_win32():
     height = user32.GetSystemMetrics(1) # SM_CYSCREEN
     x = 0
     y = 0
+    out_width, out_height = width, height
+    if max_side and max(width, height) > max_side:
+        out_height, out_width = smart_resize(height, width, max_side)
 
     hwnd = 0
     hwndDC = user32.GetWindowDC(hwnd)
     mfcDC = gdi32.CreateCompatibleDC(hwndDC)
-    saveBitMap = gdi32.CreateCompatibleBitmap(hwndDC, width, height)
+    saveBitMap = gdi32.CreateCompatibleBitmap(hwndDC, out_width, out_height)
     gdi32.SelectObject(mfcDC, saveBitMap)
     
     # Constants
     SRCCOPY = 0x00CC0020
     CAPTUREBLT = 0x40000000
+    HALFTONE = 4
 
-    gdi32.BitBlt(mfcDC, 0, 0, width, height, hwndDC, x, y, SRCCOPY | CAPTUREBLT)
+    if (out_width, out_height) == (width, height):
+        gdi32.BitBlt(mfcDC, 0, 0, width, height, hwndDC, x, y, SRCCOPY | CAPTUREBLT)
+    else:
+        # HALFTONE按区域取平均，局部的小变化也会改变缩略图的像素
+        gdi32.SetStretchBltMode(mfcDC, HALFTONE)
+        gdi32.SetBrushOrgEx(mfcDC, 0, 0, None)
+        gdi32.StretchBlt(mfcDC, 0, 0, out_width, out_height, hwndDC, x, y, width, height, SRCCOPY | CAPTUREBLT)
 
     class BITMAPINFOHEADER(ctypes.Structure):
         _fields_ = [
@@ -90,17 +106,17 @@ def capture_screen_win32():
 
     bmi = BITMAPINFOHEADER()
     bmi.biSize = ctypes.sizeof(BITMAPINFOHEADER)
-    bmi.biWidth = width
-    bmi.biHeight = -height
+    bmi.biWidth = out_width
+    bmi.biHeight = -out_height
     bmi.biPlanes = 1
     bmi.biBitCount = 32
     bmi.biCompression = 0 # BI_RGB
 
-    buffer_len = width * height * 4
+    buffer_len = out_width * out_height * 4
     buffer = ctypes.create_string_buffer(buffer_len)
-    gdi32.GetDIBits(mfcDC, saveBitMap, 0, height, buffer, ctypes.byref(bmi), 0) # DIB_RGB_COLORS
+    gdi32.GetDIBits(mfcDC, saveBitMap, 0, out_height, buffer, ctypes.byref(bmi), 0) # DIB_RGB_COLORS
 
-    image = Image.frombuffer("RGB", (width, height), buffer, "raw", "BGRX", 0, 1)
+    image = Image.frombuffer("RGB", (out_width, out_height), buffer, "raw", "BGRX", 0, 1)
 
     gdi32.DeleteObject(saveBitMap)
     gdi32.DeleteDC(mfcDC)
@@ -109,11 +125,36 @@ def capture_screen_win32():
     return image, 0, 0
 
 
+# 截图缓存版本使用的缩略图边长：1920x1080的屏幕每个缩略图像素约为6x6区域的平均值
+FINGERPRINT_SIDE = 320
+
+
 class Screen:
     """屏幕截图类"""
     
-    def __init__(self):
-        pass
+    def _grab(self, max_side: int = None):
+        try:
+            return capture_screen_win32(max_side)
+        except Exception as e:
+            print(f"[Screen] Win32失败，回退到ImageGrab: {e}")
+            image = ImageGrab.grab() # Default grabs all screens or primary
+            # Ensure we are consistent if multi-mon support is removed, standard PIL grab might grab all.
+            # But "Delete multi-display related code" usually implies simplification.
+            if max_side:
+                image.thumbnail((max_side, max_side), Image.Resampling.BOX)
+            return image, 0, 0
+
+    def frame_fingerprint(self) -> str:
+        """
+        当前画面的指纹（缩略图像素的CRC），画面不变时指纹不变
+
+        用作截图工具的缓存版本：缩略图由GDI直接缩小后才复制回进程，
+        只有全屏截图的一小部分开销，命中缓存时不再截取全屏。
+        缩略图像素是区域平均值，极小的变化（如亮度差很小的单个像素）可能不改变指纹，
+        这类变化只能等缓存TTL过期或桌面操作工具使缓存失效后才会反映出来
+        """
+        image, _, _ = self._grab(FINGERPRINT_SIDE)
+        return f"{image.size[0]}x{image.size[1]}:{zlib.crc32(image.tobytes()):08x}"
 
     def screenshot_base64(
         self, 
@@ -122,14 +163,7 @@ class Screen:
         quality: int = 100
     ):
         """获取截屏并转换为base64"""
-        try:
-            image, left, top = capture_screen_win32()
-        except Exception as e:
-            print(f"[Screen] Win32失败，回退到ImageGrab: {e}")
-            image = ImageGrab.grab() # Default grabs all screens or primary
-            # Ensure we are consistent if multi-mon support is removed, standard PIL grab might grab all.
-            # But "Delete multi-display related code" usually implies simplification.
-            left, top = 0, 0
+        image, left, top = self._grab()
 
         origin_width = image.size[0]
         origin_height = image.size[1]
@@ -216,7 +250,7 @@ def create_screen_tools():
     
     screenshot_tool = FunctionTool(
         name="screen_screenshot",
-        description="捕获屏幕截图。返回base64编码的图片",
+        description="捕获屏幕截图。图片作为附件随结果返回，结果中的image字段是附件引用",
         parameters_schema={
             "type": "object",
             "properties": {
@@ -236,7 +270,12 @@ def create_screen_tools():
             },
             "required": []
         },
-        execute_func=screenshot_tool_func
+        execute_func=screenshot_tool_func,
+        concurrency=CONCURRENCY_READ_ONLY,
+        cache_ttl=1.0,
+        invalidated_by=(CACHE_TAG_DESKTOP,),
+        # 按画面缩略图的指纹缓存：不经过工具的画面变化也不会命中旧结果
+        cache_version=screen.frame_fingerprint
     )
     tools.append(screenshot_tool)
     
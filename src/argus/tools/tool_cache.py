@@ -0,0 +1,90 @@
+"""
+工具结果缓存
+为声明了cache_ttl的幂等工具提供LRU缓存，按TTL过期，
+并在执行了会改变相关状态的工具（如鼠标、键盘、窗口操作）后按标签失效。
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class ToolResultCache:
+    """
+    线程安全的LRU结果缓存
+
+    Args:
+        max_entries: 最多缓存的结果数量
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple[str, ...], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(tool_name: str, parameters: Dict[str, Any], version: Any = None) -> Hashable:
+        return tool_name, json.dumps(parameters, sort_keys=True, ensure_ascii=False, default=str), repr(version)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """命中且未过期时返回结果，否则返回None"""
+        tool_name = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            self._count(tool_name, "hits" if entry is not None else "misses")
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry[2])
+
+    def put(self, key: Hashable, result: Dict[str, Any], ttl: float, tags: Iterable[str] = ()):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, tuple(tags), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._count(evicted_key[0], "evictions")
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """删除带有任一标签的缓存项，返回删除数量"""
+        tags = set(tags)
+        if not tags:
+            return 0
+        with self._lock:
+            stale = [key for key, (_, entry_tags, _) in self._entries.items() if tags.intersection(entry_tags)]
+            for key in stale:
+                del self._entries[key]
+                self._count(key[0], "invalidations")
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回整体及各工具的命中统计"""
+        with self._lock:
+            per_tool = {name: dict(counts) for name, counts in self.stats.items()}
+            size = len(self._entries)
+        hits = sum(c.get("hits", 0) for c in per_tool.values())
+        misses = sum(c.get("misses", 0) for c in per_tool.values())
+        for counts in per_tool.values():
+            lookups = counts.get("hits", 0) + counts.get("misses", 0)
+            counts["hit_rate"] = round(counts.get("hits", 0) / lookups, 3) if lookups else 0.0
+        return {
+            "size": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "tools": per_tool,
+        }
+
+    def _count(self, tool_name: str, field: str):
+        counts = self.stats.setdefault(tool_name, {})
+        counts[field] = counts.get(field, 0) + 1
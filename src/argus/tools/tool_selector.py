@@ -0,0 +1,165 @@
+"""
+任务相关的工具子集选择
+每轮都下发全部20多个工具的schema会占用数千prompt tokens。
+按路由结果和任务关键词只启用相关的工具分组，模型需要时可通过request_tools申请更多分组。
+"""
+
+import logging
+import os
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from .base_tool import (
+    CONCURRENCY_READ_ONLY,
+    TOOL_GROUP_CODE,
+    TOOL_GROUP_KEYBOARD,
+    TOOL_GROUP_META,
+    TOOL_GROUP_MOUSE,
+    TOOL_GROUP_SCREEN,
+    TOOL_GROUP_WINDOW,
+    FunctionTool,
+)
+from .tools_registry import ToolsRegistry
+
+# 始终启用的分组
+BASE_GROUPS = (TOOL_GROUP_CODE, TOOL_GROUP_META)
+
+# 任务中出现这些关键词时启用对应分组
+GROUP_KEYWORDS = {
+    TOOL_GROUP_MOUSE: ["点击", "单击", "双击", "右键", "鼠标", "拖拽", "拖动", "滚动", "click", "mouse", "drag", "scroll"],
+    TOOL_GROUP_KEYBOARD: ["输入", "键盘", "按键", "快捷键", "打字", "keyboard", "hotkey", "type text", "type into"],
+    TOOL_GROUP_SCREEN: ["截图", "截屏", "屏幕", "screenshot", "screen"],
+    TOOL_GROUP_WINDOW: ["窗口", "最大化", "最小化", "置顶", "window"],
+}
+
+ALL_GROUPS = "all"
+
+
+class ToolSelection:
+    """
+    一个任务当前启用的工具分组
+
+    Args:
+        registry: 工具注册中心
+        groups: 启用的分组，None表示全部
+    """
+
+    def __init__(self, registry: ToolsRegistry, groups: Optional[Iterable[str]] = None):
+        self.registry = registry
+        self.groups: Optional[Set[str]] = None if groups is None else set(groups)
+        self.tokens_saved = 0
+
+    def expand(self, groups: Iterable[str]) -> List[str]:
+        """启用更多分组（包含"all"时启用全部），返回新启用的分组"""
+        groups = list(groups)
+        if self.groups is None:
+            return []
+        if ALL_GROUPS in groups:
+            added = [g for g in self.registry.get_group_names() if g not in self.groups]
+            self.groups = None
+            return added
+        known = set(self.registry.get_group_names())
+        added = [g for g in dict.fromkeys(groups) if g in known and g not in self.groups]
+        self.groups.update(added)
+        return added
+
+    def get_function_schemas(self) -> List[dict]:
+        """返回当前分组的schemas，并累计相比全量节省的token数"""
+        full_tokens = self.registry.estimate_schema_tokens()
+        tokens = self.registry.estimate_schema_tokens(self.groups)
+        self.tokens_saved += full_tokens - tokens
+        return self.registry.get_function_schemas(self.groups)
+
+    def describe(self) -> str:
+        """当前启用情况，用于日志"""
+        full_tokens = self.registry.estimate_schema_tokens()
+        tokens = self.registry.estimate_schema_tokens(self.groups)
+        groups = "全部" if self.groups is None else ",".join(sorted(self.groups))
+        return f"工具分组[{groups}] 约{tokens}/{full_tokens} tokens"
+
+
+class ToolSelector:
+    """
+    按任务选择工具分组
+
+    Args:
+        registry: 工具注册中心
+        enabled: 是否启用子集选择，默认读取ARGUS_TOOL_SELECTION（0表示总是下发全部工具）
+    """
+
+    def __init__(self, registry: ToolsRegistry, enabled: Optional[bool] = None):
+        self.registry = registry
+        if enabled is None:
+            enabled = os.getenv("ARGUS_TOOL_SELECTION", "1") != "0"
+        self.enabled = enabled
+
+    def select(self, task: str, route: Optional[Tuple[str, float]] = None) -> ToolSelection:
+        """
+        Args:
+            task: 任务描述
+            route: 路由器的判断结果(agent_type, confidence)，可选
+        """
+        if not self.enabled:
+            return ToolSelection(self.registry)
+        # 路由判定为GUI任务却交给CodeAgent（GUIAgent失败后的回退），桌面工具很可能都需要
+        if route is not None and route[0] == "gui":
+            return ToolSelection(self.registry)
+
+        task_lower = task.lower()
+        groups = set(BASE_GROUPS)
+        for group, keywords in GROUP_KEYWORDS.items():
+            if any(keyword in task_lower for keyword in keywords):
+                groups.add(group)
+        # 鼠标键盘操作通常要先定位窗口或看屏幕
+        if groups & {TOOL_GROUP_MOUSE, TOOL_GROUP_KEYBOARD}:
+            groups.update((TOOL_GROUP_SCREEN, TOOL_GROUP_WINDOW))
+        logging.info(f"[ToolSelector] 任务选择分组: {sorted(groups)}")
+        return ToolSelection(self.registry, groups)
+
+
+def create_tool_selection_tools(
+    registry: ToolsRegistry,
+    get_selection: Callable[[], Optional[ToolSelection]]
+) -> List[FunctionTool]:
+    """创建按需申请更多工具的request_tools工具"""
+
+    def request_tools(groups: List[str], reason: str = ""):
+        selection = get_selection()
+        if selection is None:
+            return {"success": False, "error": "当前没有进行中的任务"}
+        if isinstance(groups, str):
+            groups = [groups]
+        added = selection.expand(groups)
+        logging.info(f"[ToolSelector] 申请工具分组 {groups}（{reason}），新启用: {added}")
+        return {
+            "success": True,
+            "enabled_groups": added,
+            "message": "已启用，下一轮即可调用这些工具" if added else "这些分组已经可用",
+        }
+
+    group_names = [g for g in registry.get_group_names() if g != TOOL_GROUP_META]
+    return [FunctionTool(
+        name="request_tools",
+        description=(
+            "当前只提供了与任务相关的部分工具。需要未提供的工具时调用此工具启用对应分组，"
+            f"可选分组: {', '.join(group_names)}；传入\"{ALL_GROUPS}\"启用全部工具"
+        ),
+        parameters_schema={
+            "type": "object",
+            "properties": {
+                "groups": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": group_names + [ALL_GROUPS]},
+                    "description": "要启用的工具分组",
+                },
+                "reason": {
+                    "type": "string",
+                    "description": "需要这些工具的原因",
+                },
+            },
+            "required": ["groups"],
+        },
+        execute_func=request_tools,
+        concurrency=CONCURRENCY_READ_ONLY,
+        invalidates=(),
+        group=TOOL_GROUP_META,
+    )]
@@ -3,11 +3,34 @@
 负责管理所有工具、生成function schemas、路由工具调用
 """
 
+import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from .base_tool import BaseTool
+from .base_tool import (
+    CACHE_TAG_DESKTOP,
+    CONCURRENCY_DESKTOP,
+    CONCURRENCY_EXECUTOR,
+    CONCURRENCY_READ_ONLY,
+    BaseTool,
+)
+from .tool_cache import ToolResultCache
+
+# 所有注册中心共享的桌面锁（只有一个桌面）
+_DESKTOP_LOCK = threading.Lock()
+# 所有注册中心，改变桌面的操作需要使每个注册中心中依赖桌面的缓存失效
+_REGISTRIES: "weakref.WeakSet[ToolsRegistry]" = weakref.WeakSet()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：ASCII约4个字符一个token，中文等非ASCII字符约一个字符一个token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
 
 
 class ToolsRegistry:
@@ -15,27 +38,51 @@ class ToolsRegistry:
     工具注册中心，管理所有可用工具
     """
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 8, cache_entries: int = 128):
         self.tools: Dict[str, BaseTool] = {}
+        self.cache = ToolResultCache(max_entries=cache_entries)
         self.logger = logging.getLogger("ToolsRegistry")
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 桌面是全局独占资源，跨会话、跨注册中心也需要串行
+        self._desktop_lock = _DESKTOP_LOCK
+        # 工具名 -> (function schema, 估算的token数)，注册变化时清空
+        self._schema_cache: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        _REGISTRIES.add(self)
+    
+    def derive(self) -> "ToolsRegistry":
+        """
+        派生一个共享工具实例和结果缓存的注册中心
+        
+        在派生的注册中心中注册的工具（如绑定到某个Agent的工具）不会出现在原注册中心里
+        """
+        registry = ToolsRegistry(max_workers=self.max_workers)
+        registry.tools = dict(self.tools)
+        registry.cache = self.cache
+        return registry
     
-    def register(self, tool: BaseTool) -> None:
+    def register(self, tool: BaseTool, group: Optional[str] = None) -> None:
         """
         注册一个工具
         
         Args:
             tool: 要注册的工具实例
+            group: 工具分组，不指定时使用工具自身的分组
         """
         if tool.name in self.tools:
             self.logger.warning(f"工具 {tool.name} 已存在，将被覆盖")
         
+        if group:
+            tool.group = group
         self.tools[tool.name] = tool
+        self._schema_cache.pop(tool.name, None)
         self.logger.info(f"已注册工具: {tool.name}")
     
-    def register_multiple(self, tools: List[BaseTool]) -> None:
+    def register_multiple(self, tools: List[BaseTool], group: Optional[str] = None) -> None:
         """批量注册工具"""
         for tool in tools:
-            self.register(tool)
+            self.register(tool, group)
     
     def unregister(self, tool_name: str) -> bool:
         """
@@ -49,6 +96,7 @@ class ToolsRegistry:
         """
         if tool_name in self.tools:
             del self.tools[tool_name]
+            self._schema_cache.pop(tool_name, None)
             self.logger.info(f"已注销工具: {tool_name}")
             return True
         return False
@@ -65,14 +113,39 @@ class ToolsRegistry:
         """获取所有工具名称"""
         return list(self.tools.keys())
     
-    def get_function_schemas(self) -> List[Dict[str, Any]]:
+    def get_group_names(self) -> List[str]:
+        """获取所有工具分组（按注册顺序）"""
+        return list(dict.fromkeys(tool.group for tool in self.tools.values()))
+    
+    def get_function_schemas(self, groups: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
         """
-        获取所有工具的OpenAI function schemas
+        获取工具的OpenAI function schemas
         
+        Args:
+            groups: 只返回这些分组的工具，None表示全部
+            
         Returns:
             OpenAI tools格式的schema列表
         """
-        return [tool.to_function_schema() for tool in self.tools.values()]
+        return [self._cached_schema(tool)[0] for tool in self._tools_in(groups)]
+    
+    def estimate_schema_tokens(self, groups: Optional[Iterable[str]] = None) -> int:
+        """估算指定分组的schemas在prompt中占用的token数"""
+        return sum(self._cached_schema(tool)[1] for tool in self._tools_in(groups))
+    
+    def _tools_in(self, groups: Optional[Iterable[str]]) -> List[BaseTool]:
+        if groups is None:
+            return list(self.tools.values())
+        groups = set(groups)
+        return [tool for tool in self.tools.values() if tool.group in groups]
+    
+    def _cached_schema(self, tool: BaseTool) -> Tuple[Dict[str, Any], int]:
+        cached = self._schema_cache.get(tool.name)
+        if cached is None:
+            schema = tool.to_function_schema()
+            cached = (schema, estimate_tokens(json.dumps(schema, ensure_ascii=False)))
+            self._schema_cache[tool.name] = cached
+        return cached
     
     def execute_tool_call(
         self,
@@ -107,13 +180,30 @@ class ToolsRegistry:
                 "tool_name": tool_name
             }
         
+        # 可缓存的幂等工具优先使用缓存结果
+        cache_key = None
+        if tool.cache_ttl:
+            cache_key = self.cache.make_key(tool_name, parameters, tool.get_cache_version())
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"工具 {tool_name} 命中缓存")
+                return {**cached, "cached": True}
+        
         # 执行工具
         try:
-            result = tool.execute(**parameters)
+            if tool.concurrency == CONCURRENCY_DESKTOP:
+                with self._desktop_lock:
+                    result = tool.execute(**parameters)
+            else:
+                result = tool.execute(**parameters)
             self.logger.info(f"工具 {tool_name} 执行成功")
+            self.invalidate_cache(*tool.invalidates)
+            if cache_key is not None and result.get("success"):
+                self.cache.put(cache_key, result, tool.cache_ttl, tool.invalidated_by)
             return result
         except Exception as e:
             self.logger.error(f"工具 {tool_name} 执行失败: {e}", exc_info=True)
+            self.invalidate_cache(*tool.invalidates)
             return {
                 "success": False,
                 "error": str(e),
@@ -121,6 +211,24 @@ class ToolsRegistry:
                 "tool_name": tool_name
             }
     
+    def invalidate_cache(self, *tags: str) -> None:
+        """
+        使依赖指定状态的缓存结果失效
+        
+        不经过注册中心直接操作桌面的调用方（如GUIAgent）执行动作后也应调用此方法；
+        桌面只有一个，desktop标签在所有注册中心中失效
+        """
+        if not tags:
+            return
+        registries = list(_REGISTRIES) if CACHE_TAG_DESKTOP in tags else [self]
+        for registry in registries:
+            if registry.cache.invalidate(tags):
+                registry.logger.debug(f"缓存失效: {', '.join(tags)}")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取工具结果缓存的命中统计"""
+        return {"cache": self.cache.get_metrics()}
+    
     def execute_tool_calls(
         self,
         tool_calls: List[Dict[str, Any]]
@@ -128,43 +236,106 @@ class ToolsRegistry:
         """
         批量执行工具调用（OpenAI格式）
         
+        互不冲突的调用在线程池中并行执行，冲突的调用按原顺序串行：
+        - read_only: 等待之前的desktop调用
+        - desktop: 等待之前的所有read_only和desktop调用
+        - executor: 等待之前资源标识相同的executor调用
+        
         Args:
             tool_calls: OpenAI格式的tool_calls列表
             
         Returns:
-            执行结果列表（按顺序）
+            执行结果列表（按原顺序），每项包含耗时elapsed_ms
         """
-        results = []
+        prepared = [self._prepare_tool_call(tool_call) for tool_call in tool_calls]
+        runnable = [item for item in prepared if "result" not in item]
         
-        for tool_call in tool_calls:
-            tool_call_id = tool_call.get("id")
-            function_info = tool_call.get("function", {})
-            function_name = function_info.get("name")
-            
-            # 解析参数
-            try:
-                if isinstance(function_info.get("arguments"), str):
-                    parameters = json.loads(function_info.get("arguments", "{}"))
-                else:
-                    parameters = function_info.get("arguments", {})
-            except json.JSONDecodeError as e:
-                results.append({
-                    "tool_call_id": tool_call_id,
-                    "function_name": function_name,
-                    "success": False,
-                    "error": f"参数解析失败: {e}"
-                })
-                continue
-            
-            # 执行工具
-            result = self.execute_tool_call(function_name, parameters)
-            results.append({
-                "tool_call_id": tool_call_id,
-                "function_name": function_name,
-                **result
-            })
+        if len(runnable) <= 1:
+            for item in runnable:
+                item["result"] = self._timed_call(item["function_name"], item["parameters"])
+            return [self._format_result(item, item["result"]) for item in prepared]
+        
+        batch = ToolCallBatch(self)
+        for item in prepared:
+            batch.add(item)
+        return batch.results()
+    
+    def start_batch(self) -> "ToolCallBatch":
+        """
+        开始一批逐个提交的工具调用
         
-        return results
+        用于流式响应：每个调用的参数生成完毕即可提交执行，无需等待整个响应结束
+        """
+        return ToolCallBatch(self)
+    
+    @staticmethod
+    def _format_result(item: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "tool_call_id": item["tool_call_id"],
+            "function_name": item["function_name"],
+            **result
+        }
+    
+    def _prepare_tool_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """解析参数并确定并发类别"""
+        function_info = tool_call.get("function", {})
+        item = {
+            "tool_call_id": tool_call.get("id"),
+            "function_name": function_info.get("name"),
+        }
+        
+        # 解析参数
+        try:
+            if isinstance(function_info.get("arguments"), str):
+                parameters = json.loads(function_info.get("arguments") or "{}")
+            else:
+                parameters = function_info.get("arguments", {})
+        except json.JSONDecodeError as e:
+            item["result"] = {"success": False, "error": f"参数解析失败: {e}"}
+            return item
+        
+        tool = self.get_tool(item["function_name"])
+        item["parameters"] = parameters
+        item["concurrency"], item["resource_key"] = self._concurrency_of(tool, parameters)
+        return item
+    
+    @staticmethod
+    def _concurrency_of(tool: Optional[BaseTool], parameters: Dict[str, Any]) -> Tuple[str, str]:
+        if tool is None:
+            return CONCURRENCY_READ_ONLY, ""
+        if tool.concurrency == CONCURRENCY_EXECUTOR:
+            return CONCURRENCY_EXECUTOR, tool.get_resource_key(parameters)
+        if tool.concurrency == CONCURRENCY_READ_ONLY:
+            return CONCURRENCY_READ_ONLY, ""
+        return CONCURRENCY_DESKTOP, ""
+    
+    @staticmethod
+    def _conflicts(earlier: Dict[str, Any], later: Dict[str, Any]) -> bool:
+        """判断later是否必须等待earlier执行完成"""
+        a, b = earlier["concurrency"], later["concurrency"]
+        if a == CONCURRENCY_EXECUTOR or b == CONCURRENCY_EXECUTOR:
+            return a == b and earlier["resource_key"] == later["resource_key"]
+        return a == CONCURRENCY_DESKTOP or b == CONCURRENCY_DESKTOP
+    
+    def _run_after(self, deps: List[Future], item: Dict[str, Any]) -> Dict[str, Any]:
+        for dep in deps:
+            dep.result()
+        return self._timed_call(item["function_name"], item["parameters"])
+    
+    def _timed_call(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = self.execute_tool_call(tool_name, parameters)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return {**result, "elapsed_ms": elapsed_ms}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="tool-call"
+                )
+            return self._executor
     
     def get_tools_summary(self) -> str:
         """
@@ -179,6 +350,61 @@ class ToolsRegistry:
         return "\n".join(summary_lines)
 
 
+class ToolCallBatch:
+    """
+    同一轮对话中的一批工具调用
+    
+    调用在提交时立即开始执行，冲突规则与execute_tool_calls相同：
+    只等待之前提交的冲突调用，结果按提交顺序返回
+    """
+    
+    def __init__(self, registry: ToolsRegistry):
+        self.registry = registry
+        self._items: List[Dict[str, Any]] = []
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+    
+    def submit(self, tool_call: Dict[str, Any]) -> Future:
+        """提交一个OpenAI格式的tool_call，返回结果Future"""
+        return self.add(self.registry._prepare_tool_call(tool_call))
+    
+    def add(self, item: Dict[str, Any]) -> Future:
+        with self._lock:
+            if "result" in item:
+                future: Future = Future()
+                future.set_result(item["result"])
+            else:
+                deps = [
+                    earlier_future
+                    for earlier, earlier_future in zip(self._items, self._futures)
+                    if "result" not in earlier and self.registry._conflicts(earlier, item)
+                ]
+                future = self.registry._get_executor().submit(self.registry._run_after, deps, item)
+            self._items.append(item)
+            self._futures.append(future)
+            return future
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def results(self) -> List[Dict[str, Any]]:
+        """等待所有已提交的调用完成，按提交顺序返回结果"""
+        with self._lock:
+            pending = list(zip(self._items, self._futures))
+        return [self.registry._format_result(item, future.result()) for item, future in pending]
+
+    async def aresults(self) -> List[Dict[str, Any]]:
+        """
+        results()的asyncio版本，等待时不占用线程
+
+        等待被取消时，尚未开始执行的调用一并取消
+        """
+        with self._lock:
+            pending = list(zip(self._items, self._futures))
+        outputs = await asyncio.gather(*(asyncio.wrap_future(future) for _, future in pending))
+        return [self.registry._format_result(item, output) for (item, _), output in zip(pending, outputs)]
+
+
 # 全局工具注册中心实例
 _global_registry = ToolsRegistry()
 
@@ -7,7 +7,7 @@ import logging
 import sys
 from typing import Any, Dict, List, Optional
 
-from ..base_tool import FunctionTool
+from ..base_tool import CACHE_TAG_DESKTOP, CONCURRENCY_READ_ONLY, FunctionTool
 
 # Windows平台特定导入
 try:
@@ -377,7 +377,10 @@ def create_window_tools():
             "properties": {},
             "required": []
         },
-        execute_func=lambda: _window_manager.list_windows()
+        execute_func=lambda: _window_manager.list_windows(),
+        concurrency=CONCURRENCY_READ_ONLY,
+        cache_ttl=2.0,
+        invalidated_by=(CACHE_TAG_DESKTOP,)
     )
     tools.append(list_tool)
     
@@ -395,7 +398,10 @@ def create_window_tools():
             },
             "required": ["title"]
         },
-        execute_func=lambda title: _window_manager.get_window_info(title)
+        execute_func=lambda title: _window_manager.get_window_info(title),
+        concurrency=CONCURRENCY_READ_ONLY,
+        cache_ttl=2.0,
+        invalidated_by=(CACHE_TAG_DESKTOP,)
     )
     tools.append(info_tool)
     
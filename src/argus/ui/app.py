@@ -473,6 +473,7 @@ class LiquidBar(JellyBaseWindow):
         if ROUTER_AVAILABLE:
             try:
                 self.router = get_router()
+                self.router.prewarm()
             except:
                 self.status.configure(text_color=CURRENT_THEME["accent_red"])
         if VISUALIZER_AVAILABLE:
@@ -724,6 +725,13 @@ def start_gui_app():
 
     key = os.getenv("GUIAgent_API_KEY")
 
+    # 欢迎动画期间在后台预热Agent，主控条打开后的第一个任务无需等待初始化
+    if key and ROUTER_AVAILABLE:
+        try:
+            get_router().prewarm()
+        except Exception as e:
+            print(f"后台预热失败: {e}")
+
     if not key:
         welcome = WelcomeWindow(on_next=launch_guide)
         welcome.mainloop()
@@ -0,0 +1,28 @@
+"""批量执行和会话运行时测试共用的假Agent记忆和路由器"""
+
+
+class FakeMemory:
+    def clear_short_term(self):
+        pass
+
+
+class FakeRouter:
+    """按关键词路由（含"点击"的任务走GUIAgent），记录预热和路由结果"""
+
+    def __init__(self, gui_agent):
+        self.gui_agent = gui_agent
+        self.outcomes = []
+        self.warmed = []
+
+    def warm_candidates(self, task, targets):
+        self.warmed.append(task)
+        return ("gui", 0.9) if "点击" in task else ("code", 0.9), None
+
+    def get_gui_agent(self):
+        return self.gui_agent
+
+    def record_outcome(self, task, agent_type, success, latency):
+        self.outcomes.append((task, agent_type, success))
+
+    def is_success(self, result):
+        return isinstance(result, str) and ("任务结束" in result or "finished" in result)
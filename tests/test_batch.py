@@ -0,0 +1,74 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from fakes import FakeMemory, FakeRouter
+
+from argus.batch import BatchRunner, completed_ids, load_tasks
+
+
+class FakeAgent:
+    def __init__(self, active, fail_on=()):
+        self.memory = FakeMemory()
+        self.active = active
+        self.fail_on = fail_on
+
+    def task(self, description, message_from_client, message_to_client, **kwargs):
+        with self.active["lock"]:
+            self.active["now"] += 1
+            self.active["max"] = max(self.active["max"], self.active["now"])
+        time.sleep(0.05)
+        with self.active["lock"]:
+            self.active["now"] -= 1
+        if description in self.fail_on:
+            message_to_client.put({"name": "CodeAgent", "type": "status", "content": "[ERROR]"})
+            message_to_client.put({"name": "CodeAgent", "type": "text", "content": "错误: boom"})
+        return "任务结束"
+
+
+def counter():
+    return {"lock": threading.Lock(), "now": 0, "max": 0}
+
+
+def test_load_tasks_accepts_objects_and_plain_lines():
+    tasks = load_tasks(['{"id": "a", "task": "计算1+1", "agent": "code"}', "", "# 注释", "打开记事本"])
+    assert [(t.id, t.task, t.agent) for t in tasks] == [("a", "计算1+1", "code"), ("line-4", "打开记事本", None)]
+    with pytest.raises(ValueError):
+        load_tasks(['{"id": "a", "task": "x"}', '{"id": "a", "task": "y"}'])
+
+
+def test_code_tasks_run_concurrently_and_gui_tasks_serially():
+    code_active, gui_active = counter(), counter()
+    router = FakeRouter(FakeAgent(gui_active))
+    tasks = load_tasks([f"计算第{i}个" for i in range(6)] + [f"点击第{i}个按钮" for i in range(3)])
+    output = io.StringIO()
+    runner = BatchRunner(router, workers=3, code_agent_factory=lambda: FakeAgent(code_active))
+    summary = runner.run(tasks, output)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert summary["success"] == 9 and len(records) == 9
+    assert code_active["max"] > 1
+    assert gui_active["max"] == 1
+    assert {r["agent"] for r in records if "点击" in r["task"]} == {"gui"}
+
+
+def test_failed_task_falls_back_and_resume_skips_finished(tmp_path):
+    router = FakeRouter(FakeAgent(counter()))
+    code_agent = FakeAgent(counter(), fail_on=("计算失败的任务",))
+    tasks = load_tasks(['{"id": "bad", "task": "计算失败的任务"}', '{"id": "forced", "task": "计算失败的任务", "agent": "code"}'])
+    path = tmp_path / "out.jsonl"
+    with open(path, "w", encoding="utf-8") as output:
+        BatchRunner(router, workers=1, code_agent_factory=lambda: code_agent).run(tasks, output)
+
+    records = {r["id"]: r for r in map(json.loads, path.read_text(encoding="utf-8").splitlines())}
+    assert records["bad"]["status"] == "success"
+    assert [a["agent"] for a in records["bad"]["attempts"]] == ["code", "gui"]
+    assert records["forced"]["status"] == "failed"
+    assert records["forced"]["error"] == "错误: boom"
+    assert ("计算失败的任务", "code", False) in router.outcomes
+
+    assert completed_ids(str(path)) == {"bad", "forced"}
+    summary = BatchRunner(router, code_agent_factory=lambda: code_agent).run(tasks, io.StringIO(), completed_ids(str(path)))
+    assert summary["skipped"] == 2 and summary["success"] == summary["failed"] == 0
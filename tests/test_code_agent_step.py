@@ -0,0 +1,114 @@
+import asyncio
+import json
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+from argus.agents.agent_memory.memory import MemoryManager
+from argus.agents.code_agent.agent import CodeAgent
+from argus.llm import LLMEndpoint, ModelCascade
+from argus.tools.base_tool import FunctionTool
+from argus.tools.tools_registry import ToolsRegistry
+
+
+def _text(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))])
+
+
+def _call(index, name, arguments="{}"):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    tool_call = SimpleNamespace(index=index, id=f"call_{name}", function=function)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[tool_call]))])
+
+
+class FakeLLM:
+    """按顺序返回预设的数据块，遇到异常实例时在流中抛出"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def _stream(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def completion(self, endpoint, messages, **kwargs):
+        return self._stream()
+
+    async def acompletion(self, endpoint, messages, **kwargs):
+        async def stream():
+            for chunk in self._stream():
+                yield chunk
+
+        return stream()
+
+
+def make_agent(tmp_path, chunks):
+    ran = []
+    registry = ToolsRegistry()
+    for name in ("first", "second"):
+        registry.register(FunctionTool(
+            name=name,
+            description=name,
+            parameters_schema={"type": "object", "properties": {}},
+            execute_func=lambda name=name: ran.append(name) or {"success": True, "tool": name},
+        ))
+
+    # 不初始化桌面工具，只设置生成一步所需的属性
+    agent = CodeAgent.__new__(CodeAgent)
+    agent.tools_registry = registry
+    agent.loop_breakers = ["The task is done."]
+    agent.stop_agent = False
+    agent.llm = FakeLLM(chunks)
+    agent.cascade = ModelCascade(LLMEndpoint("big"), name="CodeAgent")
+    agent.memory = MemoryManager(agent_name="Test", save_dir=str(tmp_path), model="gpt-4o")
+    agent.SYSTEM_PROMPT_END = ""
+    agent.vision = False
+    return agent, ran
+
+
+def _generate(agent):
+    step = agent.cascade.begin([], easy=False)
+    return agent._generate_step(step, [], agent.tools_registry.get_function_schemas(), Queue())
+
+
+def _recorded(agent):
+    calls = [tc["function"]["name"] for msg in agent.memory.history for tc in msg.tool_calls or []]
+    results = [json.loads(msg.content)["tool"] for msg in agent.memory.history if msg.role == "tool"]
+    return calls, results
+
+
+def test_dispatched_calls_are_recorded_when_stream_fails(tmp_path):
+    agent, ran = make_agent(tmp_path, [_call(0, "first"), _call(1, "second", "{"), RuntimeError("connection reset")])
+    with pytest.raises(RuntimeError):
+        _generate(agent)
+    # second的参数在流中断时还不完整，不会被执行
+    assert ran == ["first"]
+    assert _recorded(agent) == (["first"], ["first"])
+
+
+def test_dispatched_calls_are_recorded_when_async_stream_fails(tmp_path):
+    agent, ran = make_agent(tmp_path, [_call(0, "first"), _call(1, "second", "{"), RuntimeError("connection reset")])
+    step = agent.cascade.begin([], easy=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(agent._agenerate_step(step, [], agent.tools_registry.get_function_schemas(), Queue()))
+    assert _recorded(agent) == (["first"], ["first"])
+
+
+def test_tools_after_loop_breaker_are_not_run(tmp_path):
+    agent, ran = make_agent(tmp_path, [_text("The task is done."), _call(0, "first")])
+    step, content, tool_calls_list, batch = _generate(agent)
+    assert tool_calls_list == [] and len(batch) == 0
+    assert agent._finish_iteration(step, content, tool_calls_list, [], Queue())
+    assert ran == [] and agent.memory.history[-1].content == "The task is done."
+
+
+def test_calls_dispatched_before_loop_breaker_are_kept(tmp_path):
+    agent, ran = make_agent(tmp_path, [_call(0, "first"), _call(1, "second", "{"), _text("The task is done.")])
+    step, content, tool_calls_list, batch = _generate(agent)
+    # second在结束语之后才由流结束确认完整，不再执行
+    assert [tc["function"]["name"] for tc in tool_calls_list] == ["first"]
+    assert agent._finish_iteration(step, content, tool_calls_list, batch.results(), Queue())
+    assert ran == ["first"]
@@ -0,0 +1,155 @@
+import os
+import shutil
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import pytest
+
+from argus.tools.code.languages import BashLanguage, PowerShellLanguage
+from argus.tools.code.limits import (
+    LIMIT_CPU_TIME,
+    LIMIT_MEMORY,
+    LIMIT_WALL_TIME,
+    ExecutionLimits,
+    process_quota,
+    user_task_count,
+)
+
+posix_only = pytest.mark.skipif(resource is None, reason="rlimit requires POSIX")
+requires_bash = pytest.mark.skipif(
+    sys.platform == "win32" or shutil.which("bash") is None, reason="requires bash"
+)
+
+MB = 1024 * 1024
+# 默认限制只有墙钟时间和输出字节数，不设置rlimit
+UNLIMITED = ExecutionLimits()
+ALLOCATE = "b = bytearray(300 * 1024 * 1024)\nprint(len(b) // (1024 * 1024))\ndel b"
+SOFT_AS = "import resource\nprint(resource.getrlimit(resource.RLIMIT_AS)[0])"
+BURN_CPU = "import time\nend = time.process_time() + 1.5\nwhile time.process_time() < end:\n    pass\nprint('done')"
+
+
+def _run(language, code, limits=UNLIMITED):
+    execution = language.run(code, limits)
+    output = "".join(msg["content"] for msg in execution if msg["type"] in ("text", "error"))
+    return output, execution
+
+
+@pytest.fixture(params=["jupyter", "fork"])
+def python(request):
+    pytest.importorskip("jupyter_client")
+    from argus.tools.code.languages import ForkPythonLanguage, PythonLanguage
+
+    if request.param == "fork":
+        if not ForkPythonLanguage.is_available():
+            pytest.skip("forkserver requires os.fork")
+        language = ForkPythonLanguage(preload=[])
+    else:
+        language = PythonLanguage()
+    yield language
+    language.stop()
+
+
+@posix_only
+def test_python_memory_limit_does_not_leak_into_next_run(python):
+    output, execution = _run(python, ALLOCATE, ExecutionLimits(memory_bytes=100 * MB))
+    assert "MemoryError" in output
+    assert execution.violation["limit"] == LIMIT_MEMORY
+
+    output, execution = _run(python, ALLOCATE)
+    assert output == "300\n" and execution.violation is None
+
+
+@posix_only
+def test_python_memory_limit_is_restored_after_interrupt(python):
+    # 先启动内核/server，墙钟时间只计算被中断的这次执行
+    _run(python, "x = 1")
+    limits = ExecutionLimits(memory_bytes=100 * MB, wall_time=0.5, grace_period=5)
+    output, execution = _run(python, "import time\ntime.sleep(30)", limits)
+    assert execution.violation["limit"] == LIMIT_WALL_TIME and "KeyboardInterrupt" in output
+    assert _run(python, "print(x)")[0] == "1\n"
+    assert _run(python, ALLOCATE)[0] == "300\n"
+    # 内核/server的软限制恢复为启动时（从当前进程继承）的值
+    assert _run(python, SOFT_AS)[0] == f"{resource.getrlimit(resource.RLIMIT_AS)[0]}\n"
+
+
+@posix_only
+def test_python_cpu_limit_kills_runaway_code_only(python):
+    output, execution = _run(python, "while True:\n    pass", ExecutionLimits(cpu_time=1, wall_time=30))
+    assert execution.violation["limit"] == LIMIT_CPU_TIME
+
+    # 之后不受限的执行可以用满更多CPU时间
+    output, execution = _run(python, BURN_CPU)
+    assert output.endswith("done\n") and execution.violation is None
+
+
+@posix_only
+def test_python_crash_is_not_reported_as_cpu_violation(python):
+    _, execution = _run(python, "import os\nos._exit(3)", ExecutionLimits(cpu_time=5))
+    assert execution.violation is None
+
+
+@pytest.fixture
+def bash():
+    language = BashLanguage()
+    yield language
+    language.stop()
+
+
+@requires_bash
+def test_bash_cpu_limit_covers_only_the_current_script(bash):
+    _run(bash, "x=1")
+    pid = bash.session.process.pid
+    # 会话中之前执行用掉的CPU时间不计入后续受限执行
+    _run(bash, "end=$((SECONDS + 2)); while (( SECONDS < end )); do :; done")
+    output, execution = _run(bash, "echo ok", ExecutionLimits(cpu_time=1))
+    assert output.startswith("ok\n") and execution.exit_code == 0
+
+    output, execution = _run(bash, "while :; do :; done", ExecutionLimits(cpu_time=1, wall_time=30))
+    assert execution.violation["limit"] == LIMIT_CPU_TIME
+    assert bash.session.process.pid == pid
+    assert _run(bash, "echo $x; ulimit -S -t")[0].startswith("1\nunlimited\n")
+
+
+@requires_bash
+def test_bash_memory_limit_is_not_kept_by_session(bash):
+    python = f"'{sys.executable}' -c '{ALLOCATE}'".replace("\n", "; ")
+    output, execution = _run(bash, python, ExecutionLimits(memory_bytes=100 * MB))
+    assert "MemoryError" in output and execution.exit_code == 1
+    output, execution = _run(bash, python)
+    assert output.startswith("300\n") and execution.exit_code == 0
+
+
+@requires_bash
+@pytest.mark.skipif(
+    hasattr(os, "geteuid") and os.geteuid() == 0,
+    reason="RLIMIT_NPROC is a per-user process cap and root is exempt from it",
+)
+def test_bash_process_limit_is_not_kept_by_session(bash):
+    _, execution = _run(bash, "for i in $(seq 1 64); do sleep 1 & done; wait", ExecutionLimits(max_processes=1))
+    assert execution.exit_code != 0
+    assert _run(bash, "ulimit -S -u")[0].split()[0] != "1"
+
+
+@pytest.mark.skipif(not PowerShellLanguage().is_available(), reason="requires PowerShell")
+def test_powershell_wall_time_applies_to_one_run():
+    language = PowerShellLanguage()
+    try:
+        _, execution = _run(language, "Start-Sleep -Seconds 30", ExecutionLimits(wall_time=1, grace_period=2))
+        assert execution.violation["limit"] == LIMIT_WALL_TIME
+        output, execution = _run(language, "Start-Sleep -Seconds 2; Write-Output ok", ExecutionLimits(wall_time=10))
+        assert output.startswith("ok") and execution.violation is None
+    finally:
+        language.stop()
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+def test_process_quota_adds_the_limit_to_the_users_current_tasks():
+    # RLIMIT_NPROC统计该用户的全部进程和线程，限额加在已有数量之上
+    current = user_task_count()
+    assert current >= 1
+    assert process_quota(ExecutionLimits(max_processes=10)) > 10
+    assert process_quota(UNLIMITED) == 0
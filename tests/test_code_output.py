@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from argus.tools.code.output_buffer import OutputBuffer, OutputStore
+
+requires_bash = pytest.mark.skipif(
+    sys.platform == "win32" or shutil.which("bash") is None, reason="requires bash"
+)
+
+
+def test_buffer_keeps_head_and_tail_and_spills_to_file():
+    buffer = OutputBuffer(head_bytes=10, tail_bytes=10, memory_bytes=100)
+    text = "".join(f"{i:04d}\n" for i in range(100))
+    for start in range(0, len(text), 7):
+        buffer.write(text[start:start + 7])
+    assert buffer.total_bytes == len(text) and buffer.truncated
+    assert buffer.path is not None
+    excerpt = buffer.excerpt()
+    assert excerpt.startswith(text[:10]) and excerpt.endswith(text[-10:])
+    assert f"省略 {len(text) - 20} 字节" in excerpt
+
+    page = buffer.read(offset=5, length=10)
+    assert page["content"] == text[5:15] and page["next_offset"] == 15 and not page["eof"]
+    assert buffer.read(offset=len(text) - 5)["eof"]
+    path = buffer.path
+    buffer.close()
+    assert not os.path.exists(path)
+
+
+def test_store_evicts_oldest_buffers():
+    store = OutputStore(max_entries=2)
+    buffers = [OutputBuffer() for _ in range(3)]
+    for buffer in buffers:
+        store.add(buffer)
+    assert store.get(buffers[0].output_id) is None
+    assert store.get(buffers[2].output_id) is buffers[2]
+
+
+@pytest.fixture
+def code_tools(monkeypatch):
+    pytest.importorskip("jupyter_client")
+    monkeypatch.setenv("ARGUS_KERNEL_POOL_SIZE", "0")
+    from argus.tools.code import kernel_pool
+    from argus.tools.code.code import create_code_tools
+
+    monkeypatch.setattr(kernel_pool, "_pool", None)
+    tools, executor = create_code_tools()
+    yield {tool.name: tool.execute for tool in tools}
+    executor.shutdown()
+
+
+@requires_bash
+def test_execute_code_result_shape(code_tools):
+    result = code_tools["execute_code"](language="bash", code="echo hi; false")
+    assert result == {
+        "success": True,
+        "language": "bash",
+        "output": "hi\nReturn code: 1\n",
+        "output_bytes": len("hi\nReturn code: 1\n"),
+        "exit_code": 1,
+    }
+
+    result = code_tools["execute_code"](language="bash", code="sleep 30", timeout=1)
+    assert result["success"] is False and result["exit_code"] == 130
+    assert result["limit_exceeded"]["limit"] == "wall_time"
+    assert result["error"] == result["limit_exceeded"]["message"]
+
+    result = code_tools["execute_code"](language="cobol", code="")
+    assert result["success"] is False and "不支持的语言" in result["error"]
+
+
+@requires_bash
+def test_truncated_output_is_paged_by_output_id(code_tools):
+    result = code_tools["execute_code"](language="bash", code="seq 1 50000")
+    expected = "".join(f"{i}\n" for i in range(1, 50001)) + "Return code: 0\n"
+    assert result["truncated"] is True and result["output_bytes"] == len(expected)
+    assert result["output"].startswith("1\n2\n") and result["output"].endswith("Return code: 0\n")
+
+    pages = []
+    offset = 0
+    while True:
+        page = code_tools["read_code_output"](output_id=result["output_id"], offset=offset, length=65536)
+        assert page["success"] and page["total_bytes"] == len(expected)
+        pages.append(page["content"])
+        offset = page["next_offset"]
+        if page["eof"]:
+            break
+    assert "".join(pages) == expected
+
+    missing = code_tools["read_code_output"](output_id="missing")
+    assert missing["success"] is False
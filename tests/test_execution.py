@@ -0,0 +1,126 @@
+import asyncio
+import shutil
+import sys
+import time
+
+import pytest
+
+from argus.tools.code.execution import Execution
+from argus.tools.code.languages import BashLanguage
+from argus.tools.code.limits import LIMIT_OUTPUT, LIMIT_WALL_TIME, ExecutionLimits
+
+requires_bash = pytest.mark.skipif(
+    sys.platform == "win32" or shutil.which("bash") is None, reason="requires bash"
+)
+
+# 忽略SIGINT的前台程序：中断无效，只能在宽限期后强制结束
+IGNORE_SIGINT = (
+    f"'{sys.executable}' -c 'import signal, time; "
+    "signal.signal(signal.SIGINT, signal.SIG_IGN); print(\"ready\", flush=True); time.sleep(30)'"
+)
+
+
+def _text(messages):
+    return "".join(msg["content"] for msg in messages if msg["type"] == "text")
+
+
+@pytest.fixture
+def bash():
+    language = BashLanguage()
+    yield language
+    language.stop()
+
+
+def test_execution_finishes_once_and_wakes_iterators():
+    execution = Execution()
+    execution.put({"type": "text", "content": "a"})
+    execution.finish(3)
+    execution.finish(4)
+    assert list(execution) == [{"type": "text", "content": "a"}]
+    assert execution.exit_code == 3 and execution.wait(timeout=1) == 3
+
+
+@requires_bash
+def test_async_iteration_over_running_execution(bash):
+    async def main():
+        execution = bash.run("echo one; sleep 0.2; echo two", ExecutionLimits())
+        assert not execution.done.done()
+        messages = [msg async for msg in execution]
+        return execution, messages
+
+    execution, messages = asyncio.run(main())
+    assert _text(messages) == "one\ntwo\nReturn code: 0\n"
+    assert execution.done.done() and execution.exit_code == 0
+    assert execution.violation is None
+
+
+@requires_bash
+def test_wall_time_interrupts_execution(bash):
+    bash.run("x=1").wait(timeout=10)
+    started = time.time()
+    execution = bash.run("sleep 30", ExecutionLimits(wall_time=0.5, grace_period=5))
+    messages = list(execution)
+    assert time.time() - started < 4
+    assert execution.exit_code == 130
+    assert execution.violation["limit"] == LIMIT_WALL_TIME
+    assert "Return code: 130" in _text(messages)
+    # 中断只取消前台任务，会话状态保留
+    assert _text(bash.run("echo $x")) == "1\nReturn code: 0\n"
+
+
+@requires_bash
+def test_wall_time_kills_execution_that_ignores_interrupt(bash):
+    bash.run("x=1").wait(timeout=10)
+    started = time.time()
+    execution = bash.run(IGNORE_SIGINT, ExecutionLimits(wall_time=0.5, grace_period=0.5))
+    messages = list(execution)
+    assert time.time() - started < 5
+    assert "ready" in _text(messages)
+    assert execution.exit_code == -9
+    assert execution.violation["limit"] == LIMIT_WALL_TIME
+    # 会话被强制结束，下次执行在新会话中进行
+    assert _text(bash.run("echo ${x:-unset}")) == "unset\nReturn code: 0\n"
+
+
+@requires_bash
+def test_output_limit_interrupts_execution(bash):
+    execution = bash.run("yes", ExecutionLimits(output_bytes=100_000, grace_period=2))
+    messages = list(execution)
+    assert execution.violation["limit"] == LIMIT_OUTPUT
+    assert execution.exit_code == 130
+    assert execution.output_bytes > 100_000
+    assert _text(messages).startswith("y\ny\n")
+
+
+@pytest.fixture
+def python():
+    pytest.importorskip("jupyter_client")
+    from argus.tools.code.languages import PythonLanguage
+
+    language = PythonLanguage()
+    yield language
+    language.stop()
+
+
+def test_wall_time_interrupts_python_kernel(python):
+    python.run("x = 1").wait(timeout=60)
+    execution = python.run("import time\ntime.sleep(30)", ExecutionLimits(wall_time=0.5, grace_period=5))
+    messages = list(execution)
+    assert execution.exit_code == 1 and "KeyboardInterrupt" in _text(messages)
+    assert execution.violation["limit"] == LIMIT_WALL_TIME
+    assert _text(python.run("print(x)")) == "1\n"
+
+
+def test_wall_time_restarts_python_kernel_that_ignores_interrupt(python):
+    python.run("x = 1").wait(timeout=60)
+    started = time.time()
+    execution = python.run(
+        "import signal, time\nsignal.signal(signal.SIGINT, signal.SIG_IGN)\ntime.sleep(30)",
+        ExecutionLimits(wall_time=0.5, grace_period=0.5),
+    )
+    messages = list(execution)
+    assert time.time() - started < 20
+    assert execution.exit_code is None
+    assert any("aborted" in msg["content"] for msg in messages if msg["type"] == "error")
+    assert execution.violation["limit"] == LIMIT_WALL_TIME
+    assert "NameError" in _text(python.run("x"))
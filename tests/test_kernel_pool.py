@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+pytest.importorskip("jupyter_client")
+
+from argus.tools.code import kernel_pool  # noqa: E402
+from argus.tools.code.kernel_pool import KernelPool, build_preload_code, get_kernel_pool  # noqa: E402
+from argus.tools.code.languages import PythonLanguage  # noqa: E402
+
+
+def _run(language, code):
+    execution = language.run(code)
+    output = "".join(msg["content"] for msg in execution if msg["type"] in ("text", "error"))
+    return output, execution.exit_code
+
+
+@pytest.fixture
+def pool():
+    pool = KernelPool(size=1, preload=["json as js"])
+    yield pool
+    pool.shutdown()
+
+
+def test_get_kernel_pool_reads_size_and_preload_from_env(monkeypatch):
+    monkeypatch.setattr(kernel_pool.atexit, "register", lambda func: None)
+    monkeypatch.setattr(kernel_pool, "_pool", None)
+    monkeypatch.setenv("ARGUS_KERNEL_POOL_SIZE", "0")
+    assert get_kernel_pool() is None
+
+    monkeypatch.setenv("ARGUS_KERNEL_POOL_SIZE", "2")
+    monkeypatch.setenv("ARGUS_KERNEL_PRELOAD", "json as js, ,os")
+    pool = get_kernel_pool()
+    assert pool.size == 2 and pool.preload == ["json as js", "os"]
+    assert get_kernel_pool() is pool
+
+    monkeypatch.setattr(kernel_pool, "_pool", None)
+    monkeypatch.delenv("ARGUS_KERNEL_PRELOAD")
+    assert get_kernel_pool().preload == kernel_pool.DEFAULT_PRELOAD
+
+
+def test_executor_shutdown_keeps_the_shared_pool(monkeypatch):
+    from argus.tools.code import code as code_module
+
+    class SharedPool:
+        closed = 0
+
+        def start(self):
+            pass
+
+        def shutdown(self):
+            self.closed += 1
+
+    shared = SharedPool()
+    monkeypatch.setattr(code_module, "get_kernel_pool", lambda: shared)
+    first, second = code_module.Code(), code_module.Code()
+    assert first.kernel_pool is second.kernel_pool is shared
+    first.shutdown()
+    assert shared.closed == 0
+
+
+def test_preload_code_skips_missing_modules():
+    class Shell:
+        def run_line_magic(self, name, line):
+            raise ImportError("No module named 'matplotlib'")
+
+    namespace = {"get_ipython": Shell}
+    exec(build_preload_code(["json as js", "no_such_module"]), namespace)
+    assert "js" in namespace
+
+
+def test_acquired_kernel_is_warm_and_release_recycles_it(pool):
+    language = PythonLanguage(pool=pool)
+    try:
+        assert _run(language, "x = 1\nprint(js.dumps([1]))") == ("[1]\n", 0)
+        assert pool.stats["acquired"] == 1
+
+        # 交回后由池重启预热：用户变量清空，预加载的模块仍在
+        language.reset()
+        output, _ = _run(language, "x")
+        assert "NameError" in output
+        assert _run(language, "print(js.dumps(2))") == ("2\n", 0)
+        assert pool.stats["acquired"] == 2 and pool.stats["cold_starts"] == 0
+        deadline = time.time() + 30
+        while pool.stats["recycled"] < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert pool.stats["recycled"] == 1
+    finally:
+        language.stop()
+
+
+def test_restarted_kernel_is_warmed_again(pool):
+    language = PythonLanguage(pool=pool)
+    try:
+        _run(language, "x = 1")
+        language.restart()
+        output, _ = _run(language, "x")
+        assert "NameError" in output
+        assert _run(language, "print(js.dumps('ok'))") == ('"ok"\n', 0)
+    finally:
+        language.stop()
@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from argus.llm import (
+    EndpointPool,
+    LLMClient,
+    LLMEndpoint,
+    LLMResponseCache,
+    RateLimiter,
+    ResilientCaller,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+def collect(stream):
+    async def run():
+        return [chunk async for chunk in stream]
+    return run()
+
+
+def test_acompletion_streams_and_records_metrics():
+    calls = []
+
+    async def abackend(**kwargs):
+        calls.append(kwargs)
+        if kwargs["messages"][0]["content"] == "boom":
+            raise StatusError(400)
+        return FakeAsyncStream(["a", "b"]) if kwargs.get("stream") else "response"
+
+    client = LLMClient(provider="openai", timeout=30, abackend=abackend)
+    endpoint = LLMEndpoint("m1", "https://api.example.com/v1", "secret")
+
+    async def main():
+        assert await client.acompletion(endpoint, [{"role": "user", "content": "hi"}]) == "response"
+        stream = await client.acompletion(endpoint, [{"role": "user", "content": "hi"}], stream=True)
+        assert await collect(stream) == ["a", "b"]
+        with pytest.raises(StatusError):
+            await client.acompletion(endpoint, [{"role": "user", "content": "boom"}])
+
+    asyncio.run(main())
+    assert calls[0]["model"] == "openai/m1" and calls[0]["timeout"] == 30
+    stats = client.get_metrics()["endpoints"]["api.example.com/m1"]
+    assert stats["requests"] == 3 and stats["errors"] == 1 and stats["in_flight"] == 0
+    assert stats["avg_ttft"] is not None
+
+
+def test_acall_retries_and_hedges_slow_first_token():
+    attempts = []
+
+    async def attempt():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise StatusError(503)
+        # 第二次请求很慢，对冲请求更快返回
+        return FakeAsyncStream(["x"], delay=1.0 if len(attempts) == 2 else 0.0)
+
+    caller = ResilientCaller(base_delay=0, hedge_min_delay=0.05, hedge_min_samples=1)
+    caller._state("k").ttft.append(0.01)
+
+    async def main():
+        stream = await caller.acall("k", True, attempt)
+        return await collect(stream)
+
+    assert asyncio.run(main()) == ["x"]
+    metrics = caller.get_metrics()["k"]
+    assert metrics["retries"] == 1 and metrics["hedges"] == 1 and metrics["hedge_wins"] == 1
+
+
+def test_cancelled_request_closes_stream():
+    streams = []
+
+    async def abackend(**kwargs):
+        streams.append(FakeAsyncStream(["a"] * 100, delay=0.01))
+        return streams[-1]
+
+    client = LLMClient(provider="openai", abackend=abackend)
+
+    async def consume():
+        stream = await client.acompletion(LLMEndpoint("m"), [], stream=True)
+        async for _ in stream:
+            pass
+
+    async def main():
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert streams[0].closed
+    assert client.get_metrics()["endpoints"]["default/m"]["in_flight"] == 0
+
+
+def test_async_replay_and_pool(tmp_path):
+    async def abackend(**kwargs):
+        if "api1" in kwargs["api_base"]:
+            raise StatusError(503)
+        delta = SimpleNamespace(content="c", role=None, tool_calls=None)
+        return FakeAsyncStream([SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason="stop")])])
+
+    pool = EndpointPool(
+        [(LLMEndpoint("m", "https://api1.example.com/v1", "k1", label="1"), 1),
+         (LLMEndpoint("m", "https://api2.example.com/v1", "k2", label="2"), 1)],
+        failure_threshold=1,
+    )
+    cache = LLMResponseCache("record", str(tmp_path))
+    client = LLMClient(
+        provider="openai", abackend=abackend, cache=cache, resilience=ResilientCaller(base_delay=0, hedge_percentile=0)
+    )
+
+    async def main():
+        return await collect(await client.acompletion(pool, [{"role": "user", "content": "hi"}], stream=True))
+
+    assert [chunk.choices[0].delta.content for chunk in asyncio.run(main())] == ["c"]
+    assert cache.stats["recorded"] == 1
+
+    cache.mode = "replay"
+    replayed = asyncio.run(main())
+    assert [chunk.choices[0].delta.content for chunk in replayed] == ["c"]
+
+
+def test_aacquire_waits_without_blocking_loop():
+    now = [0.0]
+    limiter = RateLimiter(rpm=60, clock=lambda: now[0])
+
+    async def main():
+        for _ in range(60):
+            assert await limiter.aacquire("k", 1) == 0
+        other = asyncio.ensure_future(asyncio.sleep(0))
+        wait = await limiter.aacquire("k", 1)
+        assert other.done()
+        return wait
+
+    assert asyncio.run(main()) == pytest.approx(1.0)
+    assert limiter.get_metrics()["endpoints"]["k"]["queued"] == 1
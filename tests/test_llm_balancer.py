@@ -0,0 +1,118 @@
+import pytest
+
+from argus.config import AgentConfig, parse_endpoints
+from argus.llm import EndpointPool, LLMClient, LLMEndpoint, resolve_endpoint
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def make_pool(weights=(1, 1), **kwargs):
+    members = [(LLMEndpoint("m", f"https://api{i}.example.com/v1", f"k{i}", label=str(i)), w)
+               for i, w in enumerate(weights, 1)]
+    return EndpointPool(members, **kwargs)
+
+
+def test_parse_endpoints_uses_role_defaults():
+    pool = parse_endpoints("https://a/v1|k1|3, |k2, https://c/v1", "https://default/v1", "default-key")
+    assert [(e.api_base, e.api_key, e.weight) for e in pool] == [
+        ("https://a/v1", "k1", 3.0), ("https://default/v1", "k2", 1.0), ("https://c/v1", "default-key", 1.0)
+    ]
+    with pytest.raises(ValueError):
+        parse_endpoints("https://a/v1|k1|0")
+
+    config = AgentConfig("g", "", "", "c", "", "", code_endpoints=pool)
+    assert "CodeAgent_API_KEY" not in config.missing_required()
+    assert "GUIAgent_API_KEY" in config.missing_required()
+
+
+def test_requests_spread_by_weight_and_outstanding():
+    pool = make_pool(weights=(3, 1))
+    counts = {}
+    for _ in range(400):
+        member = pool.acquire()
+        counts[member.endpoint.label] = counts.get(member.endpoint.label, 0) + 1
+        pool.release(member, 0.1)
+    assert counts["1"] > counts["2"] > 0
+
+    pool = make_pool()
+    busy = pool.acquire()
+    for _ in range(20):
+        member = pool.acquire()
+        pool.release(member, 0.1)
+        assert member is not busy
+    pool.release(busy, 0.1)
+
+
+def test_latency_strategy_prefers_faster_endpoint():
+    pool = make_pool(strategy="latency")
+    slow, fast = pool._members
+    slow.latency, fast.latency = 2.0, 0.2
+    picks = [pool.acquire() for _ in range(20)]
+    for member in picks:
+        pool.release(member)
+    assert picks.count(fast) > picks.count(slow)
+
+
+def test_failing_endpoint_is_ejected_and_restored_after_probe():
+    now = [0.0]
+    pool = make_pool(failure_threshold=2, eject_time=10, clock=lambda: now[0])
+    bad, good = pool._members
+    for _ in range(2):
+        bad.outstanding += 1
+        pool.release(bad, error=StatusError(503))
+    assert pool.get_metrics()[bad.endpoint.key]["healthy"] is False
+    assert all(pool.acquire() is good for _ in range(10))
+
+    now[0] = 11
+    probe = pool.acquire()
+    assert probe is bad
+    assert pool.acquire() is good
+    pool.release(probe, error=StatusError(502))
+    assert bad.eject_time == 20
+
+    now[0] = 40
+    probe = pool.acquire()
+    assert probe is bad
+    pool.release(probe, 0.1)
+    assert pool.get_metrics()[bad.endpoint.key]["healthy"] is True
+
+
+def test_client_retries_on_another_endpoint():
+    calls = []
+
+    def backend(**kwargs):
+        calls.append(kwargs["api_base"])
+        if "api1" in kwargs["api_base"]:
+            raise StatusError(503)
+        return "ok"
+
+    from argus.llm import ResilientCaller
+
+    client = LLMClient(
+        provider="openai", backend=backend, resilience=ResilientCaller(hedge_percentile=0, sleep=lambda d: None)
+    )
+    pool = make_pool(failure_threshold=1)
+    for _ in range(30):
+        assert client.completion(pool, [{"role": "user", "content": "hi"}]) == "ok"
+    assert calls.count("https://api1.example.com/v1") == 1
+    metrics = client.get_metrics()
+    assert metrics["pools"]["pool"]["api1.example.com/m#1"]["ejections"] == 1
+
+
+def test_resolve_endpoint_builds_shared_pool(monkeypatch):
+    monkeypatch.setenv("CodeAgent_MODEL", "pool-test-model")
+    monkeypatch.setenv("CodeAgent_API_KEY", "shared")
+    monkeypatch.setenv("CodeAgent_ENDPOINTS", "https://a.example.com/v1||2,https://b.example.com/v1|k2")
+    pool = resolve_endpoint("CodeAgent")
+    assert isinstance(pool, EndpointPool) and resolve_endpoint("CodeAgent") is pool
+    assert [(e.api_base, e.api_key) for e in pool.endpoints] == [
+        ("https://a.example.com/v1", "shared"), ("https://b.example.com/v1", "k2")
+    ]
+
+    monkeypatch.delenv("CodeAgent_ENDPOINTS")
+    monkeypatch.setenv("CodeAgent_MODEL", "single-test-model")
+    assert isinstance(resolve_endpoint("CodeAgent"), LLMEndpoint)
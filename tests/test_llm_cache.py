@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from argus.llm import LLMCacheMiss, LLMClient, LLMEndpoint, LLMResponseCache
+from argus.llm.cache import request_hash
+
+ENDPOINT = LLMEndpoint("m1", "https://api.example.com/v1", "secret")
+
+
+def chunk(content=None, tool_calls=None):
+    delta = SimpleNamespace(role=None, content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+def make_client(tmp_path, mode, calls):
+    def backend(**kwargs):
+        calls.append(kwargs)
+        time.sleep(0.05)
+        if kwargs.get("stream"):
+            call = SimpleNamespace(index=0, id="call_1", type="function",
+                                   function=SimpleNamespace(name="execute_code", arguments='{"code": "1"}'))
+            return iter([chunk("hel"), chunk("lo"), chunk(tool_calls=[call])])
+        message = SimpleNamespace(role="assistant", content="CODE:0.9", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+    async def abackend(**kwargs):
+        response = backend(**kwargs)
+        if not kwargs.get("stream"):
+            return response
+
+        async def chunks():
+            for item in response:
+                yield item
+        return chunks()
+
+    return LLMClient(backend=backend, abackend=abackend, cache=LLMResponseCache(mode, str(tmp_path)))
+
+
+def test_record_then_replay_stream_and_completion(tmp_path):
+    calls = []
+    messages = [{"role": "user", "content": "hi"}]
+    recorder = make_client(tmp_path, "record", calls)
+    assert recorder.completion(ENDPOINT, messages).choices[0].message.content == "CODE:0.9"
+    live = list(recorder.completion(ENDPOINT, messages, stream=True, tools=[{"name": "x"}]))
+    assert len(calls) == 2
+
+    replayer = make_client(tmp_path, "replay", calls)
+    assert replayer.completion(ENDPOINT, messages).choices[0].message.content == "CODE:0.9"
+    replayed = list(replayer.completion(ENDPOINT, messages, stream=True, tools=[{"name": "x"}]))
+    assert len(calls) == 2
+    assert [c.choices[0].delta.content for c in replayed] == [c.choices[0].delta.content for c in live]
+    tool_call = replayed[2].choices[0].delta.tool_calls[0]
+    assert (tool_call.id, tool_call.function.name, tool_call.function.arguments) == ("call_1", "execute_code", '{"code": "1"}')
+
+    with pytest.raises(LLMCacheMiss):
+        replayer.completion(ENDPOINT, [{"role": "user", "content": "other"}])
+
+
+def test_hash_uses_image_digest_and_ignores_transport_params():
+    image = "data:image/png;base64," + "A" * 1000
+    messages = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": image}}]}]
+    a = request_hash("m", messages, {"stream": True, "timeout": 5, "temperature": 0.3})
+    b = request_hash("m", messages, {"stream": False, "temperature": 0.3})
+    assert a == b
+    assert a != request_hash("m", messages, {"temperature": 0.7})
+    other = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": image + "B"}}]}]
+    assert a != request_hash("m", other, {"temperature": 0.3})
+
+
+def test_identical_concurrent_requests_are_sent_once(tmp_path):
+    calls = []
+    client = make_client(tmp_path, "auto", calls)
+    results = []
+
+    def worker():
+        stream = client.completion(ENDPOINT, [{"role": "user", "content": "same"}], stream=True)
+        results.append("".join(c.choices[0].delta.content or "" for c in stream))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["hello"] * 4
+    assert len(calls) == 1
+    assert client.cache.stats["deduplicated"] == 3
+
+
+def test_streamed_recording_replays_tool_calls_without_stream(tmp_path):
+    def fragment(index, arguments, call_id=None, name=None):
+        function = SimpleNamespace(name=name, arguments=arguments)
+        return [SimpleNamespace(index=index, id=call_id, type="function" if call_id else None, function=function)]
+
+    def backend(**kwargs):
+        return iter([
+            chunk("let me"), chunk(" run it"),
+            chunk(tool_calls=fragment(0, '{"code"', "call_1", "execute_code")),
+            chunk(tool_calls=fragment(1, '{"path": "a"}', "call_2", "read_file")),
+            chunk(tool_calls=fragment(0, ': "1"}')),
+        ])
+
+    messages = [{"role": "user", "content": "hi"}]
+    recorder = LLMClient(backend=backend, cache=LLMResponseCache("record", str(tmp_path)))
+    list(recorder.completion(ENDPOINT, messages, stream=True))
+
+    replayer = LLMClient(backend=backend, cache=LLMResponseCache("replay", str(tmp_path)))
+    message = replayer.completion(ENDPOINT, messages).choices[0].message
+    assert message.content == "let me run it"
+    calls = [(c.id, c.type, c.function.name, c.function.arguments) for c in message.tool_calls]
+    assert calls == [("call_1", "function", "execute_code", '{"code": "1"}'),
+                     ("call_2", "function", "read_file", '{"path": "a"}')]
+
+
+def test_follower_does_not_wait_on_a_stream_that_is_never_read(tmp_path):
+    calls = []
+    client = make_client(tmp_path, "auto", calls)
+    messages = [{"role": "user", "content": "unread"}]
+    leader = client.completion(ENDPOINT, messages, stream=True)
+    results = []
+    follower = threading.Thread(
+        target=lambda: results.append("".join(c.choices[0].delta.content or "" for c in client.completion(
+            ENDPOINT, messages, stream=True)))
+    )
+    follower.start()
+    time.sleep(0.1)
+    assert follower.is_alive()
+    # 领头的流未被读取就被丢弃
+    del leader
+    follower.join(timeout=5)
+    assert results == ["hello"] and len(calls) == 2
+
+
+def test_follower_stops_waiting_after_timeout(tmp_path):
+    calls = []
+    client = make_client(tmp_path, "auto", calls)
+    client.cache.wait_timeout = 0.1
+    messages = [{"role": "user", "content": "held"}]
+    leader = client.completion(ENDPOINT, messages, stream=True)
+
+    async def follow():
+        stream = await client.acompletion(ENDPOINT, messages, stream=True)
+        return "".join([c.choices[0].delta.content or "" async for c in stream])
+
+    assert asyncio.run(follow()) == "hello"
+    assert len(calls) == 2
+    assert "".join(c.choices[0].delta.content or "" for c in leader) == "hello"
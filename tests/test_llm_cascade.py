@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from argus.config import AgentConfig, parse_model_prices
+from argus.llm import LLMEndpoint, ModelCascade
+
+
+def chunk(content="", logprob=None, finish_reason=None, usage=None):
+    logprobs = SimpleNamespace(content=[{"logprob": logprob}]) if logprob is not None else None
+    choice = SimpleNamespace(delta=SimpleNamespace(content=content), logprobs=logprobs, finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=usage)
+
+
+def make_cascade(**kwargs):
+    return ModelCascade(LLMEndpoint("big"), LLMEndpoint("small"), name="Test", **kwargs)
+
+
+def test_easy_steps_use_cheap_model_and_escalate():
+    cascade = make_cascade(prices={"small": (1.0, 2.0), "big": (10.0, 20.0)})
+    messages = [{"role": "user", "content": "x" * 30}]
+    assert cascade.begin(messages, easy=False).endpoint.model == "big"
+
+    step = cascade.begin(messages, easy=True)
+    assert step.cheap and step.params == {}
+    step.observe(chunk("点击", usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=100)))
+    primary = cascade.escalate(step, "动作无法解析", "点击")
+    assert primary.endpoint.model == "big" and not primary.cheap
+    primary.finish("click(point='<point>1 2</point>')")
+
+    metrics = cascade.get_metrics()
+    assert metrics["small"]["calls"] == 1 and metrics["small"]["escalation_rate"] == 1.0
+    assert metrics["small"]["cost"] == (1000 * 1.0 + 100 * 2.0) / 1_000_000
+    assert metrics["big"]["calls"] == 1 and metrics["big"]["prompt_tokens"] == 11
+
+
+def test_low_confidence_from_logprobs_and_truncation():
+    cascade = make_cascade(min_confidence=0.5)
+    step = cascade.begin([], easy=True)
+    assert step.params == {"logprobs": True}
+    step.observe(chunk("a", logprob=-0.1))
+    assert step.low_confidence() is None
+    step.observe(chunk("b", logprob=-3.0))
+    assert step.low_confidence().startswith("置信度低")
+
+    truncated = cascade.begin([], easy=True)
+    truncated.observe(chunk("a", finish_reason="length"))
+    assert truncated.low_confidence() == "回复被截断"
+
+
+def test_repeated_cheap_failures_disable_cheap_model_for_the_task():
+    cascade = make_cascade(max_cheap_failures=2)
+    for _ in range(2):
+        cascade.outcome(cascade.begin([], easy=True), success=False)
+    assert not cascade.begin([], easy=True).cheap
+    cascade.start_task()
+    assert cascade.begin([], easy=True).cheap
+
+
+def test_from_env_reads_cheap_model_and_prices(monkeypatch):
+    monkeypatch.setenv("CodeAgent_MODEL", "big")
+    monkeypatch.setenv("CodeAgent_API_BASE", "https://api.example.com/v1")
+    monkeypatch.setenv("CodeAgent_CHEAP_MODEL", "small")
+    monkeypatch.setenv("ARGUS_MODEL_PRICES", "small=0.3/0.6, big=3")
+    assert AgentConfig.from_env().code_cheap_model == "small"
+    assert parse_model_prices("small=0.3/0.6, big=3") == (("small", 0.3, 0.6), ("big", 3.0, 3.0))
+
+    cascade = ModelCascade.from_env("CodeAgent", LLMEndpoint("big"))
+    assert cascade.enabled
+    assert cascade.cheap == LLMEndpoint("small", "https://api.example.com/v1")
+    assert cascade.prices["big"] == (3.0, 3.0)
+
+    monkeypatch.delenv("CodeAgent_CHEAP_MODEL")
+    assert not ModelCascade.from_env("CodeAgent", LLMEndpoint("big")).enabled
@@ -0,0 +1,46 @@
+import pytest
+
+from argus.llm import LLMClient, LLMEndpoint
+
+
+def test_completion_passes_endpoint_and_records_metrics():
+    calls = []
+
+    def backend(**kwargs):
+        calls.append(kwargs)
+        if kwargs.get("stream"):
+            return iter(["a", "b"])
+        if kwargs["messages"][0]["content"] == "boom":
+            raise RuntimeError("503")
+        return "response"
+
+    client = LLMClient(provider="openai", timeout=30, backend=backend)
+    endpoint = LLMEndpoint("m1", "https://api.example.com/v1", "secret")
+
+    assert client.completion(endpoint, [{"role": "user", "content": "hi"}]) == "response"
+    assert calls[0]["model"] == "openai/m1"
+    assert calls[0]["api_base"] == "https://api.example.com/v1"
+    assert calls[0]["timeout"] == 30
+
+    stream = client.completion(endpoint, [{"role": "user", "content": "hi"}], stream=True)
+    assert client.get_metrics()["endpoints"]["api.example.com/m1"]["in_flight"] == 1
+    assert list(stream) == ["a", "b"]
+
+    with pytest.raises(RuntimeError):
+        client.completion(endpoint, [{"role": "user", "content": "boom"}])
+
+    stats = client.get_metrics()["endpoints"]["api.example.com/m1"]
+    assert stats["requests"] == 3 and stats["streams"] == 1 and stats["errors"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["avg_ttft"] is not None
+    assert "503" in stats["last_error"]
+
+
+def test_endpoint_from_env_uses_fallback(monkeypatch):
+    monkeypatch.setenv("GUIAgent_MODEL", "gui-model")
+    monkeypatch.setenv("GUIAgent_API_KEY", "gui-key")
+    monkeypatch.delenv("CodeAgent_API_KEY", raising=False)
+    monkeypatch.setenv("CodeAgent_MODEL", "code-model")
+    gui = LLMEndpoint.from_env("GUIAgent")
+    code = LLMEndpoint.from_env("CodeAgent", fallback=gui)
+    assert (code.model, code.api_key) == ("code-model", "gui-key")
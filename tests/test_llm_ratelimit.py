@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from argus.llm import LLMClient, LLMEndpoint, RateLimiter
+from argus.llm.ratelimit import estimate_tokens
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+def test_requests_beyond_rpm_queue_in_arrival_order():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=60, sleep=clock.sleep, clock=clock)
+    for _ in range(60):
+        assert limiter.acquire("e", 1) == 0
+    # 每秒补充一个请求，超出的请求依次排队
+    assert limiter.acquire("e", 1) == 1.0
+    assert limiter.acquire("e", 1) == 1.0
+    assert clock.sleeps == [1.0, 1.0]
+
+    metrics = limiter.get_metrics()["endpoints"]["e"]
+    assert metrics["requests"] == 62 and metrics["queued"] == 2 and metrics["max_queue_delay"] == 1.0
+
+
+def test_tpm_is_corrected_by_actual_usage(tmp_path):
+    clock = FakeClock()
+    limiter = RateLimiter(tpm=600, path=str(tmp_path / "limits.db"), sleep=clock.sleep, clock=clock)
+    assert limiter.acquire("e", 500) == 0
+    limiter.settle("e", 500, 100)
+    assert limiter.acquire("e", 500) == 0
+
+    # 另一个进程（同一个SQLite文件）看到同一个桶
+    other = RateLimiter(tpm=600, path=str(tmp_path / "limits.db"), sleep=clock.sleep, clock=clock)
+    assert other.acquire("e", 100) == 10.0
+
+
+def test_estimate_counts_text_images_and_max_tokens():
+    messages = [{"role": "user", "content": [{"type": "text", "text": "x" * 300}, {"type": "image_url"}]}]
+    assert estimate_tokens(messages, {"max_tokens": 50}) == 100 + 1000 + 50 + 1
+
+
+def test_client_applies_endpoint_limits():
+    clock = FakeClock()
+
+    def backend(**kwargs):
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+    limiter = RateLimiter(sleep=clock.sleep, clock=clock)
+    client = LLMClient(provider="openai", backend=backend, limiter=limiter)
+    endpoint = LLMEndpoint("m1", "https://api.example.com/v1", rpm=1)
+    client.completion(endpoint, [{"role": "user", "content": "hi"}])
+    client.completion(endpoint, [{"role": "user", "content": "hi"}])
+    assert clock.sleeps == [60.0]
+    assert client.get_metrics()["rate_limit"]["endpoints"]["api.example.com/m1"]["queued"] == 1
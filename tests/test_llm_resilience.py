@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from argus.llm import CircuitBreaker, CircuitOpenError, LLMClient, LLMEndpoint, ResilientCaller
+from argus.llm.resilience import is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeStream:
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            if self.closed:
+                return
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_retries_transient_errors_and_not_client_errors():
+    assert is_retryable(StatusError(429)) and is_retryable(StatusError(503)) and is_retryable(ConnectionError())
+    assert not is_retryable(StatusError(400)) and not is_retryable(ValueError())
+
+    delays = []
+    errors = [StatusError(503), StatusError(429)]
+
+    def attempt():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    caller = ResilientCaller(max_retries=2, base_delay=1, max_delay=3, hedge_percentile=0, sleep=delays.append)
+    assert caller.call("e", False, attempt) == "ok"
+    assert len(delays) == 2 and all(0 <= d <= 3 for d in delays)
+    stats = caller.get_metrics()["e"]
+    assert stats["attempts"] == 3 and stats["retries"] == 2 and stats["breaker"] == "closed"
+
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        caller.call("e", False, bad_request)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_and_recovers_after_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 11
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_breaker_fails_fast():
+    caller = ResilientCaller(max_retries=0, hedge_percentile=0, breaker_failures=1, breaker_cooldown=60)
+
+    def attempt():
+        raise StatusError(502)
+
+    with pytest.raises(StatusError):
+        caller.call("e", False, attempt)
+    with pytest.raises(CircuitOpenError):
+        caller.call("e", False, lambda: "ok")
+    assert caller.get_metrics()["e"]["rejected"] == 1
+
+
+def test_slow_first_token_is_hedged_and_loser_closed():
+    caller = ResilientCaller(hedge_percentile=50, hedge_min_delay=0.05, hedge_min_samples=1)
+    caller.call("e", True, lambda: FakeStream(["warm"]))
+
+    streams = []
+    lock = threading.Lock()
+
+    def attempt():
+        with lock:
+            stream = FakeStream(["a", "b"], delay=0.5 if not streams else 0.0)
+            streams.append(stream)
+        return stream
+
+    assert list(caller.call("e", True, attempt)) == ["a", "b"]
+    stats = caller.get_metrics()["e"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    time.sleep(0.6)
+    assert streams[0].closed
+
+
+def test_client_retries_through_resilience():
+    failures = [StatusError(503)]
+
+    def backend(**kwargs):
+        if failures:
+            raise failures.pop()
+        return iter(["x", "y"])
+
+    resilience = ResilientCaller(hedge_percentile=0, sleep=lambda delay: None)
+    client = LLMClient(provider="openai", backend=backend, resilience=resilience)
+    endpoint = LLMEndpoint("m1", "https://api.example.com/v1")
+    assert list(client.completion(endpoint, [{"role": "user", "content": "hi"}], stream=True)) == ["x", "y"]
+
+    metrics = client.get_metrics()
+    assert metrics["endpoints"]["api.example.com/m1"]["requests"] == 2
+    assert metrics["endpoints"]["api.example.com/m1"]["errors"] == 1
+    assert metrics["resilience"]["api.example.com/m1"]["retries"] == 1
@@ -0,0 +1,104 @@
+import json
+import time
+
+import httpx
+import pytest
+
+from argus.llm.cache import LLMResponseCache, request_hash
+from argus.llm.stub_server import StubLLMServer, split_tokens
+
+
+def post(server, body):
+    return httpx.post(server.base_url + "/chat/completions", json=body, timeout=10)
+
+
+def stream_events(server, body):
+    events = []
+    with httpx.stream("POST", server.base_url + "/chat/completions", json={**body, "stream": True}, timeout=10) as r:
+        assert r.status_code == 200
+        for line in r.iter_lines():
+            if line.startswith("data: "):
+                events.append(line[6:])
+    assert events[-1] == "[DONE]"
+    return [json.loads(event) for event in events[:-1]]
+
+
+def test_split_tokens_round_trips():
+    text = "你好, hello world_1!"
+    assert "".join(split_tokens(text)) == text
+    assert split_tokens("hello 世界") == ["hello", " ", "世", "界"]
+
+
+def test_streams_scripted_tool_calls_with_ttft_and_usage():
+    rules = [
+        {"match": "计算", "tool_calls": [{"name": "execute_code", "arguments": {"code": "1+1"}}]},
+        {"content": "第一"},
+        {"content": "第二"},
+    ]
+    with StubLLMServer(rules, ttft=0.2, tokens_per_second=1000) as server:
+        started = time.time()
+        chunks = stream_events(server, {
+            "model": "m", "messages": [{"role": "user", "content": "计算一下"}],
+            "stream_options": {"include_usage": True},
+        })
+        assert time.time() - started >= 0.2
+        calls = [call for chunk in chunks if chunk["choices"]
+                 for call in chunk["choices"][0]["delta"].get("tool_calls", [])]
+        assert calls[0]["function"]["name"] == "execute_code" and calls[0]["id"]
+        assert json.loads("".join(call["function"]["arguments"] for call in calls)) == {"code": "1+1"}
+        assert chunks[-2]["choices"][0]["finish_reason"] == "tool_calls"
+        assert chunks[-1]["usage"]["completion_tokens"] > 0
+
+        # 没有match的规则按顺序轮流使用
+        replies = [post(server, {"model": "m", "messages": []}).json()["choices"][0]["message"]["content"]
+                   for _ in range(3)]
+        assert replies == ["第一", "第二", "第一"]
+        assert server.stats["requests"] == 4 and server.stats["max_in_flight"] == 1
+
+
+def test_scripted_errors_and_model_rules():
+    rules = [{"model": "broken", "status": 429, "retry_after": 2}, {"model": "ok", "content": "fine"}]
+    with StubLLMServer(rules) as server:
+        response = post(server, {"model": "broken", "messages": []})
+        assert response.status_code == 429 and response.headers["Retry-After"] == "2"
+        assert post(server, {"model": "ok", "messages": []}).json()["choices"][0]["message"]["content"] == "fine"
+        assert post(server, {"model": "other", "messages": []}).json()["choices"][0]["message"]["content"] == (
+            "The task is done."
+        )
+        assert server.stats["errors"] == 1
+        assert httpx.get(server.base_url + "/models").json()["data"][0]["id"] == "broken"
+
+
+def test_replays_recorded_responses(tmp_path):
+    cache = LLMResponseCache("record", str(tmp_path))
+    messages = [{"role": "user", "content": "hi"}]
+    key = request_hash("openai/m", messages, {"temperature": 0.3})
+    cache._save(key, {"stream": True, "chunks": [
+        {"delta": {"content": "录制"}},
+        {"delta": {"content": "的回复"}, "finish_reason": "stop"},
+    ]})
+    with StubLLMServer(recordings=str(tmp_path)) as server:
+        body = {"model": "m", "messages": messages, "temperature": 0.3}
+        assert post(server, body).json()["choices"][0]["message"]["content"] == "录制的回复"
+        text = "".join(chunk["choices"][0]["delta"].get("content") or "" for chunk in stream_events(server, body))
+        assert text == "录制的回复"
+        assert post(server, {**body, "temperature": 1.0}).json()["choices"][0]["message"]["content"] == (
+            "The task is done."
+        )
+        assert server.stats["recorded"] == 2
+
+
+def test_injected_errors_are_deterministic():
+    def statuses():
+        with StubLLMServer(error_rate=0.5, seed=7) as server:
+            return [post(server, {"model": "m", "messages": []}).status_code for _ in range(10)]
+
+    first = statuses()
+    assert first == statuses() and 503 in first and 200 in first
+
+
+@pytest.mark.parametrize("path", ["/v1/unknown", "/v1/embeddings"])
+def test_unknown_paths_return_404(path):
+    with StubLLMServer() as server:
+        base = server.base_url[:-3]
+        assert httpx.post(base + path, json={}).status_code == 404
@@ -0,0 +1,64 @@
+import base64
+import io
+
+import pytest
+
+from argus.agents.agent_memory.memory import MemoryManager
+from argus.tools.media import MediaAttachment, downscale_image, extract_attachments, supports_vision
+
+
+def test_extract_attachments_replaces_inline_images_with_references():
+    data = base64.b64encode(b"\x89PNG fake").decode()
+    result = {"success": True, "image": {"type": "image/png", "content": data}, "original_width": 1920}
+
+    stripped, attachments = extract_attachments(result)
+
+    assert len(attachments) == 1 and attachments[0].mime_type == "image/png"
+    assert stripped["image"]["attachment"] == 0
+    assert data not in str(stripped)
+    assert stripped["original_width"] == 1920
+    # 原结果（可能被缓存）不被修改
+    assert result["image"]["content"] == data
+
+
+def test_downscale_image_respects_side_and_byte_limits():
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.effect_noise((2000, 1200), 100).convert("RGB").save(buffer, format="PNG")
+    attachment = MediaAttachment("image/png", base64.b64encode(buffer.getvalue()).decode())
+
+    scaled = downscale_image(attachment, max_side=800, max_bytes=100 * 1024)
+
+    assert scaled.mime_type == "image/jpeg"
+    assert max(scaled.width, scaled.height) <= 800
+    assert scaled.size_bytes <= 100 * 1024
+
+
+def test_text_only_models_get_saved_image_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARGUS_VISION_MODELS", "ui-tars, gpt-4o")
+    assert supports_vision("gpt-4o") and not supports_vision("deepseek-v3-2") and not supports_vision(None)
+
+    data = base64.b64encode(b"\x89PNG fake").decode()
+    result = {"success": True, "image": {"type": "image/png", "content": data}}
+    stripped, attachments = extract_attachments(result, save_dir=str(tmp_path))
+
+    path = stripped["image"]["path"]
+    assert path == attachments[0].path and path.endswith(".png")
+    with open(path, "rb") as f:
+        assert f.read() == b"\x89PNG fake"
+    # 同一图片只保存一次
+    assert extract_attachments(result, save_dir=str(tmp_path))[0]["image"]["path"] == path
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_memory_resends_only_the_latest_tool_images(tmp_path):
+    memory = MemoryManager(agent_name="Test", keep_last_screenshots=2, save_dir=str(tmp_path), model="gpt-4o")
+    for i in range(4):
+        memory.add_function_call([{"id": f"c{i}", "type": "function", "function": {"name": "shot", "arguments": "{}"}}])
+        memory.add_function_result(f"c{i}", "shot", "{}", [MediaAttachment("image/png", "AAAA")])
+
+    images = [
+        part for msg in memory.get_context() if isinstance(msg.get("content"), list)
+        for part in msg["content"] if part["type"] == "image_url"
+    ]
+    assert len(images) == 2
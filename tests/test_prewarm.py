@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from argus.agents.prewarm import Prewarmer, targets_from_env
+
+
+def test_get_waits_for_background_build_and_builds_once():
+    release = threading.Event()
+    calls = []
+
+    def build():
+        calls.append(1)
+        release.wait(5)
+        return "agent"
+
+    prewarmer = Prewarmer()
+    prewarmer.submit("code", build)
+    assert prewarmer.status() == {"code": "pending"}
+    threading.Timer(0.05, release.set).start()
+    assert prewarmer.get("code", build) == "agent"
+    assert prewarmer.get("code", build) == "agent"
+    assert len(calls) == 1
+    assert prewarmer.status() == {"code": "done"}
+    assert prewarmer.waits["code"] > 0
+
+
+def test_failed_build_raises_at_use_and_is_retried():
+    attempts = []
+
+    def build():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no display")
+        return "agent"
+
+    prewarmer = Prewarmer()
+    with pytest.raises(RuntimeError):
+        prewarmer.get("gui", build)
+    assert prewarmer.get("gui", build) == "agent"
+    assert len(attempts) == 2
+
+
+def test_targets_from_env(monkeypatch):
+    monkeypatch.setenv("ARGUS_PREWARM", "0")
+    assert targets_from_env() == []
+    monkeypatch.setenv("ARGUS_PREWARM", "all")
+    assert targets_from_env() == ["code", "gui", "llm"]
+    monkeypatch.setenv("ARGUS_PREWARM", "code, llm, bogus")
+    assert targets_from_env() == ["code", "llm"]
+
+
+def test_discarded_build_is_not_reused():
+    release = threading.Event()
+    builds = []
+
+    def build():
+        builds.append(1)
+        release.wait(5)
+        return f"agent{len(builds)}"
+
+    prewarmer = Prewarmer()
+    prewarmer.submit("gui", build)
+    assert prewarmer.discard("gui") and not prewarmer.discard("gui")
+    assert prewarmer.status() == {}
+    release.set()
+    assert prewarmer.get("gui", build) == "agent2"
+    assert len(builds) == 2
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+pytest.importorskip("jupyter_client")
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="forkserver requires os.fork")
+
+from argus.tools.code.languages import ForkPythonLanguage  # noqa: E402
+from argus.tools.code.limits import ExecutionLimits  # noqa: E402
+
+
+def _run(language, code, limits=None):
+    execution = language.run(code, limits)
+    output = "".join(msg["content"] for msg in execution if msg["type"] == "text")
+    return output, execution.exit_code
+
+
+@pytest.fixture
+def language():
+    language = ForkPythonLanguage(preload=[])
+    yield language
+    language.stop()
+
+
+def test_state_persists_and_last_expression_is_echoed(language):
+    assert _run(language, "x = 41\nprint('hi')") == ("hi\n", 0)
+    assert _run(language, "x + 1") == ("42\n", 0)
+    output, exit_code = _run(language, "1/0")
+    assert exit_code == 1 and "ZeroDivisionError" in output
+
+
+def test_killed_execution_rolls_back_namespace(language):
+    _run(language, "x = 1")
+    limits = ExecutionLimits(wall_time=0.5, grace_period=0.2)
+    output, exit_code = _run(
+        language,
+        "import signal, time\nsignal.signal(signal.SIGINT, signal.SIG_IGN)\nx = 2\ntime.sleep(30)",
+        limits,
+    )
+    assert exit_code == -9 and "回滚" in output
+    assert _run(language, "x") == ("1\n", 0)
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("jupyter_client")
+
+from argus.tools.code.languages import PythonLanguage  # noqa: E402
+
+
+def _run(language, code, limits=None):
+    execution = language.run(code, limits)
+    output = "".join(msg["content"] for msg in execution if msg["type"] in ("text", "error"))
+    return output, execution.exit_code
+
+
+@pytest.fixture
+def language():
+    language = PythonLanguage()
+    yield language
+    language.stop()
+
+
+def test_kernel_keeps_state_between_executions(language):
+    assert _run(language, "x = 41\nprint('hi')") == ("hi\n", 0)
+    pid = language.km.provisioner.pid
+    assert _run(language, "x + 1") == ("42\n", 0)
+    assert language.km.provisioner.pid == pid
+    output, exit_code = _run(language, "1/0")
+    assert exit_code == 1 and "ZeroDivisionError" in output
+
+
+def test_reset_clears_namespace_but_keeps_kernel(language):
+    _run(language, "x = 1")
+    pid = language.km.provisioner.pid
+    language.reset()
+    output, exit_code = _run(language, "x")
+    assert exit_code == 1 and "NameError" in output
+    assert language.km.provisioner.pid == pid
+
+
+def test_dead_kernel_is_restarted_before_next_execution(language):
+    _run(language, "x = 1")
+    output, exit_code = _run(language, "import os\nos._exit(1)")
+    assert exit_code is None and "Kernel died" in output
+    assert _run(language, "print('alive')") == ("alive\n", 0)
+    output, _ = _run(language, "x")
+    assert "NameError" in output
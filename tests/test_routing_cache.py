@@ -0,0 +1,41 @@
+from argus.agents.routing_cache import RoutingCache, normalize_task
+
+
+def test_normalization_ignores_case_punctuation_and_numbers():
+    assert normalize_task("计算 1 到 100 的和！") == normalize_task("计算1到200的和")
+    assert normalize_task("Open Notepad.") == normalize_task("open notepad")
+
+
+def test_cache_persists_with_lru_eviction(tmp_path):
+    path = str(tmp_path / "routing.json")
+    cache = RoutingCache(path=path, max_entries=2)
+    cache.put("任务一", "code", 0.9)
+    cache.put("任务二", "gui", 0.8)
+    assert cache.lookup("任务一") == ("code", 0.9)
+    cache.put("任务三", "gui", 0.7)
+
+    reloaded = RoutingCache(path=path, max_entries=2)
+    assert reloaded.lookup("任务二") is None
+    assert reloaded.lookup("任务一") == ("code", 0.9)
+    assert reloaded.lookup("任务三") == ("gui", 0.7)
+
+
+def test_similarity_lookup(tmp_path):
+    cache = RoutingCache(path=None, similarity_threshold=0.8)
+    cache.put("统计sales.csv中每个月的销售额并绘制折线图", "code", 0.9)
+    assert cache.lookup("统计sales.csv中每个月的销售额并绘制柱状图") == ("code", 0.9)
+    assert cache.lookup("打开记事本") is None
+
+
+def test_failures_invalidate_and_fallback_success_replaces_route():
+    cache = RoutingCache(path=None)
+    cache.put("整理桌面文件", "gui", 0.7)
+    cache.record_outcome("整理桌面文件", "gui", False)
+    assert cache.lookup("整理桌面文件") is None
+
+    cache.record_outcome("整理桌面文件", "code", True)
+    agent, confidence = cache.lookup("整理桌面文件")
+    assert agent == "code" and confidence > 0.8
+
+    cache.record_outcome("整理桌面文件", "code", False)
+    assert cache.lookup("整理桌面文件")[0] == "code"
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+
+from fakes import FakeMemory, FakeRouter
+
+from argus.sessions import (
+    SESSION_CANCELLED,
+    SESSION_FAILED,
+    SESSION_SUCCESS,
+    EventStream,
+    SessionManager,
+)
+
+
+class FakeCodeAgent:
+    def __init__(self, active, fail_on=()):
+        self.memory = FakeMemory()
+        self.active = active
+        self.fail_on = fail_on
+        self.interrupted = False
+
+    async def atask(self, description, events, route=None, python_engine=None):
+        events.put({"name": "CodeAgent", "type": "status", "content": "[START]"})
+        self.active["now"] += 1
+        self.active["max"] = max(self.active["max"], self.active["now"])
+        try:
+            await asyncio.sleep(10 if description == "slow" else 0.05)
+        except asyncio.CancelledError:
+            self.interrupted = True
+            raise
+        finally:
+            self.active["now"] -= 1
+        if description in self.fail_on:
+            events.put({"name": "CodeAgent", "type": "status", "content": "[ERROR]"})
+        return "任务结束"
+
+
+class FakeGUIAgent:
+    def __init__(self):
+        self.memory = FakeMemory()
+        self.tasks = []
+
+    async def atask(self, description, events):
+        self.tasks.append(description)
+        return "Task finished: ok"
+
+
+def make_manager(max_sessions=8, fail_on=()):
+    active = {"now": 0, "max": 0}
+    agents = []
+
+    def factory():
+        agents.append(FakeCodeAgent(active, fail_on))
+        return agents[-1]
+
+    router = FakeRouter(FakeGUIAgent())
+    return SessionManager(router, max_sessions=max_sessions, code_agent_factory=factory), router, agents, active
+
+
+def test_event_stream_accepts_events_from_threads():
+    async def main():
+        events = EventStream()
+        thread = threading.Thread(target=lambda: [events.put(i) for i in range(3)])
+        thread.start()
+        thread.join()
+        events.put({"type": "status", "content": "[ERROR]"})
+        events.close()
+        events.put("ignored")
+        return [event async for event in events], events.failed
+
+    received, failed = asyncio.run(main())
+    assert received[:3] == [0, 1, 2] and len(received) == 4 and failed
+
+
+def test_sessions_run_concurrently_up_to_limit():
+    manager, router, agents, active = make_manager(max_sessions=3)
+
+    async def main():
+        sessions = [manager.start(f"计算{i}") for i in range(6)]
+        return [await session.wait() for session in sessions], sessions
+
+    results, sessions = asyncio.run(main())
+    assert results == ["任务结束"] * 6
+    assert all(session.status == SESSION_SUCCESS for session in sessions)
+    assert active["max"] == 3 and len(agents) == 3
+
+
+def test_failed_session_falls_back_to_other_agent():
+    manager, router, agents, _ = make_manager(fail_on=("计算",))
+
+    async def main():
+        session = manager.start("计算")
+        events = [event async for event in session.events]
+        await session.wait()
+        return session, events
+
+    session, events = asyncio.run(main())
+    assert session.status == SESSION_SUCCESS and session.result == "Task finished: ok"
+    assert [attempt["agent"] for attempt in session.attempts] == ["code", "gui"]
+    assert router.outcomes == [("计算", "code", False), ("计算", "gui", True)]
+    assert any("切换到 GUIAgent" in str(event.get("content")) for event in events)
+
+    manager, router, agents, _ = make_manager(fail_on=("计算",))
+
+    async def forced():
+        session = manager.start("计算", force_agent="code")
+        await session.wait()
+        return session
+
+    assert asyncio.run(forced()).status == SESSION_FAILED
+
+
+def test_cancel_stops_running_session():
+    manager, router, agents, _ = make_manager()
+
+    async def main():
+        slow = manager.start("slow")
+        fast = manager.start("fast")
+        await asyncio.sleep(0.02)
+        manager.cancel(slow.id)
+        await fast.wait()
+        await manager.shutdown()
+        return slow, fast
+
+    slow, fast = asyncio.run(main())
+    assert slow.status == SESSION_CANCELLED and slow.result is None
+    assert fast.status == SESSION_SUCCESS
+    assert any(agent.interrupted for agent in agents)
+    assert router.outcomes == [("fast", "code", True)]
+
+
+def test_code_agent_is_built_while_routing():
+    manager, router, agents, _ = make_manager()
+    routing = threading.Event()
+    building = threading.Event()
+    factory = manager.code_agent_factory
+
+    def slow_factory():
+        building.set()
+        # 路由结束前构建不会完成：两者必须同时进行
+        assert routing.wait(5)
+        return factory()
+
+    async def llm_route(task):
+        routing.set()
+        assert await asyncio.to_thread(building.wait, 5)
+        return "code", 0.7
+
+    router.warm_candidates = lambda task, targets: router.warmed.append(task) or (None, [])
+    router.allm_route = llm_route
+    manager.code_agent_factory = slow_factory
+
+    async def main():
+        session = manager.start("整理一下")
+        await session.wait()
+        return session
+
+    session = asyncio.run(main())
+    assert session.status == SESSION_SUCCESS
+    assert router.warmed == ["整理一下"]
+    # 路由期间构建的CodeAgent直接被会话使用
+    assert len(agents) == 1 and manager._code_agents == agents
@@ -0,0 +1,84 @@
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+from argus.tools.code.shell_session import BashSession
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32" or shutil.which("bash") is None, reason="requires bash"
+)
+
+
+def _run(session, code):
+    chunks = []
+    return_code = session.execute(code, chunks.append)
+    return "".join(chunks), return_code
+
+
+def _interrupt_after(session, delay):
+    timer = threading.Timer(delay, session.interrupt)
+    timer.start()
+    return timer
+
+
+@pytest.fixture
+def session():
+    session = BashSession()
+    yield session
+    session.close()
+
+
+def test_sentinel_framing_keeps_output_intact(session):
+    assert _run(session, "printf 'no newline'") == ("no newline", 0)
+    assert _run(session, "echo a; echo b") == ("a\nb\n", 0)
+    # 看起来像哨兵前缀（但标记不同）的输出原样保留
+    output, _ = _run(session, "printf '\\n__ARGUS_DONE_x:1\\nafter\\n'")
+    assert output == "\n__ARGUS_DONE_x:1\nafter\n"
+    output, _ = _run(session, "seq 1 20000")
+    assert output == "".join(f"{i}\n" for i in range(1, 20001))
+
+
+def test_exit_codes_propagate(session):
+    assert _run(session, "true")[1] == 0
+    assert _run(session, "false")[1] == 1
+    assert _run(session, "(exit 7)")[1] == 7
+    assert _run(session, "return 4")[1] == 4
+    assert _run(session, "echo $((1 + 1))") == ("2\n", 0)
+
+
+def test_exit_ends_session_and_next_run_restarts(session):
+    _run(session, "x=1")
+    pid = session.process.pid
+    assert _run(session, "exit 3") == ("", 3)
+    output, return_code = _run(session, "echo ${x:-unset}")
+    assert (output, return_code) == ("unset\n", 0)
+    assert session.process.pid != pid
+
+
+def test_cwd_env_and_functions_persist(session, tmp_path):
+    _run(session, f"cd '{tmp_path}'; export ARGUS_TEST_VAR=value; greet() {{ echo \"hi $1\"; }}")
+    assert _run(session, "pwd")[0].strip() == str(tmp_path)
+    assert _run(session, "echo $ARGUS_TEST_VAR; greet there") == ("value\nhi there\n", 0)
+
+
+@pytest.mark.parametrize("code", ["sleep 30", "while :; do :; done", "f() { for ((;;)); do :; done; }; f"])
+def test_interrupt_keeps_session_state(session, code):
+    _run(session, "x=5")
+    pid = session.process.pid
+    started = time.time()
+    _interrupt_after(session, 0.3)
+    assert _run(session, code)[1] == 130
+    assert time.time() - started < 5
+    assert _run(session, "echo $x") == ("5\n", 0)
+    assert session.process.pid == pid
+
+
+def test_user_trap_does_not_disable_later_interrupts(session):
+    _run(session, "trap '' INT")
+    _interrupt_after(session, 0.3)
+    started = time.time()
+    assert _run(session, "sleep 30")[1] == 130
+    assert time.time() - started < 5
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# SmartRouter导入桌面工具（Windows专用），其他平台跳过
+smart_router = pytest.importorskip("argus.agents.smart_router", exc_type=ImportError)
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeLLM:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return _response(answer)
+
+    def completion(self, endpoint, messages, **kwargs):
+        return self._next()
+
+    async def acompletion(self, endpoint, messages, **kwargs):
+        return self._next()
+
+
+@pytest.fixture
+def router(monkeypatch, tmp_path):
+    monkeypatch.setenv("ARGUS_ROUTING_CACHE", "")
+    monkeypatch.setenv("ARGUS_ROUTING_OUTCOMES", "")
+    monkeypatch.setenv("ARGUS_PREWARM", "0")
+    return smart_router.SmartRouter()
+
+
+# 不含任何路由关键词，需要LLM判断
+AMBIGUOUS = "帮我处理一下这个"
+
+
+@pytest.mark.parametrize("failure", [RuntimeError("timeout"), "我不确定"])
+def test_failed_analysis_falls_back_without_caching(router, failure):
+    router.llm = FakeLLM([failure, "CODE:0.9"])
+    assert router.analyze_task(AMBIGUOUS) == smart_router.DEFAULT_ROUTE
+    assert router.routing_cache.lookup(AMBIGUOUS) is None
+
+    assert router.analyze_task(AMBIGUOUS) == ("code", 0.9)
+    assert router.routing_cache.lookup(AMBIGUOUS) == ("code", 0.9)
+    assert router.llm.calls == 2
+
+
+def test_async_failed_analysis_is_not_cached(router):
+    router.llm = FakeLLM([RuntimeError("timeout"), "GUI:0.8"])
+    assert asyncio.run(router.aanalyze_task(AMBIGUOUS)) == smart_router.DEFAULT_ROUTE
+    assert asyncio.run(router.aanalyze_task(AMBIGUOUS)) == ("gui", 0.8)
+    assert router.routing_cache.lookup(AMBIGUOUS) == ("gui", 0.8)
+
+
+def test_route_overlaps_candidate_builds_and_drops_the_loser(router, monkeypatch):
+    monkeypatch.setenv("ARGUS_PREWARM", "0")
+    routing = threading.Event()
+    built = []
+
+    def build(name):
+        def factory():
+            # 路由结束前构建不会完成：两者必须同时进行
+            assert routing.wait(5)
+            built.append(name)
+            return name
+        return factory
+
+    class RoutingLLM(FakeLLM):
+        def completion(self, endpoint, messages, **kwargs):
+            routing.set()
+            return super().completion(endpoint, messages, **kwargs)
+
+    router._build_code_agent = build("code")
+    router._build_gui_agent = build("gui")
+    router.llm = RoutingLLM(["CODE:0.8"])
+
+    assert router._route_and_warm(AMBIGUOUS) == ("code", 0.8)
+    # 选中的Agent已在路由期间构建，未选中的不再保留
+    assert set(router.prewarmer.status()) == {"code"}
+    assert router.get_code_agent() == "code"
+    assert built.count("code") == 1
+
+    # 本地即可判断的任务不提前构建
+    decision, started = router.warm_candidates("计算1到100的和")
+    assert decision[0] == "code" and started is None
+
+
+def test_route_looks_up_the_routing_cache_once(router):
+    router.llm = FakeLLM(["CODE:0.8"])
+    assert router._route_and_warm(AMBIGUOUS) == ("code", 0.8)
+    assert router.routing_cache.stats["misses"] == 1
+
+    assert router._route_and_warm(AMBIGUOUS) == ("code", 0.8)
+    assert router.routing_cache.stats["hits"] == 1
+    assert router.routing_cache.stats["misses"] == 1
+    assert router.llm.calls == 1
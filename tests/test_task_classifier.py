@@ -0,0 +1,62 @@
+import time
+
+from argus.agents.task_classifier import TaskClassifier
+
+GUI_TASKS = ["打开记事本", "点击开始菜单", "在浏览器中打开百度", "最小化微信窗口", "双击桌面上的图标", "打开设置应用"]
+CODE_TASKS = ["计算斐波那契数列", "统计csv文件的行数", "把json转换为excel", "用python画折线图", "批量重命名文件", "解析日志中的错误"]
+
+
+def _train(classifier):
+    for task in GUI_TASKS:
+        classifier.record(task, "gui", True, 20)
+    for task in CODE_TASKS:
+        classifier.record(task, "code", True, 5)
+
+
+def test_untrained_classifier_defers():
+    assert TaskClassifier(log_path=None).predict("打开记事本") is None
+
+
+def test_learns_from_outcomes_and_replays_log(tmp_path):
+    path = str(tmp_path / "outcomes.jsonl")
+    classifier = TaskClassifier(log_path=path)
+    _train(classifier)
+
+    assert classifier.predict("打开计算器应用")[0] == "gui"
+    label, confidence = classifier.predict("统计json文件中的字段")
+    assert label == "code" and confidence > 0.5
+
+    reloaded = TaskClassifier(log_path=path)
+    assert reloaded.predict("统计json文件中的字段") == (label, confidence)
+
+
+def test_failure_is_evidence_for_the_other_agent():
+    classifier = TaskClassifier(log_path=None, min_examples=1)
+    _train(classifier)
+    for _ in range(10):
+        classifier.record("整理下载文件夹", "gui", False, 60)
+    assert classifier.predict("整理下载文件夹")[0] == "code"
+
+
+def test_prediction_is_fast():
+    classifier = TaskClassifier(log_path=None)
+    _train(classifier)
+    start = time.perf_counter()
+    for _ in range(1000):
+        classifier.predict("用python统计data.csv每列的平均值")
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_outcome_log_keeps_only_recent_outcomes(tmp_path):
+    path = tmp_path / "outcomes.jsonl"
+    classifier = TaskClassifier(log_path=str(path), max_outcomes=5)
+    for i in range(11):
+        classifier.record(f"计算第{i}个", "code", True, 1)
+    # 超过上限两倍时压缩
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 5
+
+    classifier.record("计算第11个", "code", True, 1)
+    reloaded = TaskClassifier(log_path=str(path), max_outcomes=3)
+    assert reloaded._class_weight["code"] == 3
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3 and "第11个" in lines[-1]
@@ -0,0 +1,45 @@
+from argus.agents.code_agent.tool_call_stream import ToolCallAssembler
+
+
+def _delta(index, call_id=None, name=None, arguments=None):
+    function = {}
+    if name:
+        function["name"] = name
+    if arguments:
+        function["arguments"] = arguments
+    return {"index": index, "id": call_id, "function": function}
+
+
+def test_call_is_emitted_as_soon_as_arguments_are_complete():
+    completed = []
+    assembler = ToolCallAssembler(on_complete=completed.append)
+
+    assembler.feed([_delta(0, "a", "execute_code", '{"language": "py')])
+    assert completed == []
+    assembler.feed([_delta(0, arguments='thon", "code": "print(1)"}')])
+    assert [c["id"] for c in completed] == ["a"]
+    assert completed[0]["function"]["arguments"] == '{"language": "python", "code": "print(1)"}'
+
+    assembler.feed([_delta(1, "b", "window_list", "{")])
+    assert len(completed) == 1
+    assert [c["id"] for c in assembler.finish()] == ["a", "b"]
+
+
+def test_next_call_or_stream_end_completes_previous_call():
+    completed = []
+    assembler = ToolCallAssembler(on_complete=completed.append)
+
+    assembler.feed([_delta(0, "a", "broken", '{"x": ')])
+    assembler.feed([_delta(1, "b", "other", "")])
+    assert [c["id"] for c in completed] == ["a"]
+    assembler.finish()
+    assert [c["id"] for c in completed] == ["a", "b"]
+
+
+def test_deltas_without_index_are_grouped_by_id():
+    assembler = ToolCallAssembler()
+    assembler.feed([{"id": "a", "function": {"name": "f", "arguments": '{"k"'}}])
+    assembler.feed([{"function": {"arguments": ": 1}"}}])
+    assembler.feed([{"id": "b", "function": {"name": "g", "arguments": "{}"}}])
+    calls = assembler.finish()
+    assert [(c["id"], c["function"]["arguments"]) for c in calls] == [("a", '{"k": 1}'), ("b", "{}")]
@@ -0,0 +1,82 @@
+from argus.tools.base_tool import (
+    TOOL_GROUP_CODE,
+    TOOL_GROUP_KEYBOARD,
+    TOOL_GROUP_MOUSE,
+    TOOL_GROUP_SCREEN,
+    TOOL_GROUP_WINDOW,
+    FunctionTool,
+)
+from argus.tools.tool_selector import ToolSelector, create_tool_selection_tools
+from argus.tools.tools_registry import ToolsRegistry
+
+
+def _registry():
+    registry = ToolsRegistry()
+    for group in (TOOL_GROUP_MOUSE, TOOL_GROUP_KEYBOARD, TOOL_GROUP_SCREEN, TOOL_GROUP_WINDOW, TOOL_GROUP_CODE):
+        registry.register(FunctionTool(
+            name=f"{group}_tool",
+            description=f"{group}工具的详细说明" * 5,
+            parameters_schema={"type": "object", "properties": {}, "required": []},
+            execute_func=lambda: {"success": True},
+        ), group)
+    return registry
+
+
+def _names(schemas):
+    return {schema["function"]["name"] for schema in schemas}
+
+
+def test_code_task_gets_code_subset_and_reports_savings():
+    registry = _registry()
+    selection = ToolSelector(registry, enabled=True).select("计算1到100的和", route=("code", 0.9))
+
+    assert _names(selection.get_function_schemas()) == {"code_tool"}
+    assert selection.tokens_saved == registry.estimate_schema_tokens() - registry.estimate_schema_tokens(["code"])
+    assert selection.tokens_saved > 0
+
+
+def test_keywords_and_gui_route_enable_desktop_groups():
+    registry = _registry()
+    selector = ToolSelector(registry, enabled=True)
+
+    clicked = selector.select("点击保存按钮")
+    assert {"mouse_tool", "screen_tool", "window_tool", "code_tool"} <= _names(clicked.get_function_schemas())
+
+    fallback = selector.select("打开记事本", route=("gui", 0.8))
+    assert len(fallback.get_function_schemas()) == len(registry.tools)
+
+
+def test_request_tools_escalates_selection():
+    registry = _registry()
+    selection = ToolSelector(registry, enabled=True).select("统计csv")
+    registry.register_multiple(create_tool_selection_tools(registry, lambda: selection))
+    assert "request_tools" in _names(selection.get_function_schemas())
+
+    result = registry.execute_tool_call("request_tools", {"groups": ["window", "bogus"]})
+    assert result["enabled_groups"] == ["window"]
+    assert "window_tool" in _names(selection.get_function_schemas())
+
+    registry.execute_tool_call("request_tools", {"groups": ["all"]})
+    assert len(selection.get_function_schemas()) == len(registry.tools)
+
+
+def test_request_tools_is_bound_per_derived_registry():
+    shared = _registry()
+    selections = []
+    for task in ("统计csv", "读取日志"):
+        registry = shared.derive()
+        selection = ToolSelector(registry, enabled=True).select(task)
+        registry.register_multiple(create_tool_selection_tools(registry, lambda selection=selection: selection))
+        selections.append((registry, selection))
+    assert "request_tools" not in shared.tools
+
+    first_registry, first = selections[0]
+    first_registry.execute_tool_call("request_tools", {"groups": ["window"]})
+    assert "window_tool" in _names(first.get_function_schemas())
+    assert "window_tool" not in _names(selections[1][1].get_function_schemas())
+
+
+def test_english_keywords_need_specific_phrases():
+    selector = ToolSelector(_registry(), enabled=True)
+    assert "keyboard_tool" not in _names(selector.select("check the file type of data.csv").get_function_schemas())
+    assert "keyboard_tool" in _names(selector.select("type text into the search box").get_function_schemas())
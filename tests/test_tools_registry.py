@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+
+from argus.tools.base_tool import (
+    CACHE_TAG_DESKTOP,
+    CONCURRENCY_DESKTOP,
+    CONCURRENCY_READ_ONLY,
+    FunctionTool,
+)
+from argus.tools.tools_registry import ToolsRegistry
+
+
+def _sleep_tool(name, concurrency, log):
+    def run(tag):
+        log.append(("start", tag, threading.get_ident()))
+        time.sleep(0.1)
+        log.append(("end", tag))
+        return {"success": True, "tag": tag}
+
+    return FunctionTool(
+        name=name,
+        description=name,
+        parameters_schema={"type": "object", "properties": {"tag": {"type": "string"}}, "required": ["tag"]},
+        execute_func=run,
+        concurrency=concurrency,
+    )
+
+
+def _call(call_id, name, tag):
+    return {"id": call_id, "function": {"name": name, "arguments": json.dumps({"tag": tag})}}
+
+
+def test_execute_tool_calls_parallelizes_read_only_and_keeps_order():
+    log = []
+    registry = ToolsRegistry()
+    registry.register(_sleep_tool("query", CONCURRENCY_READ_ONLY, log))
+    registry.register(_sleep_tool("click", CONCURRENCY_DESKTOP, log))
+
+    calls = [_call("1", "query", "a"), _call("2", "query", "b"), _call("3", "click", "c"), _call("4", "query", "d")]
+    results = registry.execute_tool_calls(calls)
+
+    assert [r["tool_call_id"] for r in results] == ["1", "2", "3", "4"]
+    assert all(r["success"] and "elapsed_ms" in r for r in results)
+
+    events = [entry[:2] for entry in log]
+    # a和b并行开始；click等待之前的查询结束；d等待click结束
+    assert events.index(("start", "b")) < events.index(("end", "a"))
+    assert events.index(("start", "c")) > max(events.index(("end", "a")), events.index(("end", "b")))
+    assert events.index(("start", "d")) > events.index(("end", "c"))
+
+
+def test_execute_tool_calls_reports_bad_arguments_in_place():
+    registry = ToolsRegistry()
+    registry.register(_sleep_tool("query", CONCURRENCY_READ_ONLY, []))
+    results = registry.execute_tool_calls(
+        [{"id": "x", "function": {"name": "query", "arguments": "{bad"}}, _call("y", "query", "ok")]
+    )
+    assert results[0]["tool_call_id"] == "x" and not results[0]["success"]
+    assert results[1]["tag"] == "ok"
+
+
+def test_batch_starts_each_call_on_submit():
+    log = []
+    registry = ToolsRegistry()
+    registry.register(_sleep_tool("query", CONCURRENCY_READ_ONLY, log))
+    registry.register(_sleep_tool("click", CONCURRENCY_DESKTOP, log))
+
+    batch = registry.start_batch()
+    first = batch.submit(_call("1", "query", "a"))
+    time.sleep(0.05)
+    # 第一个调用在后续调用提交前就已开始执行
+    assert ("start", "a") in [entry[:2] for entry in log]
+    batch.submit(_call("2", "click", "b"))
+
+    results = batch.results()
+    assert first.done()
+    assert [r["tool_call_id"] for r in results] == ["1", "2"]
+    events = [entry[:2] for entry in log]
+    assert events.index(("start", "b")) > events.index(("end", "a"))
+
+
+def test_cacheable_tool_is_served_from_cache_until_invalidated():
+    calls = []
+    registry = ToolsRegistry()
+    registry.register(FunctionTool(
+        name="list",
+        description="list",
+        parameters_schema={"type": "object", "properties": {}, "required": []},
+        execute_func=lambda: calls.append(1) or {"success": True, "count": len(calls)},
+        concurrency=CONCURRENCY_READ_ONLY,
+        cache_ttl=60,
+        invalidated_by=(CACHE_TAG_DESKTOP,),
+    ))
+    registry.register(_sleep_tool("click", CONCURRENCY_DESKTOP, []))
+
+    first = registry.execute_tool_call("list", {})
+    second = registry.execute_tool_call("list", {})
+    assert first["count"] == 1 and second["count"] == 1 and second["cached"]
+
+    registry.execute_tool_call("click", {"tag": "x"})
+    assert registry.execute_tool_call("list", {})["count"] == 2
+
+    metrics = registry.get_metrics()["cache"]
+    assert metrics["hits"] == 1 and metrics["misses"] == 2
+    assert metrics["tools"]["list"]["invalidations"] == 1
+
+
+def test_cache_is_keyed_on_version_and_desktop_invalidation_is_shared():
+    frame = {"version": "a"}
+    calls = []
+
+    def make_registry():
+        registry = ToolsRegistry()
+        registry.register(FunctionTool(
+            name="shot",
+            description="shot",
+            parameters_schema={"type": "object", "properties": {}, "required": []},
+            execute_func=lambda: calls.append(1) or {"success": True, "frame": frame["version"]},
+            concurrency=CONCURRENCY_READ_ONLY,
+            cache_ttl=60,
+            invalidated_by=(CACHE_TAG_DESKTOP,),
+            cache_version=lambda: frame["version"],
+        ))
+        return registry
+
+    first, second = make_registry(), make_registry()
+    assert first.execute_tool_call("shot", {})["frame"] == "a"
+    assert first.execute_tool_call("shot", {})["cached"]
+    # 画面变化后版本不同，不会命中旧帧
+    frame["version"] = "b"
+    assert first.execute_tool_call("shot", {}) == {"success": True, "frame": "b"}
+
+    second.execute_tool_call("shot", {})
+    # 任一注册中心（或直接操作桌面的Agent）声明桌面变化，所有注册中心的桌面缓存都失效
+    first.invalidate_cache(CACHE_TAG_DESKTOP)
+    assert "cached" not in second.execute_tool_call("shot", {})
+    assert len(calls) == 4
+
+
+def test_derived_registry_shares_tools_and_cache():
+    log = []
+    registry = ToolsRegistry()
+    registry.register(_sleep_tool("query", CONCURRENCY_READ_ONLY, log))
+    derived = registry.derive()
+    derived.register(_sleep_tool("local", CONCURRENCY_READ_ONLY, log))
+
+    assert derived.get_tool("query") is registry.get_tool("query")
+    assert derived.cache is registry.cache
+    assert registry.get_tool("local") is None